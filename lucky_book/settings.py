@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -30,6 +31,34 @@ environ.Env.read_env(f"{BASE_DIR}/.env")
 
 API_KEY = env("API_KEY")
 API_HOST = env("API_HOST")
+# plain HTTP is only meant for a local API server
+API_USE_TLS = env.bool("API_USE_TLS", default=True)
+API_POOL_SIZE = env.int("API_POOL_SIZE", default=4)
+# max concurrent API requests of one refresh, keep it <= API_POOL_SIZE to reuse connections
+API_MAX_CONCURRENCY = env.int("API_MAX_CONCURRENCY", default=4)
+API_CONNECT_TIMEOUT = env.float("API_CONNECT_TIMEOUT", default=5.0)
+API_READ_TIMEOUT = env.float("API_READ_TIMEOUT", default=15.0)
+# requests per minute of our API plan, never exceeded by one process: with several
+# worker processes (and poll_scores), give each its share of the plan
+API_QUOTA_PER_MINUTE = env.int("API_QUOTA_PER_MINUTE", default=300)
+API_BURST = env.int("API_BURST", default=10)
+# retries of a call answered with 429/5xx or a network error, with jittered backoff
+API_MAX_RETRIES = env.int("API_MAX_RETRIES", default=3)
+# seconds a call may wait for quota before it fails
+API_MAX_QUEUE_WAIT = env.float("API_MAX_QUEUE_WAIT", default=10.0)
+# consecutive failures that open the circuit breaker, and seconds it stays open
+API_BREAKER_THRESHOLD = env.int("API_BREAKER_THRESHOLD", default=5)
+API_BREAKER_RESET = env.float("API_BREAKER_RESET", default=30.0)
+# seconds a response with unfinished games is cached, finished dates are cached for good
+API_CACHE_TTL = env.int("API_CACHE_TTL", default=60)
+# "record" archives the API responses to API_FIXTURE_DIR, "replay" serves them instead
+# of calling the API, see my_book/api_fixtures.py
+API_FIXTURE_MODE = env("API_FIXTURE_MODE", default="")
+API_FIXTURE_DIR = env("API_FIXTURE_DIR", default=str(BASE_DIR / "api_fixtures"))
+# directory of the lock files that let one worker process at a time fetch a league and
+# date, the others then read its response from the cache; empty to only coalesce
+# the fetches within a process
+API_LOCK_DIR = env("API_LOCK_DIR", default="")
 DEBUG = env.bool("DEBUG", default=False)
 
 ###########################
@@ -63,6 +92,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "my_book.middleware.GameOutcomeCacheMiddleware",
 ]
 
 ROOT_URLCONF = "lucky_book.urls"
@@ -93,10 +123,33 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # wait for the lock instead of failing when several processes write at once,
+        # the bet placement paths open their transactions IMMEDIATE (write_transaction)
+        "OPTIONS": {"timeout": 20},
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# sports_api is on disk so that all the worker processes share the API responses
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "sports_api": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": env(
+            "API_CACHE_DIR",
+            default=os.path.join(tempfile.gettempdir(), "lucky_book_sports_api"),
+        ),
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -137,6 +190,23 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
 ]
 
+# Logging
+# https://docs.djangoproject.com/en/5.1/topics/logging/
+# my_book logs warnings by default, MY_BOOK_LOG_LEVEL=DEBUG adds the API call timings
+# and the sports API, cache and scheduler metrics
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "my_book": {
+            "handlers": ["console"],
+            "level": env("MY_BOOK_LOG_LEVEL", default="WARNING"),
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
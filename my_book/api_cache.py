@@ -0,0 +1,98 @@
+"""
+Response cache of the sports API, keyed by league and date
+
+Responses are stored in the "sports_api" cache (a FileBasedCache, so every worker
+process of the machine shares it). A date whose games are all finished never
+changes again and is cached permanently, any other date only for API_CACHE_TTL
+seconds. Failed fetches are never cached.
+"""
+
+import threading
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+CACHE_ALIAS = "sports_api"
+DEFAULT_TTL = 60
+FINAL_STATUSES = ("Finished", "Final/OT")
+
+
+@dataclass
+class CacheMetrics:
+    """Hit/miss counters of the API cache in this process"""
+
+    hits: int = 0
+    misses: int = 0
+    permanent_stores: int = 0
+    ttl_stores: int = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.hits} hits, {self.misses} misses ({self.hit_rate:.0%} hit rate), "
+            f"{self.permanent_stores} stored permanently, "
+            f"{self.ttl_stores} stored for {get_ttl()}s"
+        )
+
+
+metrics = CacheMetrics()
+_metrics_lock = threading.Lock()
+
+
+def _count(name):
+    with _metrics_lock:
+        setattr(metrics, name, getattr(metrics, name) + 1)
+
+
+def get_cache():
+    """Return the API cache, or None if the "sports_api" cache is not configured"""
+    try:
+        return caches[CACHE_ALIAS]
+    except InvalidCacheBackendError:
+        return None
+
+
+def get_ttl():
+    return getattr(settings, "API_CACHE_TTL", DEFAULT_TTL)
+
+
+def get_cache_key(league, date):
+    return f"games:{league}:{date}"
+
+
+def is_final(games_data):
+    """Return True if the response has games and all of them are finished"""
+    games = games_data.get("response") or []
+    return bool(games) and all(
+        (game.get("game") or {}).get("status", {}).get("long") in FINAL_STATUSES
+        for game in games
+    )
+
+
+def get_cached_games(league, date):
+    """Return the cached response of a league and date, or None on a miss"""
+    cache = get_cache()
+    if cache is None:
+        return None
+    games_data = cache.get(get_cache_key(league, date))
+    _count("misses" if games_data is None else "hits")
+    return games_data
+
+
+def set_cached_games(league, date, games_data):
+    """Cache a response, permanently if all its games are finished"""
+    cache = get_cache()
+    if cache is None or games_data is None:
+        return
+    if is_final(games_data):
+        cache.set(get_cache_key(league, date), games_data, timeout=None)
+        _count("permanent_stores")
+    else:
+        cache.set(get_cache_key(league, date), games_data, timeout=get_ttl())
+        _count("ttl_stores")
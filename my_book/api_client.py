@@ -0,0 +1,307 @@
+"""
+Pooled HTTP(S) client for the sports API
+
+Connections are kept alive and reused across calls (and threads) from a small pool,
+so a TLS handshake is only paid when the pool is empty. Every call has a connect
+timeout and a read timeout, asks for gzip responses and is timed into ApiMetrics.
+Calls are scheduled under the plan's quota, retried and cut off by a circuit
+breaker when upstream is down, see api_scheduler.py.
+"""
+
+import gzip
+import http.client
+import json
+import logging
+import queue
+import threading
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
+from urllib.parse import urlencode
+
+from django.conf import settings
+
+from . import api_scheduler
+from .api_scheduler import ApiScheduler, ShedError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 15.0
+
+# A reused keep-alive connection may have been closed by the server in between,
+# the request is then sent again once on a new connection
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+
+
+class ApiError(Exception):
+    """An API call failed, status is the HTTP status or None for a network error"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class ApiMetrics:
+    """Counters and latencies of the calls made by one ApiClient"""
+
+    request_count: int = 0
+    error_count: int = 0
+    connections_opened: int = 0
+    connections_reused: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=1000))
+
+    @property
+    def mean_seconds(self):
+        return self.total_seconds / self.request_count if self.request_count else 0.0
+
+    def get_percentile(self, percent):
+        """Return the latency percentile (0-100) of the last 1000 calls, in seconds"""
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))]
+
+    def __str__(self):
+        return (
+            f"{self.request_count} calls, {self.error_count} errors, "
+            f"{self.connections_opened} connections opened, "
+            f"{self.connections_reused} reused, "
+            f"mean {self.mean_seconds * 1000:.0f}ms, "
+            f"p95 {self.get_percentile(95) * 1000:.0f}ms, "
+            f"max {self.max_seconds * 1000:.0f}ms"
+        )
+
+
+class ApiClient:
+    """
+    Keep-alive client for one API host, safe to share between threads
+    input:
+        host: API host, optionally with a port
+        headers: dict of headers sent with every request (e.g. the API key)
+        use_tls (bool): HTTPS, or plain HTTP for a local server
+        pool_size: max idle connections kept open
+        connect_timeout, read_timeout: seconds
+        scheduler: ApiScheduler applying the rate limit, retries and circuit
+        breaker, or None to send every call once, right away
+    """
+
+    def __init__(
+        self,
+        host,
+        headers=None,
+        use_tls=True,
+        pool_size=DEFAULT_POOL_SIZE,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        scheduler=None,
+    ):
+        self.host = host
+        self.headers = dict(headers or {})
+        self.use_tls = use_tls
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.scheduler = scheduler
+        self.metrics = ApiMetrics()
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._metrics_lock = threading.Lock()
+
+    def _open_connection(self):
+        connection_class = (
+            http.client.HTTPSConnection if self.use_tls else http.client.HTTPConnection
+        )
+        conn = connection_class(self.host, timeout=self.connect_timeout)
+        # Connect (and do the TLS handshake) under the connect timeout, then wait for
+        # responses under the read timeout
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        with self._metrics_lock:
+            self.metrics.connections_opened += 1
+        return conn
+
+    def _get_connection(self):
+        """Return (connection, reused), an idle pooled connection if there is one"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            return self._open_connection(), False
+        with self._metrics_lock:
+            self.metrics.connections_reused += 1
+        return conn, True
+
+    def _release_connection(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _send(self, path, headers):
+        """Send one GET, return (status, response headers, raw body)"""
+        conn, reused = self._get_connection()
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            body = response.read()
+        except STALE_CONNECTION_ERRORS:
+            conn.close()
+            if not reused:
+                raise
+            conn = self._open_connection()
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except BaseException:
+                conn.close()
+                raise
+        except BaseException:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release_connection(conn)
+        return response.status, response, body
+
+    def _get_once(self, path, headers):
+        """
+        Make one attempt of a GET
+        Returns:
+            (status, decoded body bytes, response headers)
+        Raises:
+            ApiError on network errors and timeouts
+        """
+        start = time.perf_counter()
+        status = None
+        try:
+            status, response, body = self._send(path, headers)
+            encoding = (response.getheader("Content-Encoding") or "").lower()
+            if encoding == "gzip":
+                body = gzip.decompress(body)
+            elif encoding == "deflate":
+                body = zlib.decompress(body)
+        except (OSError, http.client.HTTPException, zlib.error) as e:
+            raise ApiError(f"API request to {path} failed: {e!r}") from e
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._metrics_lock:
+                self.metrics.request_count += 1
+                self.metrics.total_seconds += elapsed
+                self.metrics.max_seconds = max(self.metrics.max_seconds, elapsed)
+                self.metrics.latencies.append(elapsed)
+                if status != 200:
+                    self.metrics.error_count += 1
+            logger.debug(
+                "ApiClient.get(): %s -> %s in %.0fms", path, status, elapsed * 1000
+            )
+        return status, body, response.msg
+
+    def get(self, path, params=None):
+        """
+        GET a path of the API, through the scheduler if the client has one
+        input:
+            params: dict of query parameters
+        Returns:
+            (status, decoded body bytes)
+        Raises:
+            ApiError on network errors and timeouts, or if the scheduler refused
+            the call
+        """
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        headers = {**self.headers, "Accept-Encoding": "gzip, deflate"}
+
+        if self.scheduler is None:
+            status, body, _ = self._get_once(path, headers)
+            return status, body
+        try:
+            return self.scheduler.run(
+                lambda: self._get_once(path, headers), network_errors=(ApiError,)
+            )
+        except ShedError as e:
+            raise ApiError(f"API request to {path} not sent: {e}") from e
+
+    def get_json(self, path, params=None):
+        """
+        GET a path of the API and parse its JSON body
+        Raises:
+            ApiError if the status is not 200 or the body is not JSON
+        """
+        status, body = self.get(path, params)
+        if status != 200:
+            raise ApiError(f"API request failed with status code {status}", status)
+        try:
+            return json.loads(body.decode("utf-8"))
+        except ValueError as e:
+            raise ApiError(f"API response is not valid JSON: {e}", status) from e
+
+    def close(self):
+        """Close the idle connections of the pool"""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_api_client = None
+_api_client_lock = threading.Lock()
+
+
+def get_api_client():
+    """Return the process-wide client of the sports API, configured from settings"""
+    global _api_client
+    with _api_client_lock:
+        if _api_client is None:
+            _api_client = ApiClient(
+                settings.API_HOST,
+                headers={
+                    "x-rapidapi-host": settings.API_HOST,
+                    "x-rapidapi-key": settings.API_KEY,
+                },
+                use_tls=getattr(settings, "API_USE_TLS", True),
+                pool_size=getattr(settings, "API_POOL_SIZE", DEFAULT_POOL_SIZE),
+                connect_timeout=getattr(
+                    settings, "API_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT
+                ),
+                read_timeout=getattr(
+                    settings, "API_READ_TIMEOUT", DEFAULT_READ_TIMEOUT
+                ),
+                scheduler=ApiScheduler(
+                    quota_per_minute=getattr(
+                        settings,
+                        "API_QUOTA_PER_MINUTE",
+                        api_scheduler.DEFAULT_QUOTA_PER_MINUTE,
+                    ),
+                    burst=getattr(settings, "API_BURST", api_scheduler.DEFAULT_BURST),
+                    max_retries=getattr(
+                        settings, "API_MAX_RETRIES", api_scheduler.DEFAULT_MAX_RETRIES
+                    ),
+                    max_queue_wait=getattr(
+                        settings,
+                        "API_MAX_QUEUE_WAIT",
+                        api_scheduler.DEFAULT_MAX_QUEUE_WAIT,
+                    ),
+                    breaker_threshold=getattr(
+                        settings,
+                        "API_BREAKER_THRESHOLD",
+                        api_scheduler.DEFAULT_BREAKER_THRESHOLD,
+                    ),
+                    breaker_reset=getattr(
+                        settings,
+                        "API_BREAKER_RESET",
+                        api_scheduler.DEFAULT_BREAKER_RESET,
+                    ),
+                ),
+            )
+        return _api_client
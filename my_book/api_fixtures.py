@@ -0,0 +1,130 @@
+"""
+Recorded responses of the sports API, to work offline
+
+Fixtures are gzipped JSON files, one per league and date:
+    <API_FIXTURE_DIR>/<league>/<yyyy-mm-dd>.json.gz
+
+API_FIXTURE_MODE decides how fetch_games_by_date uses them:
+- "record": fetch from the API as usual and archive every successful response
+- "replay": never call the API, serve the recorded response (a missing fixture is
+  a failed fetch)
+- "" (default): fixtures are not used
+
+The sports_api_stub command serves the same fixtures over HTTP, so the whole HTTP
+path can be exercised against a local server.
+"""
+
+import gzip
+import json
+import os
+from datetime import datetime, time as datetime_time
+
+from django.conf import settings
+from django.utils import timezone
+
+FIXTURE_MODES = ["", "record", "replay"]
+LEAGUE_IDS = {"NFL": "1", "NCAA": "2"}
+# Per-period score keys of a team in the API payload, besides "total"
+PERIOD_SCORE_KEYS = ["quarter_1", "quarter_2", "quarter_3", "quarter_4", "overtime"]
+
+
+def get_fixture_mode():
+    return getattr(settings, "API_FIXTURE_MODE", "")
+
+
+def get_fixture_dir():
+    return getattr(settings, "API_FIXTURE_DIR", "api_fixtures")
+
+
+def get_fixture_path(league, date, fixture_dir=None):
+    return os.path.join(fixture_dir or get_fixture_dir(), league, f"{date}.json.gz")
+
+
+def save_fixture(league, date, games_data, fixture_dir=None):
+    """Archive a response, replacing the previous recording of that league and date"""
+    path = get_fixture_path(league, date, fixture_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename, so a reader never sees half a file
+    with gzip.open(f"{path}.tmp", "wt", encoding="utf-8") as fixture:
+        json.dump(games_data, fixture)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+
+def load_fixture(league, date, fixture_dir=None):
+    """Return the recorded response of a league and date, or None if there is none"""
+    try:
+        with gzip.open(
+            get_fixture_path(league, date, fixture_dir), "rt", encoding="utf-8"
+        ) as fixture:
+            return json.load(fixture)
+    except FileNotFoundError:
+        return None
+
+
+def build_games_data(league, date, games):
+    """
+    Build an API response from Game rows, to make fixtures without network access
+    Finished games are "Finished" with their scores, the others "Not Started"
+    The payload has the shape of a recorded one, the fields Game doesn't store
+    (stage, week, per-quarter scores) are null
+    """
+    response = []
+    for game in games:
+        kickoff = timezone.make_aware(
+            datetime.combine(game.game_date, datetime_time(13, 0))
+        )
+        response.append(
+            {
+                "game": {
+                    "id": game.pk,
+                    "stage": None,
+                    "week": None,
+                    "date": {
+                        "timezone": "America/New_York",
+                        "date": str(game.game_date),
+                        "time": "13:00",
+                        "timestamp": int(kickoff.timestamp()),
+                    },
+                    "status": (
+                        {"short": "FT", "long": "Finished", "timer": None}
+                        if game.is_finished
+                        else {"short": "NS", "long": "Not Started", "timer": None}
+                    ),
+                },
+                "league": {"id": int(LEAGUE_IDS.get(league, 0)), "name": league},
+                "teams": {
+                    "away": {"name": game.team_a, "logo": game.team_a_logo_url},
+                    "home": {"name": game.team_b, "logo": game.team_b_logo_url},
+                },
+                "scores": {
+                    "away": {
+                        **dict.fromkeys(PERIOD_SCORE_KEYS),
+                        "total": (
+                            int(game.score_team_a)
+                            if game.is_finished and game.score_team_a is not None
+                            else None
+                        ),
+                    },
+                    "home": {
+                        **dict.fromkeys(PERIOD_SCORE_KEYS),
+                        "total": (
+                            int(game.score_team_b)
+                            if game.is_finished and game.score_team_b is not None
+                            else None
+                        ),
+                    },
+                },
+            }
+        )
+    return {
+        "get": "games",
+        "parameters": {
+            "league": LEAGUE_IDS.get(league, ""),
+            "date": str(date),
+            "timezone": "America/New_York",
+        },
+        "errors": [],
+        "results": len(response),
+        "response": response,
+    }
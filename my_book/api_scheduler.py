@@ -0,0 +1,293 @@
+"""
+Scheduling of the sports API calls: rate limit, retries and circuit breaker
+
+Every attempt first takes a token from a token bucket sized from the plan's quota,
+so calls queue instead of exceeding it, retries included. Throttled (429)
+and failed (5xx, network error) attempts are retried with jittered exponential
+backoff, honouring Retry-After. After too many consecutive failures the circuit
+opens and calls fail fast until a trial call succeeds.
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Provider headers: calls left in the current minute, and in the day
+RATE_LIMIT_HEADERS = ["X-RateLimit-Remaining", "x-ratelimit-requests-remaining"]
+
+DEFAULT_QUOTA_PER_MINUTE = 300
+DEFAULT_BURST = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 8.0
+DEFAULT_MAX_QUEUE_WAIT = 10.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_RESET = 30.0
+
+
+class ShedError(Exception):
+    """The call was refused without reaching the API (circuit open or queue timeout)"""
+
+
+@dataclass
+class SchedulerMetrics:
+    """Counters of the calls made through one ApiScheduler"""
+
+    calls: int = 0
+    queued: int = 0
+    retried: int = 0
+    throttled: int = 0
+    shed: int = 0
+    circuit_opens: int = 0
+    queue_seconds: float = 0.0
+
+    def __str__(self):
+        return (
+            f"{self.calls} calls, {self.queued} queued "
+            f"({self.queue_seconds:.1f}s waited), {self.retried} retried, "
+            f"{self.throttled} throttled, {self.shed} shed, "
+            f"circuit opened {self.circuit_opens} times"
+        )
+
+
+class TokenBucket:
+    """
+    Allow rate tokens per second on average, and bursts of up to capacity tokens
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    def acquire(self, timeout):
+        """
+        Take a token, waiting for it up to timeout seconds
+        Returns:
+            seconds waited, or None if no token came in time
+        """
+        start = time.monotonic()
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return now - start if waited else 0.0
+                wait = (1 - self._tokens) / self.rate
+            if now + wait - start > timeout:
+                return None
+            time.sleep(wait)
+            waited = True
+
+    def drain(self):
+        """Drop the tokens left, e.g. when the provider says the quota is used up"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. Open, after threshold consecutive failures: calls are
+    refused for reset_seconds. Half-open, after that: one trial call goes through,
+    its success closes the circuit and its failure opens it again.
+    """
+
+    def __init__(self, threshold, reset_seconds):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half-open"
+
+    def allow(self):
+        """Return True if a call may go through now"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def release_trial(self):
+        """Give back the trial call allowed by allow() when it was not made"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        """Returns: True if this failure opened the circuit"""
+        with self._lock:
+            self.failures += 1
+            was_open = self.opened_at is not None
+            if was_open or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                self._trial_running = False
+                return not was_open
+            return False
+
+
+class ApiScheduler:
+    """
+    Run API attempts under the rate limit, with retries and a circuit breaker
+    input:
+        quota_per_minute: calls allowed by the plan in a minute, never exceeded in
+        any 60s window: the bucket holds burst tokens and refills at
+        (quota_per_minute - burst) tokens a minute; retries take tokens too
+        max_retries: retries after the first attempt
+        backoff_base, backoff_max: seconds, the n-th retry waits a random time
+        between 0 and min(backoff_max, backoff_base * 2**n), or Retry-After
+        capped at backoff_max
+        max_queue_wait: seconds a call may wait for a token, or for the
+        Retry-After of a 429, before being shed
+        breaker_threshold, breaker_reset: consecutive failures that open the
+        circuit, and seconds before a trial call
+    """
+
+    def __init__(
+        self,
+        quota_per_minute=DEFAULT_QUOTA_PER_MINUTE,
+        burst=DEFAULT_BURST,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_base=DEFAULT_BACKOFF_BASE,
+        backoff_max=DEFAULT_BACKOFF_MAX,
+        max_queue_wait=DEFAULT_MAX_QUEUE_WAIT,
+        breaker_threshold=DEFAULT_BREAKER_THRESHOLD,
+        breaker_reset=DEFAULT_BREAKER_RESET,
+    ):
+        burst = max(1, min(burst, quota_per_minute - 1))
+        self.bucket = TokenBucket(max(quota_per_minute - burst, 1) / 60, burst)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_queue_wait = max_queue_wait
+        self.metrics = SchedulerMetrics()
+        self._metrics_lock = threading.Lock()
+
+    def _count(self, name, value=1):
+        with self._metrics_lock:
+            setattr(self.metrics, name, getattr(self.metrics, name) + value)
+
+    def get_backoff(self, retry, retry_after=None):
+        """
+        Return the seconds to wait before the given retry (0 = first retry), never
+        more than backoff_max, Retry-After included
+        """
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**retry))
+        if retry_after is not None:
+            return max(backoff, min(retry_after, self.backoff_max))
+        return backoff
+
+    def _observe_rate_limit(self, headers):
+        """Stop spending tokens when the provider says the quota is used up"""
+        for name in RATE_LIMIT_HEADERS:
+            value = headers.get(name)
+            if value is not None and value.strip() == "0":
+                self.bucket.drain()
+
+    def run(self, attempt, network_errors=(OSError,)):
+        """
+        Run attempt() until it succeeds or the retries are used up
+        input:
+            attempt: function returning (status, body, headers), headers being a
+            case-insensitive mapping; it raises one of network_errors when the
+            API can't be reached
+        Returns:
+            (status, body) of the last attempt
+        Raises:
+            ShedError if the circuit is open, no token came in time or the API
+            asked to wait longer than max_queue_wait, the last network error if
+            every attempt failed with one
+        """
+        self._count("calls")
+        retry = 0
+        while True:
+            if not self.breaker.allow():
+                self._count("shed")
+                raise ShedError(
+                    f"circuit open after {self.breaker.failures} failures, "
+                    f"calls are refused for {self.breaker.reset_seconds:.0f}s"
+                )
+            waited = self.bucket.acquire(self.max_queue_wait)
+            if waited is None:
+                # Nothing was tried, let another call make the trial
+                self.breaker.release_trial()
+                self._count("shed")
+                raise ShedError(
+                    f"no request quota left within {self.max_queue_wait:g}s"
+                )
+            if waited > 0:
+                self._count("queued")
+                self._count("queue_seconds", waited)
+
+            retry_after = None
+            try:
+                status, body, headers = attempt()
+            except network_errors:
+                if self.breaker.record_failure():
+                    self._count("circuit_opens")
+                if retry >= self.max_retries:
+                    raise
+            else:
+                self._observe_rate_limit(headers)
+                if status not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return status, body
+                if status == 429:
+                    # Throttling is not an outage, it doesn't count for the breaker
+                    self._count("throttled")
+                    self.bucket.drain()
+                    retry_after = _parse_retry_after(headers.get("Retry-After"))
+                    self.breaker.record_success()
+                    if retry_after is not None and retry_after > self.max_queue_wait:
+                        # Don't hold the caller (e.g. a view request) that long
+                        self._count("shed")
+                        raise ShedError(
+                            f"the API asked to retry in {retry_after:g}s, more than "
+                            f"{self.max_queue_wait:g}s"
+                        )
+                elif self.breaker.record_failure():
+                    self._count("circuit_opens")
+                if retry >= self.max_retries:
+                    return status, body
+
+            self._count("retried")
+            time.sleep(self.get_backoff(retry, retry_after))
+            retry += 1
+
+
+def _parse_retry_after(value):
+    """Return the seconds of a Retry-After header given in seconds, or None"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
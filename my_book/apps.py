@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MyBookConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "my_book"
+
+    def ready(self):
+        # Connect the signal handlers that keep the BetSlip table in sync
+        from . import signals  # noqa: F401
@@ -0,0 +1,359 @@
+"""
+Bulk import of bets from CSV or JSON
+
+A whole batch is validated up front: every referenced Player and Game is resolved
+with one query each, and every invalid row is reported with its row number. The
+SingleBets, then the bets of each type and their BetSlips are created with
+bulk_create in a single transaction.
+
+Rows, as JSON objects (a CSV row uses leg1_game, leg1_type, leg1_team, leg1_over, ...):
+    {
+        "player": "<player name>",  # or "player_id": <player id>
+        "bet_type": "Straight" | "Action" | "Parlay3" | "Parlay4",
+        "bet_amount": "25.00",
+        "legs": [{"game": <game id>, "type": "WINNER", "team": "<team name>"},
+                 {"game": <game id>, "type": "OVER-UNDER", "over": true}, ...]
+    }
+"""
+
+import csv
+import io
+import json
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .bet_rows import MAX_LEGS
+from .bet_slips import create_bet_slips
+from .models import Game, Player, SingleBet
+from .outcome_cache import game_outcome_cache
+from .settlement import BET_MODELS
+
+IMPORT_FORMATS = ["csv", "json"]
+BATCH_SIZE = 500
+MAX_BET_AMOUNT = Decimal("99999999.99")  # Bet.bet_amount has 10 digits, 2 decimals
+
+TRUE_VALUES = {"true", "1", "yes", "y", "over", "on"}
+FALSE_VALUES = {"false", "0", "no", "n", "under", "off", ""}
+
+
+@dataclass
+class ImportResult:
+    """
+    Summary of one import
+    - errors: list of (row number, message), nothing is imported when a row is
+      invalid unless skip_invalid is set
+    - created_bets: list of (row number, bet type, bet id), in row order
+    """
+
+    created_count: int = 0
+    skipped_count: int = 0
+    errors: list = field(default_factory=list)
+    created_bets: list = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+
+class ImportFormatError(ValueError):
+    """The file could not be parsed at all"""
+
+
+def parse_csv(text):
+    """
+    Parse CSV text into the rows of import_bets(), numbered from 2 (after the header)
+    Returns:
+        list of (row number, row dict)
+    """
+    rows = []
+    for row_number, csv_row in enumerate(csv.DictReader(io.StringIO(text)), start=2):
+        legs = []
+        for leg_no in range(1, MAX_LEGS + 1):
+            game = (csv_row.get(f"leg{leg_no}_game") or "").strip()
+            if game:
+                legs.append(
+                    {
+                        "game": game,
+                        "type": csv_row.get(f"leg{leg_no}_type"),
+                        "team": csv_row.get(f"leg{leg_no}_team"),
+                        "over": csv_row.get(f"leg{leg_no}_over"),
+                    }
+                )
+        rows.append(
+            (
+                row_number,
+                {
+                    "player": csv_row.get("player"),
+                    "player_id": csv_row.get("player_id"),
+                    "bet_type": csv_row.get("bet_type"),
+                    "bet_amount": csv_row.get("bet_amount"),
+                    "legs": legs,
+                },
+            )
+        )
+    return rows
+
+
+def parse_json(text):
+    """
+    Parse a JSON list of rows (or {"bets": [...]}), numbered from 1
+    Returns:
+        list of (row number, row dict)
+    """
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise ImportFormatError(f"Invalid JSON: {e}")
+    if isinstance(data, dict):
+        data = data.get("bets")
+    if not isinstance(data, list):
+        raise ImportFormatError("Expected a list of bets.")
+    return list(enumerate(data, start=1))
+
+
+def parse_import(text, import_format):
+    """Parse the text of a CSV or JSON import file"""
+    if import_format not in IMPORT_FORMATS:
+        raise ImportFormatError(
+            f"format must be one of {', '.join(IMPORT_FORMATS)}, not {import_format}."
+        )
+    if import_format == "json":
+        return parse_json(text)
+    return parse_csv(text)
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value if value is not None else "").strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"'{value}' is not a yes/no value")
+
+
+def _parse_amount(value):
+    try:
+        amount = Decimal(str(value).strip())
+    except (InvalidOperation, TypeError):
+        raise ValueError(f"bet_amount '{value}' is not a number")
+    if not amount.is_finite() or amount <= 0 or amount > MAX_BET_AMOUNT:
+        raise ValueError(f"bet_amount must be between 0.01 and {MAX_BET_AMOUNT}")
+    if amount != amount.quantize(Decimal("0.01")):
+        raise ValueError("bet_amount has more than 2 decimal places")
+    return amount.quantize(Decimal("0.01"))
+
+
+def _to_id(value):
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+class _Batch:
+    """The players and games referenced by a batch, each loaded with one query"""
+
+    def __init__(self, rows):
+        player_names = set()
+        player_ids = set()
+        game_ids = set()
+        for _, row in rows:
+            if not isinstance(row, dict):
+                continue
+            if _to_id(row.get("player_id")) is not None:
+                player_ids.add(_to_id(row.get("player_id")))
+            elif row.get("player"):
+                player_names.add(str(row["player"]).strip().lower())
+            for leg in row.get("legs") or []:
+                if isinstance(leg, dict) and _to_id(leg.get("game")) is not None:
+                    game_ids.add(_to_id(leg.get("game")))
+
+        # Player names are unique, they are matched case-insensitively
+        players = Player.objects.annotate(lower_name=Lower("name")).filter(
+            Q(pk__in=player_ids) | Q(lower_name__in=player_names)
+        )
+        self.players_by_id = {}
+        self.players_by_name = {}
+        for player in players:
+            self.players_by_id[player.pk] = player
+            self.players_by_name[player.lower_name] = player
+        self.games = Game.objects.in_bulk(game_ids)
+
+    def get_player(self, row):
+        player_id = _to_id(row.get("player_id"))
+        if player_id is not None:
+            player = self.players_by_id.get(player_id)
+            if player is None:
+                raise ValueError(f"player id {player_id} does not exist")
+            return player
+        name = str(row.get("player") or "").strip()
+        if not name:
+            raise ValueError("player is required")
+        player = self.players_by_name.get(name.lower())
+        if player is None:
+            raise ValueError(f"player '{name}' does not exist")
+        return player
+
+    def get_game(self, value):
+        game = self.games.get(_to_id(value))
+        if game is None:
+            raise ValueError(f"game '{value}' does not exist")
+        return game
+
+
+def _build_single_bet(batch, leg):
+    """Return an unsaved SingleBet for one leg of a row"""
+    if not isinstance(leg, dict):
+        raise ValueError("each leg must be an object")
+    game = batch.get_game(leg.get("game"))
+    single_bet_type = str(leg.get("type") or "").strip().upper()
+
+    if single_bet_type == "WINNER":
+        team = str(leg.get("team") or "").strip()
+        if team.lower() not in (game.team_a.lower(), game.team_b.lower()):
+            raise ValueError(f"team '{team}' does not play in {game}")
+        return SingleBet(
+            game=game, single_bet_type="WINNER", selected_team=team, is_over=None
+        )
+    elif single_bet_type == "OVER-UNDER":
+        return SingleBet(
+            game=game,
+            single_bet_type="OVER-UNDER",
+            selected_team="",
+            is_over=_parse_bool(leg.get("over")),
+        )
+    raise ValueError(f"leg type must be WINNER or OVER-UNDER, not '{leg.get('type')}'")
+
+
+def _build_bet(batch, row):
+    """
+    Validate one row
+    Returns:
+        (bet type, player, bet amount, list of unsaved SingleBets)
+    """
+    if not isinstance(row, dict):
+        raise ValueError("each bet must be an object")
+    bet_type = str(row.get("bet_type") or "").strip()
+    bet_model = BET_MODELS.get(bet_type)
+    if bet_model is None:
+        raise ValueError(f"bet_type must be one of {', '.join(BET_MODELS)}")
+    player = batch.get_player(row)
+    bet_amount = _parse_amount(row.get("bet_amount"))
+
+    legs = row.get("legs") or []
+    if not isinstance(legs, list) or len(legs) != bet_model.LEG_COUNT:
+        raise ValueError(f"a {bet_type} bet needs exactly {bet_model.LEG_COUNT} legs")
+
+    errors = []
+    single_bets = []
+    for leg_no, leg in enumerate(legs, start=1):
+        try:
+            single_bets.append(_build_single_bet(batch, leg))
+        except ValueError as e:
+            errors.append(f"leg {leg_no}: {e}")
+    if errors:
+        raise ValueError("; ".join(errors))
+    return bet_type, player, bet_amount, single_bets
+
+
+@contextmanager
+def write_transaction(using="default"):
+    """
+    transaction.atomic() for the bet placement and game upsert paths, which read
+    before they write.
+    On SQLite the outermost transaction is opened with BEGIN IMMEDIATE: it takes the
+    write lock up front, waiting up to the busy timeout for it, instead of failing
+    with "database is locked" when a read lock can't be upgraded. Other transactions
+    keep the default deferred BEGIN.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    # transaction_mode is read from the settings when connecting, connect first
+    connection.ensure_connection()
+    default_mode = connection.transaction_mode
+    connection.transaction_mode = "IMMEDIATE"
+    try:
+        with transaction.atomic(using=using):
+            connection.transaction_mode = default_mode
+            yield
+    finally:
+        connection.transaction_mode = default_mode
+
+
+def import_bets(rows, skip_invalid=False):
+    """
+    Validate and create a batch of bets
+    input:
+        rows: list of (row number, row dict), see parse_import()
+        skip_invalid (bool): import the valid rows even if some rows are invalid,
+        by default nothing is imported when any row is invalid
+    Returns:
+        ImportResult
+    """
+    start = time.perf_counter()
+    result = ImportResult()
+    batch = _Batch(rows)
+
+    valid_bets = []
+    for row_number, row in rows:
+        try:
+            valid_bets.append((row_number, *_build_bet(batch, row)))
+        except ValueError as e:
+            result.errors.append((row_number, str(e)))
+
+    if result.errors and not skip_invalid:
+        result.skipped_count = len(rows)
+        result.elapsed_seconds = time.perf_counter() - start
+        return result
+    result.skipped_count = len(result.errors)
+
+    # Bulk creation skips SingleBet.save(), so legs on finished games get their
+    # outcome here, each game being evaluated once, and the bets their payout
+    single_bets = [single_bet for *_, legs in valid_bets for single_bet in legs]
+    with game_outcome_cache():
+        for single_bet in single_bets:
+            single_bet.outcome = single_bet.determine_outcome()
+
+    with write_transaction():
+        SingleBet.objects.bulk_create(single_bets, batch_size=BATCH_SIZE)
+
+        for bet_type, bet_model in BET_MODELS.items():
+            row_numbers = []
+            bets = []
+            for row_number, row_bet_type, player, bet_amount, legs in valid_bets:
+                if row_bet_type != bet_type:
+                    continue
+                row_numbers.append(row_number)
+                bet = bet_model(
+                    player=player,
+                    bet_amount=bet_amount,
+                    **{
+                        f"single_bet{leg_no}": single_bet
+                        for leg_no, single_bet in enumerate(legs, start=1)
+                    },
+                )
+                # Bets whose legs are all decided are settled right away
+                bet.payout = bet.payout_for_outcomes([leg.outcome for leg in legs])
+                bets.append(bet)
+            if bets:
+                bet_model.objects.bulk_create(bets, batch_size=BATCH_SIZE)
+                # bulk_create sends no post_save, mirror the bets and player totals
+                create_bet_slips(bets)
+                result.created_count += len(bets)
+                result.created_bets += [
+                    (row_number, bet_type, bet.pk)
+                    for row_number, bet in zip(row_numbers, bets)
+                ]
+
+    result.created_bets.sort()
+    result.elapsed_seconds = time.perf_counter() - start
+    return result
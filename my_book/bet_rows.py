@@ -0,0 +1,104 @@
+"""
+Hydration of BetSlips into the rows rendered by the bet tables
+
+Whatever the number of bets, a page is hydrated with at most two queries: the
+players (skipped when the slips were loaded with select_related("player")) and the
+legs joined with their SingleBet and Game. Every leg's display strings and outcome
+are computed here, so the templates never touch a model.
+"""
+
+from django.db.models import prefetch_related_objects
+
+from .models import BetLeg
+
+MAX_LEGS = 4
+
+# Leg outcome -> css class, any other outcome is shown as stored, unstyled
+OUTCOME_CLASSES = {
+    "Win": "text-green",
+    "Loss": "text-red",
+    "Tie": "text-white",
+    "Pending": "text-yellow",
+    "Invalid": "text-grey",
+}
+
+
+def get_leg_pick(single_bet_type, selected_team, is_over, over_under_points):
+    """Return the display string of a leg's pick, e.g. 'RAVENS' or 'OVER 44.5'"""
+    if single_bet_type == "WINNER":
+        return (selected_team or "").upper()
+    return f"{'OVER' if is_over else 'UNDER'} {over_under_points}"
+
+
+def get_leg_rows(bet_slip_ids):
+    """
+    Return {bet slip id: [leg row, ...]} in leg order, with one query
+    Each leg row is a dict of game, pick, outcome and outcome_class
+    """
+    legs = (
+        BetLeg.objects.filter(bet_id__in=bet_slip_ids)
+        .order_by("bet_id", "leg_no")
+        .values_list(
+            "bet_id",
+            "single_bet__single_bet_type",
+            "single_bet__selected_team",
+            "single_bet__is_over",
+            "single_bet__outcome",
+            "single_bet__game__name",
+            "single_bet__game__over_under_points",
+        )
+    )
+
+    leg_rows = {}
+    for (
+        bet_id,
+        single_bet_type,
+        selected_team,
+        is_over,
+        outcome,
+        game_name,
+        over_under_points,
+    ) in legs:
+        leg_rows.setdefault(bet_id, []).append(
+            {
+                "game": game_name,
+                "pick": get_leg_pick(
+                    single_bet_type, selected_team, is_over, over_under_points
+                ),
+                "outcome": outcome,
+                "outcome_class": OUTCOME_CLASSES.get(outcome, ""),
+            }
+        )
+    return leg_rows
+
+
+def hydrate_bet_slips(bet_slips, start_index=1):
+    """
+    Hydrate BetSlips (a queryset or a list) into the list of dicts rendered by the
+    bet tables, with a fixed number of queries
+    input:
+        start_index: row number of the first bet slip
+    Returns:
+        list of dicts, with "legs" padded with None up to 4 legs
+    """
+    bet_slips = list(bet_slips)
+    prefetch_related_objects(bet_slips, "player")
+    leg_rows = get_leg_rows([bet_slip.pk for bet_slip in bet_slips])
+
+    rows = []
+    for index, bet_slip in enumerate(bet_slips, start=start_index):
+        legs = leg_rows.get(bet_slip.pk, [])
+        rows.append(
+            {
+                "index": index,
+                "bet_pk": bet_slip.bet_id,
+                "player_name": bet_slip.player.name,
+                "player_id": bet_slip.player_id,
+                "bet_type": bet_slip.bet_type,
+                "amount": bet_slip.bet_amount,
+                "payout": bet_slip.payout,
+                # Pad with None for missing legs, up to 4 legs
+                "legs": legs + [None] * (MAX_LEGS - len(legs)),
+            }
+        )
+    return rows
@@ -0,0 +1,306 @@
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from time import perf_counter
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import BetSlip, BetLeg, Player, Straight, Action, Parlay3, Parlay4
+
+# Bet tables mirrored by BetSlip, in the order bets are listed across the app
+MIRRORED_BET_MODELS = [Straight, Action, Parlay3, Parlay4]
+
+# Most ids per IN (...) clause when repairing BetSlips
+REPAIR_BATCH_SIZE = 500
+
+
+@dataclass
+class BetSlipAuditResult:
+    """
+    Drift between the bet tables and their BetSlip mirror, as (bet type, bet id)
+    - missing: bets without a BetSlip
+    - orphaned: BetSlips whose bet no longer exists
+    - mismatched: BetSlips whose player, amount, payout, date or legs differ from the bet
+    """
+
+    checked_count: int = 0
+    missing: list = field(default_factory=list)
+    orphaned: list = field(default_factory=list)
+    mismatched: list = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    @property
+    def drift_count(self):
+        return len(self.missing) + len(self.orphaned) + len(self.mismatched)
+
+
+def get_slip_fields(bet):
+    """Return the BetSlip field values mirrored from a bet instance"""
+    return {
+        "player_id": bet.player_id,
+        "bet_amount": bet.bet_amount,
+        "payout": bet.payout,
+        "created_at": bet.created_at,
+    }
+
+
+def add_to_player_totals(deltas):
+    """
+    Apply deltas to the materialized Player totals with one F() update per player
+    input:
+        deltas: {player id: (betting money delta, payout delta)}
+    """
+    for player_id, (money_delta, payout_delta) in deltas.items():
+        if money_delta or payout_delta:
+            Player.objects.filter(pk=player_id).update(
+                total_betting_money=F("total_betting_money") + money_delta,
+                total_payout=F("total_payout") + payout_delta,
+            )
+
+
+def _add_delta(deltas, player_id, money_delta, payout_delta):
+    """Accumulate a player's betting money and payout deltas"""
+    money, payout = deltas.get(player_id, (Decimal(0), Decimal(0)))
+    deltas[player_id] = (money + money_delta, payout + payout_delta)
+
+
+def sync_bet_slip(bet):
+    """
+    Create or update the BetSlip (and its BetLegs on creation) mirroring a saved bet,
+    and move the player totals by the difference
+    """
+    deltas = {}
+    slip = BetSlip.objects.filter(bet_type=bet.BET_TYPE, bet_id=bet.pk).first()
+    if slip is None:
+        slip = BetSlip.objects.create(
+            bet_type=bet.BET_TYPE, bet_id=bet.pk, **get_slip_fields(bet)
+        )
+        BetLeg.objects.bulk_create(
+            [
+                BetLeg(bet=slip, leg_no=leg_no, single_bet_id=single_bet_id)
+                for leg_no, single_bet_id in enumerate(get_leg_ids(bet), start=1)
+            ]
+        )
+        _add_delta(deltas, bet.player_id, bet.bet_amount, bet.payout or 0)
+    else:
+        # the previous values are taken off the previous player, the new ones added
+        _add_delta(deltas, slip.player_id, -slip.bet_amount, -(slip.payout or 0))
+        _add_delta(deltas, bet.player_id, bet.bet_amount, bet.payout or 0)
+        for field_name, value in get_slip_fields(bet).items():
+            setattr(slip, field_name, value)
+        slip.save()
+
+    add_to_player_totals(deltas)
+    return slip
+
+
+def _bulk_create_slips(bets):
+    """Bulk create the BetSlips and BetLegs of bets of one type, totals untouched"""
+    slips = BetSlip.objects.bulk_create(
+        [
+            BetSlip(bet_type=bet.BET_TYPE, bet_id=bet.pk, **get_slip_fields(bet))
+            for bet in bets
+        ]
+    )
+    BetLeg.objects.bulk_create(
+        [
+            BetLeg(bet=slip, leg_no=leg_no, single_bet_id=single_bet_id)
+            for slip, bet in zip(slips, bets)
+            for leg_no, single_bet_id in enumerate(get_leg_ids(bet), start=1)
+        ]
+    )
+    return slips
+
+
+def create_bet_slips(bets):
+    """
+    Bulk create the BetSlips and BetLegs of freshly bulk-created bets of one type
+    """
+    slips = _bulk_create_slips(bets)
+
+    deltas = {}
+    for bet in bets:
+        _add_delta(deltas, bet.player_id, bet.bet_amount, bet.payout or 0)
+    add_to_player_totals(deltas)
+    return slips
+
+
+def sync_slip_payouts(bet_type, bets):
+    """
+    Copy the payouts of bulk-updated bets of one type to their BetSlips, and move
+    the player totals by the payout differences
+    """
+    payouts = {bet.pk: bet.payout for bet in bets}
+    slips = list(
+        BetSlip.objects.filter(bet_type=bet_type, bet_id__in=list(payouts)).only(
+            "id", "bet_id", "player_id", "payout"
+        )
+    )
+    deltas = {}
+    for slip in slips:
+        new_payout = payouts[slip.bet_id]
+        _add_delta(deltas, slip.player_id, 0, (new_payout or 0) - (slip.payout or 0))
+        slip.payout = new_payout
+    BetSlip.objects.bulk_update(slips, ["payout"])
+    add_to_player_totals(deltas)
+
+
+def delete_bet_slip(bet):
+    """
+    Delete the BetSlip (and its BetLegs) mirroring a deleted bet, and take it off
+    the player totals
+    """
+    slips = BetSlip.objects.filter(bet_type=bet.BET_TYPE, bet_id=bet.pk)
+    deltas = {}
+    for player_id, bet_amount, payout in slips.values_list(
+        "player_id", "bet_amount", "payout"
+    ):
+        _add_delta(deltas, player_id, -bet_amount, -(payout or 0))
+    slips.delete()
+    add_to_player_totals(deltas)
+
+
+def get_leg_ids(bet):
+    """Return the SingleBet ids of a bet in leg order, without loading the legs"""
+    return [getattr(bet, f"single_bet{i}_id") for i in range(1, bet.LEG_COUNT + 1)]
+
+
+def audit_bet_slips():
+    """
+    Compare every bet with its BetSlip and BetLegs, without writing anything.
+    Writes that skip save() and delete() (queryset update(), bulk_update, raw SQL)
+    do not reach the signals, and leave the mirror behind the bet tables.
+
+    Returns:
+        BetSlipAuditResult
+    """
+    start = perf_counter()
+    result = BetSlipAuditResult()
+
+    for bet_model in MIRRORED_BET_MODELS:
+        bet_type = bet_model.BET_TYPE
+        leg_fields = [f"single_bet{i}_id" for i in range(1, bet_model.LEG_COUNT + 1)]
+        bets = {
+            row[0]: (row[1:5], row[5:])
+            for row in bet_model.objects.values_list(
+                "id", "player_id", "bet_amount", "payout", "created_at", *leg_fields
+            )
+        }
+
+        slip_legs = {}
+        for bet_id, single_bet_id in (
+            BetLeg.objects.filter(bet__bet_type=bet_type)
+            .order_by("bet_id", "leg_no")
+            .values_list("bet__bet_id", "single_bet_id")
+        ):
+            slip_legs.setdefault(bet_id, []).append(single_bet_id)
+        slips = {
+            row[0]: (row[1:], tuple(slip_legs.get(row[0], ())))
+            for row in BetSlip.objects.filter(bet_type=bet_type).values_list(
+                "bet_id", "player_id", "bet_amount", "payout", "created_at"
+            )
+        }
+
+        for bet_id, bet_values in bets.items():
+            if bet_id not in slips:
+                result.missing.append((bet_type, bet_id))
+            elif slips[bet_id] != bet_values:
+                result.mismatched.append((bet_type, bet_id))
+        result.orphaned.extend(
+            (bet_type, bet_id) for bet_id in slips if bet_id not in bets
+        )
+        result.checked_count += len(bets)
+
+    result.elapsed_seconds = perf_counter() - start
+    return result
+
+
+def repair_bet_slips(audit_result):
+    """
+    Rebuild the BetSlips found drifting by audit_bet_slips(): orphaned slips are
+    deleted, missing and mismatched ones recreated from their bet.
+    The player totals are not moved, rebuild them from the BetSlips afterwards.
+    Returns:
+        number of BetSlips repaired
+    """
+    stale_ids = {}
+    for bet_type, bet_id in audit_result.orphaned + audit_result.mismatched:
+        stale_ids.setdefault(bet_type, []).append(bet_id)
+    recreate_ids = {}
+    for bet_type, bet_id in audit_result.missing + audit_result.mismatched:
+        recreate_ids.setdefault(bet_type, []).append(bet_id)
+
+    with transaction.atomic():
+        for bet_type, bet_ids in stale_ids.items():
+            for i in range(0, len(bet_ids), REPAIR_BATCH_SIZE):
+                BetSlip.objects.filter(
+                    bet_type=bet_type, bet_id__in=bet_ids[i : i + REPAIR_BATCH_SIZE]
+                ).delete()
+
+        for bet_model in MIRRORED_BET_MODELS:
+            bet_ids = recreate_ids.get(bet_model.BET_TYPE, [])
+            for i in range(0, len(bet_ids), REPAIR_BATCH_SIZE):
+                _bulk_create_slips(
+                    list(
+                        bet_model.objects.filter(
+                            pk__in=bet_ids[i : i + REPAIR_BATCH_SIZE]
+                        )
+                    )
+                )
+
+    return audit_result.drift_count
+
+
+def filter_bet_slips(
+    bet_slips,
+    bet_type=None,
+    player=None,
+    date_from=None,
+    date_to=None,
+    status=None,
+    league=None,
+    game=None,
+):
+    """
+    Narrow a BetSlip queryset down in SQL, every filter is optional
+    input:
+        date_from/date_to (date): inclusive range of the day the bet was placed
+        status: "settled" (has a payout) or "pending" (no payout yet)
+        league/game: bets with at least one leg on a game of that league / on that game
+    Returns:
+        the filtered queryset
+    """
+    if bet_type:
+        bet_slips = bet_slips.filter(bet_type=bet_type)
+    if player:
+        bet_slips = bet_slips.filter(player=player)
+
+    # Compare created_at with datetime bounds instead of __date, so the index is used
+    if date_from:
+        bet_slips = bet_slips.filter(
+            created_at__gte=timezone.make_aware(datetime.combine(date_from, time.min))
+        )
+    if date_to:
+        bet_slips = bet_slips.filter(
+            created_at__lt=timezone.make_aware(
+                datetime.combine(date_to + timedelta(days=1), time.min)
+            )
+        )
+
+    if status == "settled":
+        bet_slips = bet_slips.filter(payout__isnull=False)
+    elif status == "pending":
+        bet_slips = bet_slips.filter(payout__isnull=True)
+
+    # Legs are matched in a subquery, so a bet with several legs on a game is listed once
+    if league or game:
+        legs = BetLeg.objects.all()
+        if league:
+            legs = legs.filter(single_bet__game__league=league)
+        if game:
+            legs = legs.filter(single_bet__game=game)
+        bet_slips = bet_slips.filter(id__in=legs.values("bet_id"))
+
+    return bet_slips
@@ -0,0 +1,116 @@
+"""
+Streaming export of bets, their legs, outcomes and payouts as CSV or NDJSON
+
+Bet slips are read with QuerySet.iterator(chunk_size=...) and their legs are loaded
+one chunk at a time, so memory stays flat whatever the number of bets.
+"""
+
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .bet_rows import MAX_LEGS, get_leg_rows
+
+EXPORT_FORMATS = ["csv", "ndjson"]
+CHUNK_SIZE = 2000
+
+BET_COLUMNS = [
+    "bet_type",
+    "bet_id",
+    "player_id",
+    "player_name",
+    "created_at",
+    "bet_amount",
+    "payout",
+    "status",
+]
+LEG_COLUMNS = ["game", "pick", "outcome"]
+CSV_COLUMNS = BET_COLUMNS + [
+    f"leg{leg_no}_{column}"
+    for leg_no in range(1, MAX_LEGS + 1)
+    for column in LEG_COLUMNS
+]
+
+
+class Echo:
+    """A file-like object whose write() returns the value, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def iter_bet_records(bet_slips, chunk_size=CHUNK_SIZE):
+    """
+    Yield one dict per bet slip, oldest first, with its legs
+    input:
+        bet_slips: BetSlip queryset, already filtered
+    """
+    bet_slips = (
+        bet_slips.select_related("player")
+        .order_by("created_at", "id")
+        .iterator(chunk_size=chunk_size)
+    )
+
+    chunk = []
+    for bet_slip in bet_slips:
+        chunk.append(bet_slip)
+        if len(chunk) >= chunk_size:
+            yield from _get_chunk_records(chunk)
+            chunk = []
+    if chunk:
+        yield from _get_chunk_records(chunk)
+
+
+def _get_chunk_records(bet_slips):
+    """Return the records of a chunk of bet slips, with one query for their legs"""
+    leg_rows = get_leg_rows([bet_slip.pk for bet_slip in bet_slips])
+    return [
+        {
+            "bet_type": bet_slip.bet_type,
+            "bet_id": bet_slip.bet_id,
+            "player_id": bet_slip.player_id,
+            "player_name": bet_slip.player.name,
+            "created_at": bet_slip.created_at,
+            "bet_amount": bet_slip.bet_amount,
+            "payout": bet_slip.payout,
+            "status": "Pending" if bet_slip.payout is None else "Settled",
+            "legs": [
+                {column: leg[column] for column in LEG_COLUMNS}
+                for leg in leg_rows.get(bet_slip.pk, [])
+            ],
+        }
+        for bet_slip in bet_slips
+    ]
+
+
+def iter_csv(records):
+    """Yield the records as CSV lines, header first, one column group per leg"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for record in records:
+        row = [record[column] for column in BET_COLUMNS]
+        for leg_no in range(MAX_LEGS):
+            if leg_no < len(record["legs"]):
+                row += [record["legs"][leg_no][column] for column in LEG_COLUMNS]
+            else:
+                row += [""] * len(LEG_COLUMNS)
+        yield writer.writerow(row)
+
+
+def iter_ndjson(records):
+    """Yield the records as newline-delimited JSON"""
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder) + "\n"
+
+
+def iter_export(bet_slips, export_format, chunk_size=CHUNK_SIZE):
+    """
+    Yield the export of the given bet slips as chunks of text
+    input:
+        export_format: "csv" or "ndjson"
+    """
+    records = iter_bet_records(bet_slips, chunk_size)
+    if export_format == "ndjson":
+        return iter_ndjson(records)
+    return iter_csv(records)
@@ -1,17 +1,57 @@
-import http.client
+from concurrent.futures import ThreadPoolExecutor
+
 from django.conf import settings
-import json
 
+from .api_cache import get_cache_key, get_cached_games, set_cached_games
+from .api_client import ApiError, get_api_client
+from .api_fixtures import get_fixture_mode, load_fixture, save_fixture
+from .single_flight import SingleFlight, file_lock
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+# Concurrent fetches of the same league and date share one upstream request
+single_flight = SingleFlight()
 
-def fetch_games_by_date(league, date):
+
+def fetch_games_by_date(league, date, refresh=False):
     """
     fetch games by date and league from
     HOST: v1.american-football.api-sports.io
     league: 1 - NFL, 2 - NCAA
     date format: yyyy-mm-dd
+    refresh: skip the cached response, the new response is cached anyway
+    The call goes through the shared keep-alive client, see api_client.py,
+    responses are cached per league and date, see api_cache.py, and can be
+    recorded or replayed from disk, see api_fixtures.py
+    Concurrent calls for the same league and date share one request, and its
+    result, which must not be modified, see single_flight.py
     """
 
     print(f"fetch_game_by_date: {league}, {date}")
+    if not refresh:
+        games_data = get_cached_games(league, date)
+        if games_data is not None:
+            return games_data
+
+    return single_flight.do(
+        (league, str(date)), lambda: _fetch_games(league, date, refresh)
+    )
+
+
+def _fetch_games(league, date, refresh):
+    """Fetch the games of a league and date, one worker process at a time if API_LOCK_DIR is set"""
+    with file_lock(
+        getattr(settings, "API_LOCK_DIR", ""), get_cache_key(league, date)
+    ) as locked:
+        # Another worker may have fetched the date while this one waited for the lock
+        if locked and not refresh:
+            games_data = get_cached_games(league, date)
+            if games_data is not None:
+                return games_data
+        return _fetch_games_from_api(league, date)
+
+
+def _fetch_games_from_api(league, date):
     league_id = ""
     if league == "NFL":
         league_id = "1"
@@ -19,34 +59,51 @@ def fetch_games_by_date(league, date):
         league_id = "2"
     else:
         print("fetch_data.fetch_game_by_date(): Error - Invalid League ID")
-    conn = http.client.HTTPSConnection(settings.API_HOST)
-    headers = {
-        "x-rapidapi-host": settings.API_HOST,
-        "x-rapidapi-key": settings.API_KEY,
-    }
-
-    conn.request(
-        "GET",
-        f"/games?league={league_id}&date={date}&timezone=America/New_York",
-        headers=headers,
-    )
 
-    try:
-        res = conn.getresponse()
-        if res.status != 200:
-            # If the response code is not OK, raise an exception
-            raise Exception(f"API request failed with status code {res.status}")
-
-        # Read the response data and decode it
-        data = res.read().decode("utf-8")
-        games_data = json.loads(data)
-
-        # print(games_data)
-
-        # Return the games data as JSON (or use as needed)
+    fixture_mode = get_fixture_mode()
+    if fixture_mode == "replay":
+        games_data = load_fixture(league, date)
+        if games_data is None:
+            print(f"Error fetching games: no recorded response for {league} {date}")
+            return None
+        set_cached_games(league, date, games_data)
         return games_data
 
-    except Exception as e:
+    try:
+        games_data = get_api_client().get_json(
+            "/games",
+            {"league": league_id, "date": date, "timezone": "America/New_York"},
+        )
+
+    except ApiError as e:
         # Handle any errors that occur during the request
         print(f"Error fetching games: {str(e)}")
         return None
+
+    if fixture_mode == "record":
+        save_fixture(league, date, games_data)
+    set_cached_games(league, date, games_data)
+    # Return the games data as JSON (or use as needed)
+    return games_data
+
+
+def fetch_games_by_dates(league, dates, max_concurrency=None):
+    """
+    fetch the games of several dates concurrently, with at most max_concurrency
+    requests in flight (default: settings.API_MAX_CONCURRENCY)
+    Returns:
+        {date: games data, or None if the fetch failed}
+    """
+    dates = list(dict.fromkeys(dates))
+    if not dates:
+        return {}
+    if max_concurrency is None:
+        max_concurrency = getattr(
+            settings, "API_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY
+        )
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(max_concurrency, len(dates)))
+    ) as executor:
+        results = executor.map(lambda date: fetch_games_by_date(league, date), dates)
+        return dict(zip(dates, results))
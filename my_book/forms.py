@@ -118,7 +118,7 @@ class Parlay4BetForm(forms.ModelForm):
 
 
 # Searching and Filtering Data
-class BetTypeFilterForm(forms.Form):
+class BetFilterForm(forms.Form):
     BET_TYPE_CHOICES = [
         ("", "All"),  # Option for displaying all bets
         ("Straight", "Straight"),
@@ -126,11 +126,73 @@ class BetTypeFilterForm(forms.Form):
         ("Parlay3", "Parlay3"),
         ("Parlay4", "Parlay4"),
     ]
+    STATUS_CHOICES = [
+        ("", "All"),
+        ("pending", "Pending"),
+        ("settled", "Settled"),
+    ]
 
     bet_type_filter = forms.ChoiceField(
         choices=BET_TYPE_CHOICES,
         required=False,
+        label="Bet type",
         widget=forms.Select(
             attrs={"class": "form-control", "id": "bet-type-filter-form"}
         ),
     )
+    player = forms.ModelChoiceField(
+        queryset=Player.objects.order_by("name"),
+        required=False,
+        empty_label="All",
+        widget=forms.Select(attrs={"class": "form-control"}),
+    )
+    date_from = forms.DateField(
+        required=False,
+        label="Placed from",
+        widget=forms.DateInput(attrs={"class": "form-control", "type": "date"}),
+    )
+    date_to = forms.DateField(
+        required=False,
+        label="Placed to",
+        widget=forms.DateInput(attrs={"class": "form-control", "type": "date"}),
+    )
+    status = forms.ChoiceField(
+        choices=STATUS_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={"class": "form-control"}),
+    )
+    league = forms.ChoiceField(
+        choices=[("", "All")] + Game.LEAGUES,
+        required=False,
+        widget=forms.Select(attrs={"class": "form-control"}),
+    )
+    # A game id, the games are not listed so the form stays small
+    game = forms.ModelChoiceField(
+        queryset=Game.objects.all(),
+        required=False,
+        label="Game ID",
+        widget=forms.NumberInput(attrs={"class": "form-control"}),
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get("date_from")
+        date_to = cleaned_data.get("date_to")
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError("'Placed from' must be before 'Placed to'.")
+        return cleaned_data
+
+    def get_filters(self):
+        """Return the keyword arguments of bet_slips.filter_bet_slips() for the valid fields"""
+        if not self.is_valid():
+            return {}
+        data = self.cleaned_data
+        return {
+            "bet_type": data.get("bet_type_filter"),
+            "player": data.get("player"),
+            "date_from": data.get("date_from"),
+            "date_to": data.get("date_to"),
+            "status": data.get("status"),
+            "league": data.get("league"),
+            "game": data.get("game"),
+        }
@@ -0,0 +1,258 @@
+"""
+Bulk creation and update of games
+
+Every write of games coming from the sports API or the review page goes through
+here. Incoming values are compared with the stored game first and unchanged games
+are skipped, then all the changed games are written with one bulk_update and the
+new games with one bulk_create(update_conflicts=True), whatever the number of games.
+The writes run in a write_transaction(), where the keys of the new games are looked
+up again: a game created by someone else meanwhile is updated and re-settled like
+any existing game instead of being reported as created.
+"""
+
+import time
+from dataclasses import dataclass, field
+
+from django.utils import timezone
+
+from .api_cache import FINAL_STATUSES
+from .bet_import import write_transaction
+from .models import Game
+
+GAME_KEY_FIELDS = ["game_date", "team_a", "team_b"]
+# Fields computed by Game.set_derived_fields()
+DERIVED_FIELDS = ["name", "total_points"]
+LIVE_FIELDS = ["score_team_a", "score_team_b", "team_a_logo_url", "team_b_logo_url"]
+BATCH_SIZE = 500
+
+
+@dataclass
+class UpsertResult:
+    """
+    Summary of one upsert
+    - settle_game_ids: ids of the updated games whose result changed, their bets
+      need to be re-settled
+    """
+
+    created_games: list = field(default_factory=list)
+    updated_games: list = field(default_factory=list)
+    unchanged_count: int = 0
+    settle_game_ids: list = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+
+def get_live_game_values(live_game_data):
+    """
+    Return the Game field values given by the live data of a game, the missing
+    scores and logos are left out and a game is only ever marked finished
+    input:
+        live_game_data: dict of score_team_a, score_team_b, team_a_logo_url,
+        team_b_logo_url and status
+    """
+    values = {
+        field_name: live_game_data[field_name]
+        for field_name in LIVE_FIELDS
+        if live_game_data.get(field_name) not in ["None", None]
+    }
+    if live_game_data.get("status") in FINAL_STATUSES:
+        values["is_finished"] = True
+    return values
+
+
+def get_live_games_lookup(raw_games_response):
+    """
+    Preprocess the games of an API response into a clean format
+    Returns:
+        {(away team, home team, date string): live game data}
+    """
+    games_lookup = {}
+    for raw_game in raw_games_response:
+        game_key = (
+            raw_game["teams"]["away"]["name"],
+            raw_game["teams"]["home"]["name"],
+            raw_game["game"]["date"]["date"],
+        )
+        games_lookup[game_key] = {
+            "team_a": raw_game["teams"]["away"]["name"],
+            "team_b": raw_game["teams"]["home"]["name"],
+            "score_team_a": raw_game["scores"]["away"]["total"],
+            "score_team_b": raw_game["scores"]["home"]["total"],
+            "team_a_logo_url": raw_game["teams"]["away"]["logo"],
+            "team_b_logo_url": raw_game["teams"]["home"]["logo"],
+            "status": raw_game["game"]["status"]["long"],
+        }
+    return games_lookup
+
+
+def get_live_game_changes(db_games, games_lookup):
+    """
+    Match games of the database with their live data, in either team order
+    input:
+        games_lookup: see get_live_games_lookup()
+    Returns:
+        list of (game, dict of field values) for update_games()
+    """
+    game_changes = []
+    for db_game in db_games:
+        game_key = (db_game.team_a, db_game.team_b, str(db_game.game_date))
+        reverse_game_key = (db_game.team_b, db_game.team_a, str(db_game.game_date))
+
+        live_game_data = games_lookup.get(game_key) or games_lookup.get(
+            reverse_game_key
+        )
+        if live_game_data:
+            game_changes.append((db_game, get_live_game_values(live_game_data)))
+    return game_changes
+
+
+def _to_python(values):
+    """Convert values to the Python type of their Game field, e.g. "35" -> Decimal"""
+    return {
+        field_name: Game._meta.get_field(field_name).to_python(value)
+        for field_name, value in values.items()
+    }
+
+
+def apply_game_changes(game, values):
+    """
+    Set the values that differ from the game's current ones
+    Returns:
+        list of the changed fields, including the derived ones, empty if none
+    """
+    changed_fields = []
+    for field_name, value in _to_python(values).items():
+        if getattr(game, field_name) != value:
+            setattr(game, field_name, value)
+            changed_fields.append(field_name)
+
+    if changed_fields:
+        derived_values = [getattr(game, field_name) for field_name in DERIVED_FIELDS]
+        game.set_derived_fields()
+        changed_fields += [
+            field_name
+            for field_name, value in zip(DERIVED_FIELDS, derived_values)
+            if getattr(game, field_name) != value
+        ]
+    return changed_fields
+
+
+def update_games(game_changes):
+    """
+    Apply changes to games and save the changed ones with one bulk_update
+    input:
+        game_changes: list of (game, dict of field values)
+    Returns:
+        UpsertResult
+    """
+    start = time.perf_counter()
+    result = UpsertResult()
+    updated_fields = set()
+    now = timezone.now()
+
+    for game, values in game_changes:
+        changed_fields = apply_game_changes(game, values)
+        if not changed_fields:
+            result.unchanged_count += 1
+            continue
+        # bulk_update() skips auto_now
+        game.updated_at = now
+        result.updated_games.append(game)
+        updated_fields.update(changed_fields)
+        if set(changed_fields) & set(Game.OUTCOME_FIELDS):
+            result.settle_game_ids.append(game.pk)
+
+    if result.updated_games:
+        Game.objects.bulk_update(
+            result.updated_games,
+            sorted(updated_fields) + ["updated_at"],
+            batch_size=BATCH_SIZE,
+        )
+    result.elapsed_seconds = time.perf_counter() - start
+    return result
+
+
+def _get_existing_games(keys):
+    """
+    Returns:
+        {(game_date, team_a, team_b): game} of the stored games among keys
+    """
+    keys = set(keys)
+    return {
+        (game.game_date, game.team_a, game.team_b): game
+        for game in Game.objects.filter(
+            game_date__in={game_date for game_date, _, _ in keys}
+        )
+        if (game.game_date, game.team_a, game.team_b) in keys
+    }
+
+
+def _get_game_change(game, values):
+    """Return (game, values without the key fields) for update_games()"""
+    return (
+        game,
+        {
+            field_name: value
+            for field_name, value in values.items()
+            if field_name not in GAME_KEY_FIELDS
+        },
+    )
+
+
+def upsert_games(games_data):
+    """
+    Create the games that don't exist yet and update the others, matched on
+    (game_date, team_a, team_b)
+    input:
+        games_data: list of dicts of Game field values, including the key fields
+    Returns:
+        UpsertResult
+    """
+    start = time.perf_counter()
+
+    # The last row wins if a game is given twice
+    rows = {}
+    for game_data in games_data:
+        values = _to_python(game_data)
+        rows[tuple(values[key] for key in GAME_KEY_FIELDS)] = values
+
+    existing_games = _get_existing_games(rows)
+    game_changes = [
+        _get_game_change(game, rows[key]) for key, game in existing_games.items()
+    ]
+    new_keys = [key for key in rows if key not in existing_games]
+
+    with write_transaction():
+        # The games created by someone else since the lookup above are updated
+        for key, game in _get_existing_games(new_keys).items():
+            game_changes.append(_get_game_change(game, rows[key]))
+            new_keys.remove(key)
+        result = update_games(game_changes)
+
+        new_games = []
+        for key in new_keys:
+            game = Game(**rows[key])
+            game.set_derived_fields()
+            new_games.append(game)
+        if new_games:
+            # Only backends without write_transaction() locking can still conflict
+            update_fields = sorted(
+                {
+                    field_name
+                    for values in rows.values()
+                    for field_name in values
+                    if field_name not in GAME_KEY_FIELDS
+                }
+                | set(DERIVED_FIELDS)
+                | {"updated_at"}
+            )
+            Game.objects.bulk_create(
+                new_games,
+                batch_size=BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=GAME_KEY_FIELDS,
+                update_fields=update_fields,
+            )
+            result.created_games = new_games
+
+    result.elapsed_seconds = time.perf_counter() - start
+    return result
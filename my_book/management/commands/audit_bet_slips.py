@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from my_book.bet_slips import audit_bet_slips, repair_bet_slips
+from my_book.settlement import rebuild_player_totals
+
+
+class Command(BaseCommand):
+    help = "Compare every bet with its BetSlip mirror and report (or repair with --fix) the drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Rebuild the drifting BetSlips, then the player totals",
+        )
+
+    def handle(self, *args, **options):
+        result = audit_bet_slips()
+
+        for label, drift in [
+            ("missing", result.missing),
+            ("orphaned", result.orphaned),
+            ("mismatched", result.mismatched),
+        ]:
+            for bet_type, bet_id in drift:
+                self.stdout.write(f"{bet_type}(pk={bet_id}): {label} BetSlip")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {result.checked_count} bets in {result.elapsed_seconds * 1000:.0f} ms, "
+                f"{len(result.missing)} missing, {len(result.orphaned)} orphaned and "
+                f"{len(result.mismatched)} mismatched BetSlips."
+            )
+        )
+
+        if options["fix"] and result.drift_count:
+            repaired_count = repair_bet_slips(result)
+            player_count = rebuild_player_totals()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Repaired {repaired_count} BetSlips and rebuilt the totals of "
+                    f"{player_count} players."
+                )
+            )
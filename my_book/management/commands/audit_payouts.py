@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from my_book.settlement import audit_payouts
+
+
+class Command(BaseCommand):
+    help = "Recompute every payout from the current game results and report the bets whose stored payout differs"
+
+    def handle(self, *args, **options):
+        result = audit_payouts()
+
+        for bet_type, bet_pk, stored, expected in result.mismatches:
+            self.stdout.write(
+                f"{bet_type}(pk={bet_pk}): stored {stored}, expected {expected}"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {result.checked_count} bets in {result.elapsed_seconds * 1000:.0f} ms, "
+                f"{len(result.mismatches)} mismatches."
+            )
+        )
@@ -0,0 +1,194 @@
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from my_book.models import Game, Player
+from my_book.settlement import BET_MODELS
+
+
+def _get_cookies(response):
+    """Return {name: value} of the cookies set by an http.client response"""
+    cookies = SimpleCookie()
+    for header in response.msg.get_all("Set-Cookie") or []:
+        cookies.load(header)
+    return {name: morsel.value for name, morsel in cookies.items()}
+
+
+class Command(BaseCommand):
+    help = "Place random bets through the JSON bet API of a running server and report the sustained placements per second"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--host", default="localhost:8000", help="Default: localhost:8000."
+        )
+        parser.add_argument("--https", action="store_true")
+        parser.add_argument("--username", required=True)
+        parser.add_argument("--password", required=True)
+        parser.add_argument(
+            "--duration", type=float, default=10.0, help="Seconds (default: 10)."
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=4, help="Client threads (default: 4)."
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1, help="Bets per request (default: 1)."
+        )
+
+    def _connect(self, options):
+        connection_class = (
+            http.client.HTTPSConnection
+            if options["https"]
+            else http.client.HTTPConnection
+        )
+        return connection_class(options["host"], timeout=30)
+
+    def _login(self, options):
+        """Log in through the login form, return the session cookie header and CSRF token"""
+        conn = self._connect(options)
+        login_url = reverse("login")
+        conn.request("GET", login_url)
+        response = conn.getresponse()
+        response.read()
+        csrf_token = _get_cookies(response).get("csrftoken")
+        if not csrf_token:
+            raise CommandError(f"No CSRF cookie from {login_url}.")
+
+        conn.request(
+            "POST",
+            login_url,
+            body=urlencode(
+                {
+                    "username": options["username"],
+                    "password": options["password"],
+                    "csrfmiddlewaretoken": csrf_token,
+                }
+            ),
+            headers={
+                "Content-Type": "application/x-www-form-urlencoded",
+                "Cookie": f"csrftoken={csrf_token}",
+            },
+        )
+        response = conn.getresponse()
+        response.read()
+        cookies = _get_cookies(response)
+        conn.close()
+        if "sessionid" not in cookies:
+            raise CommandError("Login failed, check the username and password.")
+        csrf_token = cookies.get("csrftoken", csrf_token)
+        return f"csrftoken={csrf_token}; sessionid={cookies['sessionid']}", csrf_token
+
+    def handle(self, *args, **options):
+        players = list(Player.objects.values_list("name", flat=True))
+        games = list(
+            Game.objects.filter(is_finished=False).values_list("id", "team_a")
+        ) or list(Game.objects.values_list("id", "team_a"))
+        if not players or not games:
+            raise CommandError("The database needs players and games.")
+
+        cookie, csrf_token = self._login(options)
+        api_url = reverse("bet-place-api")
+        batch_size = max(1, options["batch_size"])
+        deadline = time.perf_counter() + options["duration"]
+
+        def random_bet():
+            bet_type = random.choice(list(BET_MODELS))
+            legs = []
+            for game_id, team_a in random.sample(
+                games, min(BET_MODELS[bet_type].LEG_COUNT, len(games))
+            ):
+                if random.random() < 0.5:
+                    legs.append({"game": game_id, "type": "WINNER", "team": team_a})
+                else:
+                    legs.append(
+                        {
+                            "game": game_id,
+                            "type": "OVER-UNDER",
+                            "over": random.random() < 0.5,
+                        }
+                    )
+            return {
+                "player": random.choice(players),
+                "bet_type": bet_type,
+                "bet_amount": f"{random.randint(500, 20000) / 100:.2f}",
+                "legs": legs,
+            }
+
+        lock = threading.Lock()
+        latencies = []
+        statuses = {}
+        placed = [0]
+
+        def worker():
+            conn = self._connect(options)
+            while time.perf_counter() < deadline:
+                body = json.dumps([random_bet() for _ in range(batch_size)])
+                start = time.perf_counter()
+                try:
+                    conn.request(
+                        "POST",
+                        api_url,
+                        body=body,
+                        headers={
+                            "Content-Type": "application/json",
+                            "Cookie": cookie,
+                            "X-CSRFToken": csrf_token,
+                            "Idempotency-Key": str(uuid.uuid4()),
+                        },
+                    )
+                    response = conn.getresponse()
+                    data = json.loads(response.read() or b"{}")
+                    status = response.status
+                except (OSError, http.client.HTTPException, ValueError) as e:
+                    conn.close()
+                    conn = self._connect(options)
+                    status = type(e).__name__
+                    data = {}
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] = statuses.get(status, 0) + 1
+                    placed[0] += data.get("created_count", 0)
+            conn.close()
+
+        self.stdout.write(
+            f"Placing bets on {options['host']} for {options['duration']:.0f}s with "
+            f"{options['concurrency']} clients, {batch_size} bets per request..."
+        )
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(max(1, options["concurrency"]))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        if not latencies:
+            raise CommandError("No request completed.")
+        latencies.sort()
+        percentile = lambda p: latencies[
+            min(len(latencies) - 1, int(len(latencies) * p))
+        ]
+        self.stdout.write(f"Responses: {statuses}")
+        self.stdout.write(
+            f"Latency ms: mean {statistics.mean(latencies) * 1000:.1f}, "
+            f"p50 {percentile(0.50) * 1000:.1f}, p95 {percentile(0.95) * 1000:.1f}, "
+            f"p99 {percentile(0.99) * 1000:.1f}"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Placed {placed[0]} bets in {len(latencies)} requests over {elapsed:.1f}s: "
+                f"{placed[0] / elapsed:.0f} bets/s, {len(latencies) / elapsed:.0f} requests/s."
+            )
+        )
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from my_book.bet_slips import filter_bet_slips
+from my_book.exports import CHUNK_SIZE, EXPORT_FORMATS, iter_export
+from my_book.forms import BetFilterForm
+from my_book.models import BetSlip
+
+
+class Command(BaseCommand):
+    help = "Stream bets with their legs, outcomes and payouts as CSV or NDJSON, with the same filters as the bet list"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=EXPORT_FORMATS, default="csv", help="Default: csv."
+        )
+        parser.add_argument(
+            "--output", "-o", help="File to write to (default: standard output)."
+        )
+        parser.add_argument("--bet-type", help="Straight, Action, Parlay3 or Parlay4.")
+        parser.add_argument("--player", type=int, help="Player id.")
+        parser.add_argument("--date-from", help="First day the bets were placed.")
+        parser.add_argument("--date-to", help="Last day the bets were placed.")
+        parser.add_argument("--status", choices=["pending", "settled"])
+        parser.add_argument("--league", help="NFL or NCAA.")
+        parser.add_argument("--game", type=int, help="Game id.")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        # The options are validated and converted by the bet list filter form
+        bet_filter_form = BetFilterForm(
+            {
+                "bet_type_filter": options["bet_type"],
+                "player": options["player"],
+                "date_from": options["date_from"],
+                "date_to": options["date_to"],
+                "status": options["status"],
+                "league": options["league"],
+                "game": options["game"],
+            }
+        )
+        if not bet_filter_form.is_valid():
+            raise CommandError(bet_filter_form.errors.as_text())
+        bet_slips = filter_bet_slips(
+            BetSlip.objects.all(), **bet_filter_form.get_filters()
+        )
+
+        chunks = iter_export(
+            bet_slips, options["format"], max(1, options["chunk_size"])
+        )
+        if not options["output"]:
+            for text in chunks:
+                self.stdout.write(text, ending="")
+            return
+
+        with open(options["output"], "w", newline="", encoding="utf-8") as output:
+            for text in chunks:
+                output.write(text)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Exported the bets to {options['output']}.")
+        )
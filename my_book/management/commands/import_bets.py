@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from my_book.bet_import import (
+    IMPORT_FORMATS,
+    ImportFormatError,
+    import_bets,
+    parse_import,
+)
+
+
+class Command(BaseCommand):
+    help = "Validate and bulk import a batch of bets from a CSV or JSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSON file of bets.")
+        parser.add_argument(
+            "--format",
+            choices=IMPORT_FORMATS,
+            help="Default: from the file extension.",
+        )
+        parser.add_argument(
+            "--skip-invalid",
+            action="store_true",
+            help="Import the valid rows even if some rows are invalid.",
+        )
+
+    def handle(self, *args, **options):
+        import_format = options["format"] or options["path"].rsplit(".", 1)[-1].lower()
+        try:
+            with open(options["path"], encoding="utf-8-sig") as f:
+                rows = parse_import(f.read(), import_format)
+        except (OSError, ImportFormatError) as e:
+            raise CommandError(str(e))
+
+        result = import_bets(rows, skip_invalid=options["skip_invalid"])
+
+        for row_number, error in result.errors:
+            self.stderr.write(f"row {row_number}: {error}")
+
+        if result.errors and not options["skip_invalid"]:
+            raise CommandError(
+                f"{len(result.errors)} invalid rows, nothing was imported."
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result.created_count} bets ({result.skipped_count} skipped) "
+                f"in {result.elapsed_seconds:.2f}s."
+            )
+        )
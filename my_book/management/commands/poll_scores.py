@@ -0,0 +1,221 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from my_book.api_cache import FINAL_STATUSES
+from my_book.fetch_data import DEFAULT_MAX_CONCURRENCY, fetch_games_by_date
+from my_book.game_upsert import (
+    get_live_game_changes,
+    get_live_games_lookup,
+    update_games,
+)
+from my_book.models import Game
+from my_book.settlement import settle_bets_for_games
+
+# Statuses of games that are not being played, any other unfinished status is live
+IDLE_STATUSES = (
+    "Not Started",
+    "Scheduled",
+    "Postponed",
+    "Delayed",
+    "Suspended",
+    "Canceled",
+    "Cancelled",
+)
+# Statuses of games still expected to kick off at their scheduled time
+UPCOMING_STATUSES = ("Not Started", "Scheduled")
+
+
+@dataclass
+class PollGroup:
+    """The unfinished games of one league and date, polled with one API call"""
+
+    league: str
+    game_date: object
+    interval: float
+    next_poll_at: float = 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Poll the sports API for the scores of the unfinished games and save them in batches: "
+        "fast while games are in progress, backing off while they are scheduled, and no "
+        "more once they are finished. Set API_HOST and API_USE_TLS=false to poll a local "
+        "stub server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--live-interval",
+            type=float,
+            default=30.0,
+            help="Seconds between polls of a date with games in progress (default: 30).",
+        )
+        parser.add_argument(
+            "--idle-interval",
+            type=float,
+            default=300.0,
+            help="First interval for a date with scheduled games, doubled at each poll (default: 300).",
+        )
+        parser.add_argument(
+            "--max-interval",
+            type=float,
+            default=3600.0,
+            help="Longest interval between two polls of a date (default: 3600).",
+        )
+        parser.add_argument(
+            "--days-ahead",
+            type=int,
+            default=1,
+            help="Poll unfinished games up to this many days from today (default: 1).",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=getattr(settings, "API_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY),
+            help="Max concurrent API requests (default: API_MAX_CONCURRENCY).",
+        )
+        parser.add_argument(
+            "--cycles",
+            type=int,
+            help="Stop after this many polling cycles (default: run until stopped).",
+        )
+
+    def _get_unfinished_games(self, days_ahead):
+        """Return {(league, date): [game, ...]} of the unfinished games to poll"""
+        last_date = timezone.localdate() + timedelta(days=days_ahead)
+        games_by_group = {}
+        for game in Game.objects.filter(is_finished=False, game_date__lte=last_date):
+            games_by_group.setdefault((game.league, game.game_date), []).append(game)
+        return games_by_group
+
+    def _get_next_interval(self, group, games_data, options):
+        """Return the seconds until the next poll of a group, from its last response"""
+        if games_data is None:
+            # Failed fetch, back off
+            return min(group.interval * 2, options["max_interval"])
+
+        raw_games = games_data.get("response") or []
+        statuses = [raw_game["game"]["status"]["long"] for raw_game in raw_games]
+        if any(
+            status not in FINAL_STATUSES and status not in IDLE_STATUSES
+            for status in statuses
+        ):
+            return options["live_interval"]
+
+        # Nothing in progress: back off, but wake up for the next kickoff. Past
+        # kickoffs (late, postponed or stale games) don't keep the date at the live rate
+        interval = min(
+            max(group.interval * 2, options["idle_interval"]), options["max_interval"]
+        )
+        now = time.time()
+        kickoffs = [
+            raw_game["game"]["date"].get("timestamp")
+            for raw_game in raw_games
+            if raw_game["game"]["status"]["long"] in UPCOMING_STATUSES
+        ]
+        kickoffs = [kickoff for kickoff in kickoffs if kickoff and kickoff > now]
+        if kickoffs:
+            until_kickoff = min(kickoffs) - now
+            interval = min(interval, max(until_kickoff, options["live_interval"]))
+        return interval
+
+    def _poll(self, groups, games_by_group, options, executor):
+        """Fetch the due groups concurrently, then save their changes in one batch"""
+        now = time.monotonic()
+        due_groups = [group for group in groups.values() if group.next_poll_at <= now]
+        if not due_groups:
+            return
+
+        # refresh=True skips the cached response, and stores the new one for the pages
+        responses = list(
+            executor.map(
+                lambda group: fetch_games_by_date(
+                    group.league, group.game_date, refresh=True
+                ),
+                due_groups,
+            )
+        )
+
+        game_changes = []
+        for group, games_data in zip(due_groups, responses):
+            if games_data is not None:
+                game_changes += get_live_game_changes(
+                    games_by_group[(group.league, group.game_date)],
+                    get_live_games_lookup(games_data.get("response") or []),
+                )
+            group.interval = self._get_next_interval(group, games_data, options)
+            group.next_poll_at = now + group.interval
+
+        upsert_result = update_games(game_changes)
+        settle_result = settle_bets_for_games(upsert_result.settle_game_ids)
+        self.stdout.write(
+            f"{timezone.localtime():%H:%M:%S} polled {len(due_groups)} dates: "
+            f"{len(upsert_result.updated_games)} games updated, "
+            f"{upsert_result.unchanged_count} unchanged, "
+            f"{settle_result.total_count} bets re-settled; next polls in "
+            + ", ".join(
+                f"{group.league} {group.game_date} {group.interval:.1f}s"
+                for group in due_groups
+            )
+        )
+
+    def _run_cycle(self, groups, options, executor):
+        """Refresh the groups to poll from the database and poll the due ones"""
+        games_by_group = self._get_unfinished_games(options["days_ahead"])
+
+        # Stop polling the dates whose games are all finished
+        for key in set(groups) - set(games_by_group):
+            self.stdout.write(f"{key[0]} {key[1]}: all games finished.")
+            del groups[key]
+        for league, game_date in games_by_group:
+            groups.setdefault(
+                (league, game_date),
+                PollGroup(league, game_date, options["live_interval"]),
+            )
+
+        self._poll(groups, games_by_group, options, executor)
+
+    def handle(self, *args, **options):
+        groups = {}
+        cycle = 0
+        error_backoff = options["live_interval"]
+        with ThreadPoolExecutor(max_workers=max(1, options["concurrency"])) as executor:
+            try:
+                while options["cycles"] is None or cycle < options["cycles"]:
+                    cycle += 1
+                    try:
+                        self._run_cycle(groups, options, executor)
+                    except Exception as e:
+                        # A failed cycle (API error, database locked...) must not stop
+                        # the command: log it, back off and try again
+                        self.stderr.write(
+                            f"{timezone.localtime():%H:%M:%S} polling failed: {e!r}, "
+                            f"retrying in {error_backoff:.1f}s"
+                        )
+                        close_old_connections()
+                        next_poll_at = time.monotonic() + error_backoff
+                        error_backoff = min(error_backoff * 2, options["max_interval"])
+                    else:
+                        error_backoff = options["live_interval"]
+                        # Sleep until the next due group, new games are picked up then too
+                        next_poll_at = min(
+                            [group.next_poll_at for group in groups.values()],
+                            default=time.monotonic() + options["idle_interval"],
+                        )
+
+                    if options["cycles"] is None or cycle < options["cycles"]:
+                        time.sleep(
+                            min(
+                                max(next_poll_at - time.monotonic(), 0.0),
+                                options["idle_interval"],
+                            )
+                        )
+            except KeyboardInterrupt:
+                self.stdout.write("Stopped.")
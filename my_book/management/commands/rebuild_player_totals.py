@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from my_book.settlement import rebuild_player_totals
+
+
+class Command(BaseCommand):
+    help = "Recompute the total betting money and total payout of every player from scratch"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        player_count = rebuild_player_totals()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt the totals of {player_count} players in "
+                f"{(time.perf_counter() - start) * 1000:.0f} ms."
+            )
+        )
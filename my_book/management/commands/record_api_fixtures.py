@@ -0,0 +1,93 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from my_book.api_fixtures import (
+    LEAGUE_IDS,
+    build_games_data,
+    get_fixture_dir,
+    get_fixture_mode,
+    save_fixture,
+)
+from my_book.fetch_data import fetch_games_by_date
+from my_book.models import Game
+
+
+class Command(BaseCommand):
+    help = "Record sports API responses to disk, keyed by league and date, for replay and the local stub server"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--league",
+            choices=list(LEAGUE_IDS),
+            action="append",
+            help="Repeat for several leagues (default: all).",
+        )
+        parser.add_argument("--date-from", help="First date, yyyy-mm-dd.")
+        parser.add_argument(
+            "--date-to", help="Last date, yyyy-mm-dd (default: --date-from)."
+        )
+        parser.add_argument(
+            "--from-db",
+            action="store_true",
+            help="Build the responses from the games in the database instead of calling the API.",
+        )
+        parser.add_argument(
+            "--fixture-dir", help="Default: the API_FIXTURE_DIR setting."
+        )
+
+    def _get_dates(self, league, options):
+        """Return the dates to record, by default the dates of the league's games"""
+        if not options["date_from"]:
+            return sorted(
+                set(
+                    Game.objects.filter(league=league).values_list(
+                        "game_date", flat=True
+                    )
+                )
+            )
+        date_from = parse_date(options["date_from"])
+        date_to = parse_date(options["date_to"] or options["date_from"])
+        if date_from is None or date_to is None or date_from > date_to:
+            raise CommandError("Dates must be yyyy-mm-dd, --date-from first.")
+        return [
+            date_from + timedelta(days=day)
+            for day in range((date_to - date_from).days + 1)
+        ]
+
+    def handle(self, *args, **options):
+        if get_fixture_mode() == "replay" and not options["from_db"]:
+            raise CommandError(
+                "API_FIXTURE_MODE is replay, the API would not be called."
+            )
+        fixture_dir = options["fixture_dir"] or get_fixture_dir()
+
+        recorded_count = 0
+        failed = []
+        for league in options["league"] or list(LEAGUE_IDS):
+            for date in self._get_dates(league, options):
+                if options["from_db"]:
+                    games_data = build_games_data(
+                        league,
+                        date,
+                        Game.objects.filter(league=league, game_date=date).order_by(
+                            "id"
+                        ),
+                    )
+                else:
+                    games_data = fetch_games_by_date(league, date, refresh=True)
+                if games_data is None:
+                    failed.append(f"{league} {date}")
+                    continue
+                path = save_fixture(league, date, games_data, fixture_dir)
+                recorded_count += 1
+                self.stdout.write(
+                    f"{league} {date}: {len(games_data.get('response') or [])} games -> {path}"
+                )
+
+        if failed:
+            self.stderr.write(f"Failed to fetch {', '.join(failed)}.")
+        self.stdout.write(
+            self.style.SUCCESS(f"Recorded {recorded_count} responses to {fixture_dir}.")
+        )
@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count
+
+from my_book.models import BetSlip
+from my_book.settlement import (
+    SettlementResult,
+    rebuild_player_totals,
+    refresh_single_bet_outcomes,
+    settle_player_shard,
+)
+
+
+def _init_worker():
+    # Never reuse the parent's database connection in a worker process
+    connections.close_all()
+
+
+def get_player_shards(shard_count):
+    """
+    Split the players with bets into at most shard_count contiguous player id ranges
+    holding roughly the same number of bets.
+    Returns:
+        list of (first player id, last player id)
+    """
+    bet_counts = list(
+        BetSlip.objects.values_list("player_id")
+        .annotate(bet_count=Count("id"))
+        .order_by("player_id")
+    )
+    total_bets = sum(bet_count for _, bet_count in bet_counts)
+    bets_per_shard = max(1, -(-total_bets // max(1, shard_count)))
+
+    shards = []
+    first_player_id = None
+    shard_bets = 0
+    for player_id, bet_count in bet_counts:
+        if first_player_id is None:
+            first_player_id = player_id
+        shard_bets += bet_count
+        if shard_bets >= bets_per_shard:
+            shards.append((first_player_id, player_id))
+            first_player_id = None
+            shard_bets = 0
+    if first_player_id is not None:
+        shards.append((first_player_id, bet_counts[-1][0]))
+    return shards
+
+
+class Command(BaseCommand):
+    help = "Settle the open bets in parallel worker processes, sharded by player id range, and update the player totals"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes (default: number of CPUs).",
+        )
+        parser.add_argument(
+            "--shards",
+            type=int,
+            help="Number of player id ranges to split the book into (default: 4 per worker).",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-settle every bet, not only the bets without a payout.",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        workers = max(1, options["workers"])
+        shards = get_player_shards(options["shards"] or workers * 4)
+        open_only = not options["all"]
+
+        # Leg outcomes are refreshed once, workers only compute and write payouts
+        refresh_single_bet_outcomes()
+
+        self.stdout.write(
+            f"Settling {len(shards)} player shards with {workers} workers..."
+        )
+
+        # Workers are forked, so the parent's connection must not be shared
+        connections.close_all()
+        total = SettlementResult()
+        player_totals = {}
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+        ) as executor:
+            futures = {
+                executor.submit(settle_player_shard, first, last, open_only): (
+                    first,
+                    last,
+                )
+                for first, last in shards
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                first, last = futures[future]
+                result, shard_totals = future.result()
+                player_totals.update(shard_totals)
+                total.settled_count += result.settled_count
+                total.pending_count += result.pending_count
+                total.invalid_count += result.invalid_count
+                total.updated_count += result.updated_count
+                self.stdout.write(
+                    f"[{done}/{len(shards)}] players {first}-{last}: "
+                    f"{result.total_count} bets, {result.updated_count} updated "
+                    f"in {result.elapsed_seconds:.2f}s"
+                )
+
+        # Merge the shard totals into the players, players without bets total 0
+        rebuild_player_totals(player_totals)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Settled {total.settled_count} bets ({total.pending_count} pending, "
+                f"{total.invalid_count} invalid, {total.updated_count} updated) "
+                f"in {time.perf_counter() - start:.2f}s."
+            )
+        )
@@ -0,0 +1,150 @@
+import gzip
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from my_book.api_fixtures import (
+    LEAGUE_IDS,
+    build_games_data,
+    get_fixture_dir,
+    load_fixture,
+)
+
+LEAGUES_BY_ID = {league_id: league for league, league_id in LEAGUE_IDS.items()}
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve recorded sports API responses over HTTP with configurable latency and "
+        "error injection. Point the app at it with API_HOST=<host>:<port> API_USE_TLS=false."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bind", default="127.0.0.1", help="Default: 127.0.0.1.")
+        parser.add_argument("--port", type=int, default=8001, help="Default: 8001.")
+        parser.add_argument(
+            "--fixture-dir", help="Default: the API_FIXTURE_DIR setting."
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="Mean response latency in milliseconds (default: 0).",
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=0.0,
+            help="Latency varies uniformly by up to this many milliseconds (default: 0).",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of requests answered with a 500, 502 or 503 (default: 0).",
+        )
+        parser.add_argument(
+            "--throttle-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of requests answered with a 429 and Retry-After (default: 0).",
+        )
+        parser.add_argument(
+            "--seed", type=int, help="Random seed, for reproducible runs."
+        )
+        parser.add_argument("--quiet", action="store_true", help="Don't log requests.")
+
+    def handle(self, *args, **options):
+        fixture_dir = options["fixture_dir"] or get_fixture_dir()
+        rng = random.Random(options["seed"])
+        rng_lock = threading.Lock()
+        counts = {}
+        stdout = self.stdout
+
+        def count(name):
+            with rng_lock:
+                counts[name] = counts.get(name, 0) + 1
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like the real API
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                if not options["quiet"]:
+                    stdout.write(f"{self.address_string()} {format % args}")
+
+            def _send(self, status, body=b"", headers=None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {
+                    name: values[0] for name, values in parse_qs(url.query).items()
+                }
+                with rng_lock:
+                    delay = options["latency"] + rng.uniform(
+                        -options["jitter"], options["jitter"]
+                    )
+                    draw = rng.random()
+                    error_status = rng.choice([500, 502, 503])
+                time.sleep(max(delay, 0.0) / 1000)
+
+                if url.path != "/games":
+                    count("not found")
+                    return self._send(404)
+                if draw < options["throttle_rate"]:
+                    count("throttled")
+                    return self._send(429, headers={"Retry-After": "1"})
+                if draw < options["throttle_rate"] + options["error_rate"]:
+                    count("errors")
+                    return self._send(error_status)
+
+                league = LEAGUES_BY_ID.get(query.get("league"))
+                date = parse_date(query.get("date", "")) if query.get("date") else None
+                games_data = (
+                    load_fixture(league, date, fixture_dir)
+                    if league is not None and date is not None
+                    else None
+                )
+                if games_data is None:
+                    # The API answers an unknown date with no games
+                    count("empty")
+                    games_data = build_games_data(
+                        league or "", query.get("date", ""), []
+                    )
+                else:
+                    count("served")
+
+                body = json.dumps(games_data).encode("utf-8")
+                headers = {"Content-Type": "application/json"}
+                if "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body)
+                    headers["Content-Encoding"] = "gzip"
+                self._send(200, body, headers)
+
+        server = ThreadingHTTPServer((options["bind"], options["port"]), Handler)
+        server.daemon_threads = True
+        self.stdout.write(
+            f"Serving {fixture_dir} on http://{options['bind']}:{options['port']}/games "
+            f"(latency {options['latency']:.0f}±{options['jitter']:.0f}ms, "
+            f"error rate {options['error_rate']:.0%}, "
+            f"throttle rate {options['throttle_rate']:.0%}), CONTROL-C to quit."
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Requests: {counts}")
@@ -0,0 +1,15 @@
+from .outcome_cache import game_outcome_cache
+
+
+class GameOutcomeCacheMiddleware:
+    """
+    Scope a GameOutcomeCache to each request, so a game's results are evaluated
+    once per request, including while the response template is rendered.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with game_outcome_cache():
+            return self.get_response(request)
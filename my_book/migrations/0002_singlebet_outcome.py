@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:19
+
+from django.db import migrations, models
+
+
+def get_outcome(single_bet, game):
+    """Historical-model copy of SingleBet.determine_outcome()"""
+    if not game.is_finished:
+        return "Pending"
+
+    if single_bet.single_bet_type == "WINNER":
+        if game.fav.lower() == game.team_a.lower():
+            score_a = game.score_team_a - game.fav_spread
+            score_b = game.score_team_b
+        elif game.fav.lower() == game.team_b.lower():
+            score_a = game.score_team_a
+            score_b = game.score_team_b - game.fav_spread
+        else:
+            return "Pending"
+        if score_a == score_b:
+            return "Tie"
+        winner = game.team_a if score_a > score_b else game.team_b
+        if winner.lower() == (single_bet.selected_team or "").lower():
+            return "Win"
+        return "Loss"
+    elif single_bet.single_bet_type == "OVER-UNDER":
+        if game.total_points == game.over_under_points:
+            return "Tie"
+        is_over = game.total_points > game.over_under_points
+        return "Win" if bool(single_bet.is_over) == is_over else "Loss"
+    return "Invalid"
+
+
+def populate_outcome(apps, schema_editor):
+    SingleBet = apps.get_model("my_book", "SingleBet")
+    single_bets = list(SingleBet.objects.select_related("game"))
+    for single_bet in single_bets:
+        single_bet.outcome = get_outcome(single_bet, single_bet.game)
+    SingleBet.objects.bulk_update(single_bets, ["outcome"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("my_book", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="singlebet",
+            name="outcome",
+            field=models.CharField(
+                choices=[
+                    ("Pending", "Pending"),
+                    ("Win", "Win"),
+                    ("Loss", "Loss"),
+                    ("Tie", "Tie"),
+                    ("Invalid", "Invalid"),
+                ],
+                db_index=True,
+                default="Pending",
+                max_length=10,
+            ),
+        ),
+        migrations.RunPython(populate_outcome, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,163 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# bet type: (model name, number of legs)
+BET_TYPES = {
+    "Straight": ("Straight", 1),
+    "Action": ("Action", 2),
+    "Parlay3": ("Parlay3", 3),
+    "Parlay4": ("Parlay4", 4),
+}
+
+
+def copy_bets_to_slips(apps, schema_editor):
+    BetSlip = apps.get_model("my_book", "BetSlip")
+    BetLeg = apps.get_model("my_book", "BetLeg")
+
+    for bet_type, (model_name, leg_count) in BET_TYPES.items():
+        bets = list(apps.get_model("my_book", model_name).objects.all())
+        slips = BetSlip.objects.bulk_create(
+            [
+                BetSlip(
+                    bet_type=bet_type,
+                    bet_id=bet.pk,
+                    player_id=bet.player_id,
+                    bet_amount=bet.bet_amount,
+                    payout=bet.payout,
+                    created_at=bet.created_at,
+                )
+                for bet in bets
+            ],
+            batch_size=500,
+        )
+        BetLeg.objects.bulk_create(
+            [
+                BetLeg(
+                    bet=slip,
+                    leg_no=leg_no,
+                    single_bet_id=getattr(bet, f"single_bet{leg_no}_id"),
+                )
+                for slip, bet in zip(slips, bets)
+                for leg_no in range(1, leg_count + 1)
+            ],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("my_book", "0002_singlebet_outcome"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BetSlip",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "bet_type",
+                    models.CharField(
+                        choices=[
+                            ("Straight", "Straight"),
+                            ("Action", "Action"),
+                            ("Parlay3", "Parlay3"),
+                            ("Parlay4", "Parlay4"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "bet_id",
+                    models.PositiveBigIntegerField(
+                        help_text="Primary key of the bet in its bet type table."
+                    ),
+                ),
+                ("bet_amount", models.DecimalField(decimal_places=2, max_digits=10)),
+                (
+                    "payout",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                (
+                    "player",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bet_slips",
+                        to="my_book.player",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="BetLeg",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("leg_no", models.PositiveSmallIntegerField()),
+                (
+                    "single_bet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bet_legs",
+                        to="my_book.singlebet",
+                    ),
+                ),
+                (
+                    "bet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="legs",
+                        to="my_book.betslip",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["leg_no"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="betslip",
+            index=models.Index(
+                fields=["created_at", "id"], name="my_book_bet_created_3989b6_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="betslip",
+            index=models.Index(
+                fields=["player", "created_at"], name="my_book_bet_player__74dddb_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="betslip",
+            constraint=models.UniqueConstraint(
+                fields=("bet_type", "bet_id"), name="unique_bet_slip_per_bet"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="betleg",
+            constraint=models.UniqueConstraint(
+                fields=("bet", "leg_no"), name="unique_leg_no_per_bet"
+            ),
+        ),
+        migrations.RunPython(copy_bets_to_slips, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("my_book", "0003_betslip_betleg"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="game",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name="game",
+            index=models.Index(
+                fields=["is_finished", "game_date"], name="game_finished_date_idx"
+            ),
+        ),
+    ]
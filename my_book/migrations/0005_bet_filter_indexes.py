@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("my_book", "0004_game_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="action",
+            index=models.Index(
+                fields=["player", "created_at"], name="action_player_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="action",
+            index=models.Index(
+                fields=["payout", "created_at"], name="action_payout_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="betslip",
+            index=models.Index(
+                fields=["payout", "created_at"], name="my_book_bet_payout_38fd35_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="parlay3",
+            index=models.Index(
+                fields=["player", "created_at"], name="parlay3_player_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="parlay3",
+            index=models.Index(
+                fields=["payout", "created_at"], name="parlay3_payout_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="parlay4",
+            index=models.Index(
+                fields=["player", "created_at"], name="parlay4_player_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="parlay4",
+            index=models.Index(
+                fields=["payout", "created_at"], name="parlay4_payout_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="straight",
+            index=models.Index(
+                fields=["player", "created_at"], name="straight_player_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="straight",
+            index=models.Index(
+                fields=["payout", "created_at"], name="straight_payout_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:02
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Sum
+
+
+def rebuild_player_totals(apps, schema_editor):
+    """
+    Historical-model copy of settlement.rebuild_player_totals(): the totals stored
+    before they were maintained incrementally are recomputed from the BetSlips
+    """
+    BetSlip = apps.get_model("my_book", "BetSlip")
+    Player = apps.get_model("my_book", "Player")
+
+    cents = Decimal("0.01")
+    totals = {
+        row["player_id"]: (
+            (row["total_betting_money"] or Decimal(0)).quantize(cents),
+            (row["total_payout"] or Decimal(0)).quantize(cents),
+        )
+        for row in BetSlip.objects.values("player_id").annotate(
+            total_betting_money=Sum("bet_amount"), total_payout=Sum("payout")
+        )
+    }
+    players = list(Player.objects.only("id"))
+    for player in players:
+        player.total_betting_money, player.total_payout = totals.get(
+            player.pk, (Decimal(0), Decimal(0))
+        )
+    Player.objects.bulk_update(
+        players, ["total_betting_money", "total_payout"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("my_book", "0006_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_player_totals, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.db import models
 from django.core.exceptions import ValidationError
 from decimal import Decimal, ROUND_HALF_UP
-from django.db.models import Sum
+from .payout_rules import get_payout_multiplier
+from .outcome_cache import get_active_outcome_cache
 
 
 # Create your models here.
@@ -31,45 +33,6 @@ class Player(models.Model):
         """Return the number of Parlay 4 bets this player has made."""
         return self.parlay4_bets.count()
 
-    def calculate_total_betting_money(self):
-        """Using aggregate to sum up bet amounts for all bet types"""
-        total_betting_money = self.straight_bets.aggregate(total=Sum("bet_amount"))[
-            "total"
-        ] or Decimal(0)
-        total_betting_money += self.action_bets.aggregate(total=Sum("bet_amount"))[
-            "total"
-        ] or Decimal(0)
-        total_betting_money += self.parlay3_bets.aggregate(total=Sum("bet_amount"))[
-            "total"
-        ] or Decimal(0)
-        total_betting_money += self.parlay4_bets.aggregate(total=Sum("bet_amount"))[
-            "total"
-        ] or Decimal(0)
-
-        self.total_betting_money = total_betting_money
-        self.save()
-
-        return total_betting_money
-
-    def calculate_total_payout(self):
-        # Sum payouts for all bet types
-        total_payout = 0
-        # Sum payout for all bet types
-        for bet_model in [
-            self.straight_bets,
-            self.action_bets,
-            self.parlay3_bets,
-            self.parlay4_bets,
-        ]:
-            for bet in bet_model.all():
-                payout = bet.calculate_payout()
-                if payout:
-                    total_payout += bet.calculate_payout()
-
-        self.total_payout = total_payout
-        self.save()
-        return total_payout
-
 
 class Game(models.Model):
     LEAGUES = [
@@ -144,9 +107,36 @@ class Game(models.Model):
         default=False, help_text="Indicates if the game is finished."
     )
 
+    # Last change of the game, used by the game picker ETag/Last-Modified headers
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Fields that change the outcome of the single bets placed on the game
+    OUTCOME_FIELDS = [
+        "team_a",
+        "team_b",
+        "fav",
+        "fav_spread",
+        "score_team_a",
+        "score_team_b",
+        "total_points",
+        "over_under_points",
+        "is_finished",
+    ]
+
     class Meta:
         # Add a unique constraint to ensure no duplicate games with the same date and teams
         unique_together = ("game_date", "team_a", "team_b")
+        indexes = [
+            # bettable games of the game picker: unfinished, within a date window
+            models.Index(
+                fields=["is_finished", "game_date"],
+                name="game_finished_date_idx",
+            ),
+        ]
+
+    def get_score_version(self):
+        """Return a hashable snapshot of the fields that decide the game's results"""
+        return tuple(getattr(self, field) for field in self.OUTCOME_FIELDS)
 
     def determine_winner(self):
         """
@@ -199,7 +189,8 @@ class Game(models.Model):
             # self.total_points == self.over_under_points:
             return "Tie"
 
-    def save(self, *args, **kwargs):
+    def set_derived_fields(self):
+        """Set name and total_points from the teams and scores"""
         # Automatically calculate total points if scores are provided
         if self.score_team_a is not None and self.score_team_b is not None:
             self.total_points = self.score_team_a + self.score_team_b
@@ -209,6 +200,8 @@ class Game(models.Model):
         team_b_short = self.team_b.split()[-1]
         self.name = f"{team_a_short}@{team_b_short}"
 
+    def save(self, *args, **kwargs):
+        self.set_derived_fields()
         return super().save(*args, **kwargs)
 
     def __str__(self):
@@ -220,6 +213,13 @@ class SingleBet(models.Model):
         ("WINNER", "Winner"),
         ("OVER-UNDER", "Over-Under"),
     ]
+    OUTCOMES = [
+        ("Pending", "Pending"),
+        ("Win", "Win"),
+        ("Loss", "Loss"),
+        ("Tie", "Tie"),
+        ("Invalid", "Invalid"),
+    ]
 
     game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name="single_bets")
     single_bet_type = models.CharField(max_length=20, choices=SINGLE_BET_TYPES)
@@ -232,6 +232,11 @@ class SingleBet(models.Model):
         help_text="True for 'Over' bets, False for 'Under' bets.",
     )  # True if betting "Over", False for "Under"
 
+    # Stored result of determine_outcome(), refreshed in bulk when the game changes
+    outcome = models.CharField(
+        max_length=10, choices=OUTCOMES, default="Pending", db_index=True
+    )
+
     def determine_outcome(self):
         """
         Determine if bet is Win, Loss or Tie
@@ -243,8 +248,14 @@ class SingleBet(models.Model):
         if not self.game:
             return "Invalid"
 
+        # Reuse the game results computed earlier in the same request or settlement run
+        cache = get_active_outcome_cache()
+
         if self.single_bet_type == "WINNER":
-            winner = self.game.determine_winner()
+            if cache is not None:
+                winner = cache.get_winner(self.game)
+            else:
+                winner = self.game.determine_winner()
             if winner:
                 if winner == "Tie":
                     return "Tie"
@@ -255,7 +266,10 @@ class SingleBet(models.Model):
             else:
                 return "Pending"
         elif self.single_bet_type == "OVER-UNDER":
-            over_under_outcome = self.game.determine_over_under()
+            if cache is not None:
+                over_under_outcome = cache.get_over_under(self.game)
+            else:
+                over_under_outcome = self.game.determine_over_under()
             if over_under_outcome is None:
                 return "Pending"
             elif over_under_outcome == "Tie":
@@ -269,6 +283,13 @@ class SingleBet(models.Model):
         else:
             return "Invalid"
 
+    def save(self, *args, **kwargs):
+        # New single bets may be placed on games that are already finished
+        if self._state.adding:
+            self.outcome = self.determine_outcome()
+
+        return super().save(*args, **kwargs)
+
     def __str__(self):
         # Handle "WINNER" bet type
         if self.single_bet_type == "WINNER" and self.selected_team:
@@ -294,8 +315,56 @@ class Bet(models.Model):
     bet_amount = models.DecimalField(max_digits=10, decimal_places=2)
     payout = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
 
+    # name of the concrete bet type and its number of single_betN legs
+    BET_TYPE = ""
+    LEG_COUNT = 0
+
     class Meta:
         abstract = True
+        # every concrete bet table defines player, payout and created_at
+        indexes = [
+            models.Index(
+                fields=["player", "created_at"], name="%(class)s_player_created_idx"
+            ),
+            models.Index(
+                fields=["payout", "created_at"], name="%(class)s_payout_created_idx"
+            ),
+        ]
+
+    def get_single_bets(self):
+        """Return the SingleBet legs of this bet in leg order."""
+        return [getattr(self, f"single_bet{i}") for i in range(1, self.LEG_COUNT + 1)]
+
+    def payout_for_outcomes(self, outcomes):
+        """
+        Compute the payout for the given leg outcomes without touching the database.
+        The multiplier is looked up in the payout rule table (see payout_rules.py)
+        Returns:
+        - the payout rounded to 2 decimal places
+        - None if any leg is still "Pending"
+        """
+        multiplier = get_payout_multiplier(self.BET_TYPE, outcomes)
+        if multiplier is None:
+            return None
+
+        # Calculate the payout
+        payout = self.bet_amount * multiplier
+        # Round the payout to 2 decimal places
+        return payout.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+    def calculate_payout(self):
+        """
+        Determine the outcome of every leg, then compute and save the payout.
+        Return None if any leg is still "Pending".
+        """
+        outcomes = [
+            single_bet.determine_outcome() for single_bet in self.get_single_bets()
+        ]
+        self.payout = self.payout_for_outcomes(outcomes)
+        # Save the calculated payout in the database
+        self.save()
+
+        return self.payout
 
     def __str__(self):
         return f"Bet: {self.player} (amount: {self.bet_amount})"
@@ -315,47 +384,15 @@ class Straight(Bet):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    BET_TYPE = "Straight"
+    LEG_COUNT = 1
+
     def clean(self):
         if not self.single_bet1:
             raise ValidationError(
                 "A straight bet must be associated with exactly 1 SingleBet."
             )
 
-    def calculate_payout(self):
-        """
-        For Straight, the payout multiplier is:
-        - Win: 1
-        - Tie: 0
-        - Loss: -1
-        - Pending if no points available yet, return None
-        If Loss, need to pay 5% commission
-        """
-        # Get the outcome from the single bet
-        outcome = self.single_bet1.determine_outcome()
-
-        # Determine the payout multiplier based on the outcome
-        if outcome == "Win":
-            multiplier = Decimal(1)
-        elif outcome == "Tie":
-            multiplier = Decimal(0)
-        elif outcome == "Loss":
-            multiplier = Decimal(-1.05)  # includes 5% comission
-        elif outcome == "Pending":
-            self.payout = None
-            self.save()
-            return None
-        else:
-            raise ValueError("Invalid outcome for the bet.")
-
-        # Calculate the payout
-        payout = self.bet_amount * multiplier
-        # Round the payout to 2 decimal places
-        self.payout = payout.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-        # Save the calculated payout in the database
-        self.save()
-
-        return self.payout
-
     def __str__(self):
         return f"Straight: {self.player} - {self.single_bet1}"
 
@@ -377,47 +414,8 @@ class Action(Bet):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def calculate_payout(self):
-        """
-        For Action, the payout multiplier is as follow
-        Multiplier - Outcome set of single bets:
-        1:4 -  {"Win", "Win"}
-        1:2 -  {"Win", "Tie"}
-        1:0 -  {"Tie", "Tie"}
-        1:(-1.1) - if either single bets outcome are "Loss",
-                   a (-1.1) multiplier is appliedto pay 10% commission.
-        return: None if any single bet is "Pending"
-        """
-
-        # Determine outcomes of both single bets
-        outcome1 = self.single_bet1.determine_outcome()
-        outcome2 = self.single_bet2.determine_outcome()
-
-        # Define the payout multiplier
-        if outcome1 == "Loss" or outcome2 == "Loss":
-            multiplier = Decimal(-1.1)  # 10% commission
-        elif outcome1 == "Win" and outcome2 == "Win":
-            multiplier = Decimal(4)
-        elif ("Win" in {outcome1, outcome2}) and ("Tie" in {outcome1, outcome2}):
-            multiplier = Decimal(2)
-        elif outcome1 == "Tie" and outcome2 == "Tie":
-            multiplier = Decimal(0)
-        elif outcome1 == "Pending" or outcome2 == "Pending":
-            self.payout = None
-            self.save()
-            return None
-        else:
-            raise ValueError("Invalid outcomes for the bets.")
-
-        # Calculate the payout
-        payout = self.bet_amount * multiplier
-        # Round the payout to 2 decimal places
-        self.payout = payout.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-        # Save the calculated payout in the database
-        self.save()
-
-        return self.payout
+    BET_TYPE = "Action"
+    LEG_COUNT = 2
 
     def clean(self):
         # Check if both single_bets are provided
@@ -454,53 +452,8 @@ class Parlay3(Bet):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def calculate_payout(self):
-        """
-        For Parlay 3:
-        Multiplier - Outcome set of single bets:
-            1:6 -  {"Win", "Win", "Win"}
-            1:4 -  {"Win", "Win", "Tie"}
-            1:1 -  {"Win", "Tie", "Tie"}
-            1:0 -  {"Tie", "Tie", "Tie"}
-            1:(-1) - if any single bets outcome is "Loss",
-        Return:
-            None if any single bet is "Pending"
-        """
-
-        # Determine outcomes of all three single bets
-        outcome1 = self.single_bet1.determine_outcome()
-        outcome2 = self.single_bet2.determine_outcome()
-        outcome3 = self.single_bet3.determine_outcome()
-
-        # Define the payout multiplier
-        if "Loss" in {outcome1, outcome2, outcome3}:
-            multiplier = Decimal(
-                -1
-            )  # Loss in any bet results in loss of the parlay bet
-        elif outcome1 == "Win" and outcome2 == "Win" and outcome3 == "Win":
-            multiplier = Decimal(6)  # All three bets win
-        elif outcome1 == "Win" and outcome2 == "Win" and outcome3 == "Tie":
-            multiplier = Decimal(4)  # Two wins, one tie
-        elif outcome1 == "Win" and outcome2 == "Tie" and outcome3 == "Tie":
-            multiplier = Decimal(1)  # One win, two ties
-        elif outcome1 == "Tie" and outcome2 == "Tie" and outcome3 == "Tie":
-            multiplier = Decimal(0)  # All bets tie
-        elif outcome1 == "Pending" or outcome2 == "Pending" or outcome3 == "Pending":
-            self.payout = None
-            self.save()
-            return None
-        else:
-            raise ValueError("Invalid outcome combination for the parlay bet.")
-
-        # Calculate the payout
-        payout = self.bet_amount * multiplier
-        # Round the payout to 2 decimal places
-        self.payout = payout.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-
-        # Save the calculated payout in the database
-        self.save()
-
-        return self.payout
+    BET_TYPE = "Parlay3"
+    LEG_COUNT = 3
 
     def clean(self):
         # Create a set of the SingleBets
@@ -537,83 +490,8 @@ class Parlay4(Bet):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def calculate_payout(self):
-        """
-        For Parlay 4:
-        Multiplier - Outcome set of single bets:
-            1:10 -  {"Win", "Win", "Win", "Win"}
-            1:6  -  {"Win", "Win", "Win", "Tie"}
-            1:4  -  {"Win", "Win", "Tie", "Tie"}
-            1:1  -  {"Win", "Tie", "Tie", "Tie"}
-            1:0  -  {"Tie", "Tie", "Tie", "Tie"}
-            1:(-1) - if any single bets outcome is "Loss",
-        Return None if any single bet is "Pending"
-        """
-        # Determine outcomes of all four single bets
-        outcome1 = self.single_bet1.determine_outcome()
-        outcome2 = self.single_bet2.determine_outcome()
-        outcome3 = self.single_bet3.determine_outcome()
-        outcome4 = self.single_bet4.determine_outcome()
-
-        # Define the payout multiplier
-        if "Loss" in {outcome1, outcome2, outcome3, outcome4}:
-            multiplier = Decimal(
-                -1
-            )  # Loss in any bet results in loss of the parlay bet
-        elif (
-            outcome1 == "Win"
-            and outcome2 == "Win"
-            and outcome3 == "Win"
-            and outcome4 == "Win"
-        ):
-            multiplier = Decimal(10)  # All four bets win
-        elif (
-            outcome1 == "Win"
-            and outcome2 == "Win"
-            and outcome3 == "Win"
-            and outcome4 == "Tie"
-        ):
-            multiplier = Decimal(6)  # Three wins, one tie
-        elif (
-            outcome1 == "Win"
-            and outcome2 == "Win"
-            and outcome3 == "Tie"
-            and outcome4 == "Tie"
-        ):
-            multiplier = Decimal(4)  # Two wins, two ties
-        elif (
-            outcome1 == "Win"
-            and outcome2 == "Tie"
-            and outcome3 == "Tie"
-            and outcome4 == "Tie"
-        ):
-            multiplier = Decimal(1)  # One win, three ties
-        elif (
-            outcome1 == "Tie"
-            and outcome2 == "Tie"
-            and outcome3 == "Tie"
-            and outcome4 == "Tie"
-        ):
-            multiplier = Decimal(0)  # All bets tie
-        elif (
-            outcome1 == "Pending"
-            or outcome2 == "Pending"
-            or outcome3 == "Pending"
-            or outcome4 == "Pending"
-        ):
-            self.payout = None
-            self.save()
-            return None
-        else:
-            raise ValueError("Invalid outcome combination for the parlay bet.")
-
-        # Calculate the payout
-        payout = self.bet_amount * multiplier
-        # Round the payout to 2 decimal places
-        self.payout = payout.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-        self.save()
-
-        return self.payout
+    BET_TYPE = "Parlay4"
+    LEG_COUNT = 4
 
     def clean(self):
         # Create a set of the SingleBets
@@ -630,3 +508,100 @@ class Parlay4(Bet):
 
     def __str__(self):
         return f"Parlay4: {self.player} - {self.single_bet1}, {self.single_bet2}, {self.single_bet3}, {self.single_bet4}"
+
+
+class BetSlip(models.Model):
+    """
+    One row per bet of any type, a denormalized copy of the Straight, Action, Parlay3
+    and Parlay4 tables, so listings, sorting and aggregates across all bet types run
+    as a single indexed query.
+    The bet tables stay the source of truth. The copy follows them through the
+    save/delete signals and the bulk helpers of bet_slips; the audit_bet_slips
+    command reports (and with --fix repairs) any drift.
+    """
+
+    BET_TYPES = [
+        ("Straight", "Straight"),
+        ("Action", "Action"),
+        ("Parlay3", "Parlay3"),
+        ("Parlay4", "Parlay4"),
+    ]
+
+    bet_type = models.CharField(max_length=10, choices=BET_TYPES)
+    bet_id = models.PositiveBigIntegerField(
+        help_text="Primary key of the bet in its bet type table."
+    )
+    player = models.ForeignKey(
+        Player, on_delete=models.CASCADE, related_name="bet_slips"
+    )
+    bet_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payout = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bet_type", "bet_id"], name="unique_bet_slip_per_bet"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["player", "created_at"]),
+            models.Index(fields=["payout", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.bet_type}: {self.player} (amount: {self.bet_amount})"
+
+
+class BetLeg(models.Model):
+    """
+    A single bet (leg) of a BetSlip, in leg order
+    """
+
+    bet = models.ForeignKey(BetSlip, on_delete=models.CASCADE, related_name="legs")
+    leg_no = models.PositiveSmallIntegerField()
+    single_bet = models.ForeignKey(
+        SingleBet, on_delete=models.CASCADE, related_name="bet_legs"
+    )
+
+    class Meta:
+        ordering = ["leg_no"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bet", "leg_no"], name="unique_leg_no_per_bet"
+            )
+        ]
+
+    def __str__(self):
+        return f"Leg {self.leg_no}: {self.single_bet}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The stored response of a bet placement request made with an Idempotency-Key
+    header, replayed when the client retries the same request
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+    )
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(
+        max_length=64, help_text="SHA-256 of the request body."
+    )
+    response_status = models.PositiveSmallIntegerField()
+    response_body = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "key"], name="unique_idempotency_key_per_user"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.key}"
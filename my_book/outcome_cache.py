@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_active_cache = ContextVar("game_outcome_cache", default=None)
+
+
+class GameOutcomeCache:
+    """
+    Memoize Game.determine_winner() and Game.determine_over_under() for one request
+    or one settlement run.
+    Results are keyed by game id and score version, so a game updated during the run
+    is evaluated again instead of returning a stale result.
+    """
+
+    def __init__(self):
+        self._results = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, game, name, compute):
+        key = (game.pk, game.get_score_version(), name)
+        if key in self._results:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._results[key] = compute()
+        return self._results[key]
+
+    def get_winner(self, game):
+        return self._get(game, "winner", game.determine_winner)
+
+    def get_over_under(self, game):
+        return self._get(game, "over_under", game.determine_over_under)
+
+
+@contextmanager
+def game_outcome_cache():
+    """
+    Activate a fresh GameOutcomeCache for the duration of the with-block
+    """
+    cache = GameOutcomeCache()
+    token = _active_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _active_cache.reset(token)
+
+
+def get_active_outcome_cache():
+    """Return the active GameOutcomeCache, or None outside of a cached scope"""
+    return _active_cache.get()
@@ -0,0 +1,106 @@
+"""
+Keyset (cursor) pagination over a newest-first (created_at, id) ordering
+
+Pages are fetched with a WHERE on the last seen (created_at, id) pair instead of an
+OFFSET, so every page costs one indexed query of page_size + 1 rows no matter how
+deep into the history it is.
+"""
+
+import base64
+import json
+from dataclasses import dataclass, field
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+@dataclass
+class KeysetPage:
+    """
+    One page of rows
+    - next_cursor: cursor of the following (older) page, None on the last page
+    - previous_cursor: cursor of the preceding (newer) page, None on the first page
+    """
+
+    rows: list = field(default_factory=list)
+    next_cursor: str = None
+    previous_cursor: str = None
+
+
+def encode_cursor(row):
+    """Encode the (created_at, id) position of a row into an opaque URL-safe cursor"""
+    position = json.dumps([row.created_at.isoformat(), row.pk])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by encode_cursor()
+    Returns:
+        (created_at, id), or None if the cursor is missing or malformed
+    """
+    if not cursor:
+        return None
+    try:
+        created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            return None
+        return created_at, int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def get_page_size(value):
+    """Return the requested page size, clamped to [1, MAX_PAGE_SIZE]"""
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+
+def get_keyset_page(queryset, after=None, before=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Return one page of a queryset ordered newest first by (created_at, id)
+    input:
+        after: cursor, return the rows older than this position
+        before: cursor, return the rows newer than this position
+        Without a cursor, the newest rows are returned.
+    Returns:
+        KeysetPage
+    """
+    after = decode_cursor(after)
+    before = decode_cursor(before)
+
+    if before is not None:
+        # Walk towards the newer rows in ascending order, then flip the page back
+        created_at, pk = before
+        rows = list(
+            queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            ).order_by("created_at", "id")[: page_size + 1]
+        )
+        has_more = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        return KeysetPage(
+            rows=rows,
+            next_cursor=encode_cursor(rows[-1]) if rows else None,
+            previous_cursor=encode_cursor(rows[0]) if has_more else None,
+        )
+
+    if after is not None:
+        created_at, pk = after
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        )
+    rows = list(queryset.order_by("-created_at", "-id")[: page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    return KeysetPage(
+        rows=rows,
+        next_cursor=encode_cursor(rows[-1]) if has_more else None,
+        previous_cursor=encode_cursor(rows[0]) if after is not None and rows else None,
+    )
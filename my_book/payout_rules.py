@@ -0,0 +1,124 @@
+"""
+Payout rule registry
+
+Every bet type's payout is decided by the multiset of its leg outcomes (how many legs
+are won, tied, lost, pending or invalid), never by the order of the legs.
+The rules below are compiled once, when the module is imported, into:
+- PAYOUT_TABLE: a dict keyed by (bet type, wins, ties, losses, pending, invalid)
+- PAYOUT_ARRAYS: per bet type NumPy arrays indexed by the same counts
+so evaluating a bet is a single lookup. Adding a bet type only means adding rows.
+"""
+
+from collections import Counter
+from decimal import Decimal
+from itertools import product
+
+import numpy as np
+
+# bet type: (number of legs, commission on a loss in percent of the bet amount)
+BET_TYPES = {
+    "Straight": (1, 5),
+    "Action": (2, 10),
+    "Parlay3": (3, 0),
+    "Parlay4": (4, 0),
+}
+
+# Multiplier, in percent of the bet amount, when every leg is either won or tied
+# (bet type, wins, ties, multiplier)
+PAYOUT_RULES = [
+    ("Straight", 1, 0, 100),
+    ("Straight", 0, 1, 0),
+    ("Action", 2, 0, 400),
+    ("Action", 1, 1, 200),
+    ("Action", 0, 2, 0),
+    ("Parlay3", 3, 0, 600),
+    ("Parlay3", 2, 1, 400),
+    ("Parlay3", 1, 2, 100),
+    ("Parlay3", 0, 3, 0),
+    ("Parlay4", 4, 0, 1000),
+    ("Parlay4", 3, 1, 600),
+    ("Parlay4", 2, 2, 400),
+    ("Parlay4", 1, 3, 100),
+    ("Parlay4", 0, 4, 0),
+]
+
+# Bet status of a compiled rule
+SETTLED = 0
+PENDING_BET = 1
+INVALID_BET = 2
+
+# Leg outcomes, in the order of the counts in a rule key
+OUTCOMES = ["Win", "Tie", "Loss", "Pending", "Invalid"]
+
+
+def _resolve_rule(counts, commission, win_tie_multipliers):
+    """
+    Decide (status, multiplier in percent) for one multiset of leg outcomes
+    - any lost leg loses the bet, commission included, even if other legs are pending
+    - otherwise any pending leg keeps the whole bet pending
+    - otherwise the wins/ties combination must match a payout rule
+    """
+    wins, ties, losses, pending, invalid = counts
+    if losses:
+        return SETTLED, -(100 + commission)
+    if pending:
+        return PENDING_BET, 0
+    if invalid or (wins, ties) not in win_tie_multipliers:
+        return INVALID_BET, 0
+    return SETTLED, win_tie_multipliers[(wins, ties)]
+
+
+def compile_payout_rules():
+    """
+    Compile BET_TYPES and PAYOUT_RULES into the dict and array lookups
+    Returns:
+        (payout_table, payout_arrays)
+    """
+    payout_table = {}
+    payout_arrays = {}
+
+    for bet_type, (legs, commission) in BET_TYPES.items():
+        win_tie_multipliers = {
+            (wins, ties): multiplier
+            for rule_bet_type, wins, ties, multiplier in PAYOUT_RULES
+            if rule_bet_type == bet_type
+        }
+
+        shape = (legs + 1,) * len(OUTCOMES)
+        statuses = np.full(shape, INVALID_BET, dtype=np.int64)
+        multipliers = np.zeros(shape, dtype=np.int64)
+
+        for counts in product(range(legs + 1), repeat=len(OUTCOMES)):
+            if sum(counts) != legs:
+                continue
+            status, multiplier = _resolve_rule(
+                counts, commission, win_tie_multipliers
+            )
+            payout_table[(bet_type, *counts)] = (status, multiplier)
+            statuses[counts] = status
+            multipliers[counts] = multiplier
+
+        payout_arrays[bet_type] = (statuses, multipliers)
+
+    return payout_table, payout_arrays
+
+
+PAYOUT_TABLE, PAYOUT_ARRAYS = compile_payout_rules()
+
+
+def get_payout_multiplier(bet_type, outcomes):
+    """
+    Look up the payout multiplier for a list of leg outcomes (i.e: ["Win", "Tie"])
+    Returns:
+        Decimal multiplier, or None if the bet is still pending
+    Raises:
+        ValueError if the outcome combination is not valid for the bet type
+    """
+    counts = Counter(outcomes)
+    rule = PAYOUT_TABLE.get((bet_type, *(counts[outcome] for outcome in OUTCOMES)))
+    if rule is None or rule[0] == INVALID_BET:
+        raise ValueError(f"Invalid outcome combination for the {bet_type} bet.")
+    status, multiplier = rule
+    if status == PENDING_BET:
+        return None
+    return Decimal(multiplier) / 100
@@ -0,0 +1,90 @@
+"""
+Vectorized payout calculator
+
+Leg outcomes are encoded as a small integer matrix (one row per bet, one column per
+leg) and bet amounts as integer cents, so the payouts of a whole bet table are
+computed with a handful of NumPy array operations instead of per-row Decimal math.
+Multipliers come from the compiled payout rule arrays (see payout_rules.py), and
+results are identical, to the cent, to Bet.payout_for_outcomes().
+"""
+
+from decimal import Decimal
+
+import numpy as np
+
+from . import payout_rules
+
+# Leg outcome codes
+WIN = 0
+TIE = 1
+LOSS = 2
+PENDING = 3
+INVALID = 4
+
+OUTCOME_CODES = {
+    "Win": WIN,
+    "Tie": TIE,
+    "Loss": LOSS,
+    "Pending": PENDING,
+    "Invalid": INVALID,
+}
+
+# Bet status codes returned along with the payouts
+SETTLED = payout_rules.SETTLED
+PENDING_BET = payout_rules.PENDING_BET
+INVALID_BET = payout_rules.INVALID_BET
+
+
+def encode_outcomes(outcome_rows):
+    """
+    Encode a list of leg outcome lists (i.e: [["Win", "Tie"], ...]) into an int8 matrix
+    """
+    return np.array(
+        [[OUTCOME_CODES[outcome] for outcome in outcomes] for outcomes in outcome_rows],
+        dtype=np.int8,
+    )
+
+
+def to_cents(amounts):
+    """Convert an iterable of 2-decimal-place Decimals into an int64 array of cents"""
+    return np.array([int(amount * 100) for amount in amounts], dtype=np.int64)
+
+
+def from_cents(cents):
+    """Convert an integer number of cents back into a 2-decimal-place Decimal"""
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def calculate_payouts(bet_type, outcome_matrix, amount_cents):
+    """
+    Compute the payout of every bet of one bet type.
+
+    input:
+        bet_type (str): "Straight", "Action", "Parlay3" or "Parlay4"
+        outcome_matrix (ndarray): (n_bets, n_legs) matrix of leg outcome codes
+        amount_cents (ndarray): (n_bets,) bet amounts in cents
+    Returns:
+        (payout_cents, status): two (n_bets,) arrays. payout_cents is only
+        meaningful where status == SETTLED.
+    """
+    amount_cents = np.asarray(amount_cents, dtype=np.int64)
+    n_bets = len(amount_cents)
+    if n_bets == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    outcome_matrix = np.asarray(outcome_matrix, dtype=np.int8)
+
+    # Count the legs per outcome, in the order of the compiled payout rule keys
+    counts = tuple(
+        np.count_nonzero(outcome_matrix == code, axis=1)
+        for code in (WIN, TIE, LOSS, PENDING, INVALID)
+    )
+    rule_statuses, rule_multipliers = payout_rules.PAYOUT_ARRAYS[bet_type]
+    status = rule_statuses[counts]
+    multipliers = rule_multipliers[counts]
+
+    # amount * multiplier / 100, rounded half away from zero (ROUND_HALF_UP)
+    scaled = amount_cents * multipliers
+    payout_cents = np.sign(scaled) * ((np.abs(scaled) + 50) // 100)
+
+    return payout_cents, status
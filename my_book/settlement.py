@@ -0,0 +1,373 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+import numpy as np
+
+from django.db import transaction
+from django.db.models import Case, Q, Sum, Value, When
+
+from .models import BetSlip, Game, Player, SingleBet, Straight, Action, Parlay3, Parlay4
+from .outcome_cache import game_outcome_cache
+from .bet_slips import sync_slip_payouts
+from .payout_vector import (
+    INVALID_BET,
+    PENDING_BET,
+    OUTCOME_CODES,
+    calculate_payouts,
+    encode_outcomes,
+    from_cents,
+    to_cents,
+)
+
+logger = logging.getLogger(__name__)
+
+# bet type name -> bet model, in the order bets are listed across the app
+BET_MODELS = {
+    "Straight": Straight,
+    "Action": Action,
+    "Parlay3": Parlay3,
+    "Parlay4": Parlay4,
+}
+
+# Game fields that change the outcome of the single bets placed on it
+GAME_OUTCOME_FIELDS = Game.OUTCOME_FIELDS
+
+
+@dataclass
+class SettlementResult:
+    """
+    Summary of one settlement run
+    - settled_count: bets with a known payout (no pending legs)
+    - pending_count: bets with at least one pending leg
+    - invalid_count: bets whose leg outcomes do not match any payout rule, stored
+      without a payout
+    - updated_count: bets whose stored payout changed and were written back
+    """
+
+    settled_count: int = 0
+    pending_count: int = 0
+    invalid_count: int = 0
+    updated_count: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def total_count(self):
+        return self.settled_count + self.pending_count + self.invalid_count
+
+
+@dataclass
+class AuditResult:
+    """
+    Summary of one payout reconciliation run
+    - mismatches: list of (bet type, bet pk, stored payout, expected payout)
+    """
+
+    checked_count: int = 0
+    mismatches: list = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+
+def get_bet_queryset(bet_model):
+    """
+    Return a queryset of bet_model that loads every leg in the same query
+    """
+    leg_fields = [f"single_bet{i}" for i in range(1, bet_model.LEG_COUNT + 1)]
+    return bet_model.objects.select_related(*leg_fields)
+
+
+def get_outcome_whens(game):
+    """
+    Return the When() conditions that map the single bets on a finished game
+    to their outcome, mirroring SingleBet.determine_outcome()
+    """
+    on_game = Q(game_id=game.pk)
+    is_winner_bet = on_game & Q(single_bet_type="WINNER")
+    is_over_under_bet = on_game & Q(single_bet_type="OVER-UNDER")
+    whens = []
+
+    winner = game.determine_winner()
+    if winner is None:
+        whens.append(When(is_winner_bet, then=Value("Pending")))
+    elif winner == "Tie":
+        whens.append(When(is_winner_bet, then=Value("Tie")))
+    else:
+        whens.append(
+            When(is_winner_bet & Q(selected_team__iexact=winner), then=Value("Win"))
+        )
+        whens.append(When(is_winner_bet, then=Value("Loss")))
+
+    over_under = game.determine_over_under()
+    if over_under is None:
+        whens.append(When(is_over_under_bet, then=Value("Pending")))
+    elif over_under == "Tie":
+        whens.append(When(is_over_under_bet, then=Value("Tie")))
+    elif over_under == "Over":
+        whens.append(When(is_over_under_bet & Q(is_over=True), then=Value("Win")))
+        whens.append(When(is_over_under_bet, then=Value("Loss")))
+    else:
+        whens.append(When(is_over_under_bet & Q(is_over=True), then=Value("Loss")))
+        whens.append(When(is_over_under_bet, then=Value("Win")))
+
+    return whens
+
+
+def refresh_single_bet_outcomes(game_ids=None, batch_size=200):
+    """
+    Recompute the stored SingleBet.outcome of every single bet on the given games
+    (all games by default) with one UPDATE ... CASE statement per batch of games.
+    Returns:
+        number of single bets updated
+    """
+    games = Game.objects.all()
+    if game_ids is not None:
+        games = games.filter(pk__in=list(game_ids))
+    games = list(games)
+
+    updated_count = 0
+    for i in range(0, len(games), batch_size):
+        batch = games[i : i + batch_size]
+
+        # every valid leg on an unfinished game is pending, no need to evaluate the
+        # game; legs of an unknown type stay Invalid, as in determine_outcome()
+        unfinished_ids = [game.pk for game in batch if not game.is_finished]
+        whens = []
+        if unfinished_ids:
+            whens.append(
+                When(
+                    game_id__in=unfinished_ids,
+                    single_bet_type__in=["WINNER", "OVER-UNDER"],
+                    then=Value("Pending"),
+                )
+            )
+        for game in batch:
+            if game.is_finished:
+                whens.extend(get_outcome_whens(game))
+
+        updated_count += SingleBet.objects.filter(
+            game_id__in=[game.pk for game in batch]
+        ).update(outcome=Case(*whens, default=Value("Invalid")))
+
+    return updated_count
+
+
+def get_bet_querysets_for_games(game_ids):
+    """
+    Return {bet type: queryset} of the bets having at least one leg on the given games.
+    The SingleBets on those games are resolved once as a subquery, then matched
+    against every single_betN foreign key of each bet table.
+    """
+    single_bet_ids = SingleBet.objects.filter(game_id__in=game_ids).values("id")
+
+    bet_querysets = {}
+    for bet_type, bet_model in BET_MODELS.items():
+        leg_filter = Q()
+        for i in range(1, bet_model.LEG_COUNT + 1):
+            leg_filter |= Q(**{f"single_bet{i}__in": single_bet_ids})
+        bet_querysets[bet_type] = get_bet_queryset(bet_model).filter(leg_filter)
+    return bet_querysets
+
+
+def settle_bets(bet_querysets=None):
+    """
+    Recalculate the payout of every bet in memory and write the changed payouts
+    back with one bulk_update per bet table, inside a single transaction.
+
+    Leg outcomes are read from the stored SingleBet.outcome column.
+
+    input:
+        bet_querysets: optional dict of {bet type: queryset} restricting which bets
+        are settled. All bets of every type are settled by default, after the
+        outcome of every single bet has been refreshed.
+    Returns:
+        SettlementResult
+    """
+    start = time.perf_counter()
+    result = SettlementResult()
+
+    if bet_querysets is None:
+        refresh_single_bet_outcomes()
+        bet_querysets = {
+            bet_type: get_bet_queryset(bet_model)
+            for bet_type, bet_model in BET_MODELS.items()
+        }
+
+    changed_bets = {}
+    for bet_type, queryset in bet_querysets.items():
+        changed_bets[bet_type] = []
+        bets = list(queryset)
+
+        # Payouts of the whole table are computed at once from the leg outcomes
+        outcome_matrix = encode_outcomes(
+            [
+                [single_bet.outcome for single_bet in bet.get_single_bets()]
+                for bet in bets
+            ]
+        )
+        payouts_cents, statuses = calculate_payouts(
+            bet_type, outcome_matrix, to_cents(bet.bet_amount for bet in bets)
+        )
+
+        for bet, payout_cents, status in zip(bets, payouts_cents, statuses):
+            if status == INVALID_BET:
+                # No payout rule matches: the bet is void, any stale payout is cleared
+                payout = None
+                result.invalid_count += 1
+            elif status == PENDING_BET:
+                payout = None
+                result.pending_count += 1
+            else:
+                payout = from_cents(payout_cents)
+                result.settled_count += 1
+
+            if payout != bet.payout:
+                bet.payout = payout
+                changed_bets[bet_type].append(bet)
+
+    with transaction.atomic():
+        for bet_type, bets in changed_bets.items():
+            if bets:
+                BET_MODELS[bet_type].objects.bulk_update(bets, ["payout"])
+                sync_slip_payouts(bet_type, bets)
+                result.updated_count += len(bets)
+
+    if result.invalid_count:
+        logger.warning(
+            "settle_bets(): %d bets with an invalid outcome combination",
+            result.invalid_count,
+        )
+    result.elapsed_seconds = time.perf_counter() - start
+    return result
+
+
+def settle_bets_for_games(game_ids):
+    """
+    Re-settle only the bets that have a leg on one of the given games.
+    Used whenever a game's scores or finished flag change.
+    """
+    game_ids = list(game_ids)
+    if not game_ids:
+        return SettlementResult()
+    refresh_single_bet_outcomes(game_ids)
+    return settle_bets(get_bet_querysets_for_games(game_ids))
+
+
+def get_player_totals(bet_slips=None):
+    """
+    Return {player id: (total betting money, total payout)} summed over the given
+    BetSlip queryset (every bet by default) in one grouped query
+    """
+    if bet_slips is None:
+        bet_slips = BetSlip.objects.all()
+    totals = bet_slips.values("player_id").annotate(
+        total_betting_money=Sum("bet_amount"), total_payout=Sum("payout")
+    )
+    # SQLite sums decimals as floats, round the totals back to cents
+    cents = Decimal("0.01")
+    return {
+        row["player_id"]: (
+            (row["total_betting_money"] or Decimal(0)).quantize(cents),
+            (row["total_payout"] or Decimal(0)).quantize(cents),
+        )
+        for row in totals
+    }
+
+
+def rebuild_player_totals(player_totals=None):
+    """
+    Overwrite the materialized totals of every player, players without bets total 0
+    input:
+        player_totals: optional {player id: (total betting money, total payout)},
+        recomputed from every bet by default
+    Returns:
+        number of players updated
+    """
+    if player_totals is None:
+        player_totals = get_player_totals()
+
+    players = list(Player.objects.only("id"))
+    for player in players:
+        player.total_betting_money, player.total_payout = player_totals.get(
+            player.pk, (Decimal(0), Decimal(0))
+        )
+    Player.objects.bulk_update(
+        players, ["total_betting_money", "total_payout"], batch_size=500
+    )
+    return len(players)
+
+
+def settle_player_shard(first_player_id, last_player_id, open_only=True):
+    """
+    Settle the bets of the players whose id is between first_player_id and
+    last_player_id (inclusive), then total their bets.
+    Runs in a worker process of the settle_book command, with its own connection.
+
+    input:
+        open_only (bool): only settle the bets without a payout yet
+    Returns:
+        (SettlementResult, {player id: (total betting money, total payout)})
+    """
+    player_range = Q(player_id__gte=first_player_id, player_id__lte=last_player_id)
+    bet_querysets = {}
+    for bet_type, bet_model in BET_MODELS.items():
+        queryset = get_bet_queryset(bet_model).filter(player_range)
+        if open_only:
+            queryset = queryset.filter(payout__isnull=True)
+        bet_querysets[bet_type] = queryset
+
+    result = settle_bets(bet_querysets)
+    totals = get_player_totals(BetSlip.objects.filter(player_range))
+    return result, totals
+
+
+def audit_payouts():
+    """
+    Recompute every payout from the current game results and compare it with the
+    stored payout, without writing anything.
+    Leg outcomes are computed once per SingleBet, then every bet table is checked
+    with a single vectorized payout calculation. Pending and invalid bets are
+    expected to have no payout, as settle_bets() stores them.
+
+    Returns:
+        AuditResult
+    """
+    start = time.perf_counter()
+    result = AuditResult()
+
+    # outcome code of every single bet, indexed by position in the sorted ids
+    single_bets = SingleBet.objects.select_related("game").order_by("id")
+    single_bet_ids = []
+    single_bet_codes = []
+    with game_outcome_cache():
+        for single_bet in single_bets:
+            single_bet_ids.append(single_bet.id)
+            single_bet_codes.append(OUTCOME_CODES[single_bet.determine_outcome()])
+    single_bet_ids = np.array(single_bet_ids, dtype=np.int64)
+    single_bet_codes = np.array(single_bet_codes, dtype=np.int8)
+
+    for bet_type, bet_model in BET_MODELS.items():
+        leg_fields = [f"single_bet{i}_id" for i in range(1, bet_model.LEG_COUNT + 1)]
+        rows = list(
+            bet_model.objects.values_list("id", "bet_amount", "payout", *leg_fields)
+        )
+        if not rows:
+            continue
+
+        leg_ids = np.array([row[3:] for row in rows], dtype=np.int64)
+        outcome_matrix = single_bet_codes[np.searchsorted(single_bet_ids, leg_ids)]
+        payouts_cents, statuses = calculate_payouts(
+            bet_type, outcome_matrix, to_cents(row[1] for row in rows)
+        )
+
+        for row, payout_cents, status in zip(rows, payouts_cents, statuses):
+            if status in (INVALID_BET, PENDING_BET):
+                expected = None
+            else:
+                expected = from_cents(payout_cents)
+            if expected != row[2]:
+                result.mismatches.append((bet_type, row[0], row[2], expected))
+        result.checked_count += len(rows)
+
+    result.elapsed_seconds = time.perf_counter() - start
+    return result
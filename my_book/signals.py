@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Straight, Action, Parlay3, Parlay4
+from .bet_slips import sync_bet_slip, delete_bet_slip
+
+
+@receiver(post_save, sender=Straight)
+@receiver(post_save, sender=Action)
+@receiver(post_save, sender=Parlay3)
+@receiver(post_save, sender=Parlay4)
+def sync_bet_slip_on_save(sender, instance, **kwargs):
+    """Keep the BetSlip mirror in sync whenever a bet is saved"""
+    sync_bet_slip(instance)
+
+
+@receiver(post_delete, sender=Straight)
+@receiver(post_delete, sender=Action)
+@receiver(post_delete, sender=Parlay3)
+@receiver(post_delete, sender=Parlay4)
+def delete_bet_slip_on_delete(sender, instance, **kwargs):
+    """Remove the BetSlip of a deleted bet, including cascaded deletions"""
+    delete_bet_slip(instance)
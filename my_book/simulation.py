@@ -0,0 +1,306 @@
+"""
+What-if settlement simulator
+
+The book is loaded once into NumPy arrays (one entry per leg and per bet). Each
+scenario of hypothetical final scores only re-evaluates the games it overrides,
+through unsaved Game copies so determine_winner()/determine_over_under() semantics
+are reused, then derives every leg outcome and payout with array operations.
+Nothing is written to the database.
+"""
+
+import copy
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+import numpy as np
+
+from .models import BetLeg, BetSlip, Game
+from .payout_vector import (
+    INVALID,
+    INVALID_BET,
+    LOSS,
+    PENDING,
+    PENDING_BET,
+    SETTLED,
+    TIE,
+    WIN,
+    calculate_payouts,
+    from_cents,
+    to_cents,
+)
+from .settlement import BET_MODELS
+
+# Game result codes: which side covered the spread, and the over/under result
+SIDE_A = 0
+SIDE_B = 1
+RESULT_TIE = 2
+RESULT_PENDING = 3
+OVER = 0
+UNDER = 1
+
+# Single bet types
+WINNER_BET = 0
+OVER_UNDER_BET = 1
+OTHER_BET = 2
+
+# Most scenarios of one sweep, each one re-evaluates the whole book (~1ms for 1.5k bets)
+MAX_SWEEP_SCENARIOS = 2000
+
+
+@dataclass
+class SimulationResult:
+    """
+    Book-wide and per-player payouts for one scenario
+    - total_payout: sum of the settled payouts (positive means the book owes players)
+    - invalid_count: bets whose leg outcomes do not match any payout rule (void)
+    - player_payouts: {player id: payout}
+    """
+
+    total_payout: Decimal = Decimal("0.00")
+    settled_count: int = 0
+    pending_count: int = 0
+    invalid_count: int = 0
+    player_payouts: dict = field(default_factory=dict)
+
+    @property
+    def book_profit(self):
+        return -self.total_payout
+
+
+def get_game_result_codes(game):
+    """
+    Return (winner side, over/under result) codes of a game, using its own
+    determine_winner() and determine_over_under()
+    """
+    if not game.is_finished:
+        return RESULT_PENDING, RESULT_PENDING
+
+    winner = game.determine_winner()
+    if winner is None:
+        side = RESULT_PENDING
+    elif winner == "Tie":
+        side = RESULT_TIE
+    elif winner == game.team_a:
+        side = SIDE_A
+    else:
+        side = SIDE_B
+
+    over_under = game.determine_over_under()
+    over_under_code = {
+        None: RESULT_PENDING,
+        "Tie": RESULT_TIE,
+        "Over": OVER,
+        "Under": UNDER,
+    }[over_under]
+    return side, over_under_code
+
+
+class BookSimulator:
+    """
+    Compute the book's payouts under hypothetical final scores
+
+    usage:
+        simulator = BookSimulator()
+        result = simulator.simulate({game_id: (score_team_a, score_team_b)})
+
+    BetSlips whose BetLegs do not match their bet type's leg count (a drifted
+    mirror, see audit_bet_slips) are left out of every scenario, their ids are
+    kept in incomplete_slip_ids.
+    """
+
+    def __init__(self, bet_slips=None):
+        if bet_slips is None:
+            bet_slips = BetSlip.objects.all()
+        slips = list(
+            bet_slips.order_by("id").values_list(
+                "id", "bet_type", "player_id", "bet_amount"
+            )
+        )
+        legs = list(
+            BetLeg.objects.filter(bet_id__in=[slip[0] for slip in slips])
+            .order_by("bet_id", "leg_no")
+            .values_list(
+                "bet_id",
+                "single_bet__game_id",
+                "single_bet__single_bet_type",
+                "single_bet__selected_team",
+                "single_bet__is_over",
+            )
+        )
+
+        # Games referenced by the legs, with their current results
+        self.games = Game.objects.in_bulk({leg[1] for leg in legs})
+        game_ids = sorted(self.games)
+        self.game_index = {game_id: i for i, game_id in enumerate(game_ids)}
+        base_results = [get_game_result_codes(self.games[g]) for g in game_ids]
+        self.base_sides = np.array(
+            [side for side, _ in base_results] or [], dtype=np.int8
+        )
+        self.base_over_unders = np.array(
+            [over_under for _, over_under in base_results] or [], dtype=np.int8
+        )
+
+        # One entry per leg
+        self.leg_games = np.array(
+            [self.game_index[leg[1]] for leg in legs], dtype=np.int64
+        )
+        self.leg_types = np.array(
+            [self._get_leg_type(leg[2]) for leg in legs], dtype=np.int8
+        )
+        self.leg_sides = np.array(
+            [self._get_selected_side(leg) for leg in legs], dtype=np.int8
+        )
+        self.leg_is_over = np.array([bool(leg[4]) for leg in legs], dtype=bool)
+
+        # Legs of each bet type as a (n_bets, n_legs) matrix of leg positions
+        leg_positions = {}
+        for position, leg in enumerate(legs):
+            leg_positions.setdefault(leg[0], []).append(position)
+
+        # Slips that can't fill a row of the leg matrix are reported, not simulated
+        self.incomplete_slip_ids = [
+            slip[0]
+            for slip in slips
+            if len(leg_positions.get(slip[0], [])) != BET_MODELS[slip[1]].LEG_COUNT
+        ]
+        incomplete_slip_ids = set(self.incomplete_slip_ids)
+        slips = [slip for slip in slips if slip[0] not in incomplete_slip_ids]
+
+        player_ids = sorted({slip[2] for slip in slips})
+        self.player_ids = np.array(player_ids, dtype=np.int64)
+        player_index = {player_id: i for i, player_id in enumerate(player_ids)}
+
+        self.bet_tables = {}
+        for bet_type, bet_model in BET_MODELS.items():
+            type_slips = [slip for slip in slips if slip[1] == bet_type]
+            self.bet_tables[bet_type] = (
+                np.array(
+                    [leg_positions[slip[0]] for slip in type_slips],
+                    dtype=np.int64,
+                ).reshape(len(type_slips), bet_model.LEG_COUNT),
+                to_cents(slip[3] for slip in type_slips),
+                np.array(
+                    [player_index[slip[2]] for slip in type_slips], dtype=np.int64
+                ),
+            )
+
+    def _get_leg_type(self, single_bet_type):
+        if single_bet_type == "WINNER":
+            return WINNER_BET
+        elif single_bet_type == "OVER-UNDER":
+            return OVER_UNDER_BET
+        return OTHER_BET
+
+    def _get_selected_side(self, leg):
+        """Return which team of the game a WINNER leg picked"""
+        game = self.games[leg[1]]
+        selected_team = (leg[3] or "").lower()
+        if selected_team == game.team_a.lower():
+            return SIDE_A
+        elif selected_team == game.team_b.lower():
+            return SIDE_B
+        return RESULT_PENDING  # never matches a winner side, so it loses
+
+    def get_scenario_results(self, scores):
+        """
+        Return (winner sides, over/under results) of every game with the
+        hypothetical final scores applied
+        input:
+            scores: {game id: (score_team_a, score_team_b)}
+        """
+        sides = self.base_sides.copy()
+        over_unders = self.base_over_unders.copy()
+        for game_id, (score_team_a, score_team_b) in scores.items():
+            i = self.game_index.get(int(game_id))
+            if i is None:
+                continue  # no bet on this game
+
+            # An unsaved copy, the real game is never modified or saved
+            game = copy.copy(self.games[int(game_id)])
+            game.score_team_a = Decimal(str(score_team_a))
+            game.score_team_b = Decimal(str(score_team_b))
+            game.total_points = game.score_team_a + game.score_team_b
+            game.is_finished = True
+            sides[i], over_unders[i] = get_game_result_codes(game)
+        return sides, over_unders
+
+    def get_leg_outcomes(self, sides, over_unders):
+        """Return the outcome code of every leg for the given game results"""
+        leg_sides = sides[self.leg_games]
+        leg_over_unders = over_unders[self.leg_games]
+        is_winner = self.leg_types == WINNER_BET
+        is_over_under = self.leg_types == OVER_UNDER_BET
+
+        outcomes = np.full(len(self.leg_types), INVALID, dtype=np.int8)
+
+        winner_outcomes = np.where(leg_sides == self.leg_sides, WIN, LOSS)
+        winner_outcomes[leg_sides == RESULT_TIE] = TIE
+        winner_outcomes[leg_sides == RESULT_PENDING] = PENDING
+        outcomes[is_winner] = winner_outcomes[is_winner]
+
+        picked_over_under = np.where(self.leg_is_over, OVER, UNDER)
+        over_under_outcomes = np.where(leg_over_unders == picked_over_under, WIN, LOSS)
+        over_under_outcomes[leg_over_unders == RESULT_TIE] = TIE
+        over_under_outcomes[leg_over_unders == RESULT_PENDING] = PENDING
+        outcomes[is_over_under] = over_under_outcomes[is_over_under]
+
+        return outcomes
+
+    def simulate(self, scores):
+        """
+        Compute the book-wide and per-player payouts for one scenario
+        input:
+            scores: {game id: (score_team_a, score_team_b)}, games left out keep
+            their current results
+        Returns:
+            SimulationResult
+        """
+        sides, over_unders = self.get_scenario_results(scores)
+        leg_outcomes = self.get_leg_outcomes(sides, over_unders)
+
+        result = SimulationResult()
+        player_cents = np.zeros(len(self.player_ids), dtype=np.int64)
+        for bet_type, (leg_matrix, amount_cents, players) in self.bet_tables.items():
+            payouts_cents, statuses = calculate_payouts(
+                bet_type, leg_outcomes[leg_matrix], amount_cents
+            )
+            is_settled = statuses == SETTLED
+            player_cents += np.bincount(
+                players[is_settled],
+                weights=payouts_cents[is_settled],
+                minlength=len(self.player_ids),
+            ).astype(np.int64)
+            result.settled_count += int(is_settled.sum())
+            result.pending_count += int((statuses == PENDING_BET).sum())
+            result.invalid_count += int((statuses == INVALID_BET).sum())
+
+        result.total_payout = from_cents(player_cents.sum())
+        result.player_payouts = {
+            int(player_id): from_cents(cents)
+            for player_id, cents in zip(self.player_ids, player_cents)
+        }
+        return result
+
+    def sweep(self, game_id, scores_team_a, scores_team_b, scores=None):
+        """
+        Compute the book-wide payout for every combination of final scores of one game
+        input:
+            scores: optional hypothetical scores of the other games
+        Returns:
+            list of (score_team_a, score_team_b, SimulationResult)
+        Raises:
+            ValueError if the grid has more than MAX_SWEEP_SCENARIOS scenarios
+        """
+        scenario_count = len(scores_team_a) * len(scores_team_b)
+        if scenario_count > MAX_SWEEP_SCENARIOS:
+            raise ValueError(
+                f"A sweep has at most {MAX_SWEEP_SCENARIOS} score combinations, "
+                f"not {scenario_count}."
+            )
+        scores = dict(scores or {})
+        results = []
+        for score_team_a in scores_team_a:
+            for score_team_b in scores_team_b:
+                scores[game_id] = (score_team_a, score_team_b)
+                results.append((score_team_a, score_team_b, self.simulate(scores)))
+        return results
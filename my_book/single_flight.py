@@ -0,0 +1,99 @@
+"""
+Coalescing of concurrent identical calls
+
+SingleFlight runs a function once for all the threads asking for the same key at the
+same time: the first caller runs it, the others wait and get its result (or its
+exception). file_lock() extends this across processes: the worker holding the lock
+file of a key fetches, the other workers wait for it and then find the result in the
+shared cache.
+"""
+
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+try:
+    import fcntl
+except ImportError:  # Windows, the lock file is not used
+    fcntl = None
+
+
+@dataclass
+class SingleFlightMetrics:
+    """Counters of one SingleFlight"""
+
+    calls: int = 0
+    shared: int = 0
+
+    def __str__(self):
+        return f"{self.calls} calls, {self.shared} shared an in-flight call"
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run a function once for all the concurrent callers of the same key"""
+
+    def __init__(self):
+        self.metrics = SingleFlightMetrics()
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        """
+        Return function(), or the result of the call already in flight for key
+        The result is shared as is, callers must not modify it
+        """
+        with self._lock:
+            self.metrics.calls += 1
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.metrics.shared += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+@contextmanager
+def file_lock(lock_dir, key):
+    """
+    Hold an exclusive lock on the lock file of key, shared by all the processes of
+    the machine, while in the block
+    Yields:
+        True if the lock is held, False if lock_dir is empty or locks are unsupported
+    """
+    if not lock_dir or fcntl is None:
+        yield False
+        return
+    os.makedirs(lock_dir, exist_ok=True)
+    path = os.path.join(lock_dir, f"{hashlib.md5(key.encode()).hexdigest()}.lock")
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
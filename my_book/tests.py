@@ -1,3 +1,954 @@
-from django.test import TestCase
+import hashlib
+import json
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from itertools import product
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .bet_import import import_bets, write_transaction
+from .bet_rows import hydrate_bet_slips
+from .bet_slips import audit_bet_slips
+from .game_upsert import upsert_games
+from .management.commands.poll_scores import Command as PollScoresCommand
+from .management.commands.poll_scores import PollGroup
+from .models import (
+    Action,
+    BetSlip,
+    Game,
+    IdempotencyKey,
+    Parlay3,
+    Player,
+    SingleBet,
+    Straight,
+)
+from .pagination import encode_cursor, get_keyset_page
+from .payout_vector import (
+    INVALID_BET,
+    OUTCOME_CODES,
+    PENDING_BET,
+    calculate_payouts,
+    encode_outcomes,
+    from_cents,
+    to_cents,
+)
+from .settlement import (
+    BET_MODELS,
+    audit_payouts,
+    get_player_totals,
+    rebuild_player_totals,
+    refresh_single_bet_outcomes,
+    settle_bets,
+    settle_bets_for_games,
+)
+from .simulation import BookSimulator
+
+# A sports API cache of its own, so a test never reads another run's responses
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "sports_api": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "sports_api_tests",
+    },
+}
+
+
+def create_game(team_a, team_b, game_date, **fields):
+    """Create a game, team_a being the favorite unless fav is given"""
+    fields.setdefault("fav", team_a)
+    fields.setdefault("fav_spread", 3)
+    fields.setdefault("over_under_points", 40)
+    return Game.objects.create(
+        team_a=team_a, team_b=team_b, league="NFL", game_date=game_date, **fields
+    )
+
+
+class MixedBookMixin:
+    """
+    Games and single bets giving every leg outcome, and a book of bets of every
+    type on every outcome mix
+    """
+
+    def setUp(self):
+        self.players = [Player.objects.create(name=name) for name in ["Alice", "Bob"]]
+        # Ravens cover the 3 points and the total (45) is over 40
+        self.won_game = create_game(
+            "Cleveland Browns",
+            "Baltimore Ravens",
+            date(2025, 1, 4),
+            score_team_a=10,
+            score_team_b=35,
+            is_finished=True,
+        )
+        # Bengals win by the spread exactly and the total is the over/under: pushes
+        self.push_game = create_game(
+            "Cincinnati Bengals",
+            "Pittsburgh Steelers",
+            date(2025, 1, 4),
+            score_team_a=20,
+            score_team_b=17,
+            over_under_points=37,
+            is_finished=True,
+        )
+        self.open_game = create_game(
+            "Denver Broncos", "Kansas City Chiefs", date.today()
+        )
+
+        # One leg of each outcome, an unknown bet type being a void (Invalid) leg
+        self.legs = {
+            "Win": self.create_leg(self.won_game, "WINNER", team="Baltimore Ravens"),
+            "Loss": self.create_leg(self.won_game, "OVER-UNDER", is_over=False),
+            "Tie": self.create_leg(self.push_game, "WINNER", team="Cincinnati Bengals"),
+            "Pending": self.create_leg(self.open_game, "OVER-UNDER", is_over=True),
+            "Invalid": self.create_leg(self.open_game, "FIRST-TD"),
+        }
+        self.win_leg_2 = self.create_leg(self.won_game, "OVER-UNDER", is_over=True)
+        self.tie_leg_2 = self.create_leg(self.push_game, "OVER-UNDER", is_over=False)
+
+    def create_leg(self, game, single_bet_type, team=None, is_over=None):
+        return SingleBet.objects.create(
+            game=game,
+            single_bet_type=single_bet_type,
+            selected_team=team,
+            is_over=is_over,
+        )
+
+    def create_mixed_book(self):
+        """Bets of every type on every outcome mix, with amounts that round"""
+        leg_sets = {
+            "Straight": [["Win"], ["Loss"], ["Tie"], ["Pending"], ["Invalid"]],
+            "Action": [
+                ["Win", "Win2"],
+                ["Win", "Tie"],
+                ["Tie", "Tie2"],
+                ["Win", "Loss"],
+                ["Win", "Pending"],
+                ["Loss", "Pending"],
+                ["Tie", "Invalid"],
+            ],
+            "Parlay3": [
+                ["Win", "Win2", "Tie"],
+                ["Win", "Tie", "Tie2"],
+                ["Win", "Win2", "Loss"],
+                ["Win", "Tie", "Pending"],
+                ["Win", "Win2", "Invalid"],
+            ],
+            "Parlay4": [
+                ["Win", "Win2", "Tie", "Tie2"],
+                ["Win", "Win2", "Tie", "Loss"],
+                ["Win", "Win2", "Tie", "Pending"],
+                ["Win", "Tie", "Tie2", "Invalid"],
+            ],
+        }
+        legs = {**self.legs, "Win2": self.win_leg_2, "Tie2": self.tie_leg_2}
+        amounts = [Decimal("33.33"), Decimal("12.35"), Decimal("100.00")]
+
+        bets = []
+        for bet_type, leg_names_list in leg_sets.items():
+            bet_model = BET_MODELS[bet_type]
+            for i, leg_names in enumerate(leg_names_list):
+                bets.append(
+                    bet_model.objects.create(
+                        player=self.players[i % 2],
+                        bet_amount=amounts[i % len(amounts)],
+                        **{
+                            f"single_bet{leg_no}": legs[leg_name]
+                            for leg_no, leg_name in enumerate(leg_names, start=1)
+                        },
+                    )
+                )
+        return bets
+
+    def get_expected_payout(self, bet):
+        """Return the per-bet payout, or "Invalid" if no payout rule matches"""
+        outcomes = [leg.determine_outcome() for leg in bet.get_single_bets()]
+        try:
+            return bet.payout_for_outcomes(outcomes)
+        except ValueError:
+            return "Invalid"
+
+    def reload(self, bets):
+        return [type(bet).objects.get(pk=bet.pk) for bet in bets]
+
+
+class SettlementTests(MixedBookMixin, TestCase):
+    """settle_bets() must store the payouts of the per-bet payout_for_outcomes()"""
+
+    def test_leg_outcomes(self):
+        self.assertEqual(
+            {outcome: leg.determine_outcome() for outcome, leg in self.legs.items()},
+            {outcome: outcome for outcome in self.legs},
+        )
+
+    def test_settle_bets_matches_payout_for_outcomes(self):
+        bets = self.create_mixed_book()
+        result = settle_bets()
+
+        expected_payouts = [self.get_expected_payout(bet) for bet in bets]
+        self.assertEqual(result.invalid_count, expected_payouts.count("Invalid"))
+        self.assertEqual(result.pending_count, expected_payouts.count(None))
+        self.assertEqual(result.total_count, len(bets))
+        for bet, expected in zip(self.reload(bets), expected_payouts):
+            # Invalid bets are void, stored without a payout
+            self.assertEqual(
+                bet.payout, None if expected == "Invalid" else expected, bet
+            )
+
+    def test_invalid_bets_lose_stale_payouts_and_pass_the_audit(self):
+        bets = self.create_mixed_book()
+        invalid_bets = [
+            bet for bet in bets if self.get_expected_payout(bet) == "Invalid"
+        ]
+        self.assertTrue(invalid_bets)
+        for bet in invalid_bets:
+            type(bet).objects.filter(pk=bet.pk).update(payout=Decimal("5.00"))
+
+        with self.assertLogs("my_book.settlement", "WARNING"):
+            result = settle_bets()
+
+        self.assertEqual(result.invalid_count, len(invalid_bets))
+        self.assertEqual(
+            [bet.payout for bet in self.reload(invalid_bets)],
+            [None] * len(invalid_bets),
+        )
+        self.assertEqual(audit_payouts().mismatches, [])
+
+
+class VectorizedPayoutTests(TestCase):
+    """calculate_payouts() must match payout_for_outcomes() to the cent"""
+
+    def test_vectorized_payouts_match_payout_for_outcomes(self):
+        outcomes = list(OUTCOME_CODES)
+        amounts = [Decimal("0.01"), Decimal("0.05"), Decimal("12.35"), Decimal("33.33")]
+        for bet_type, bet_model in BET_MODELS.items():
+            outcome_rows = [
+                list(row)
+                for row in product(outcomes, repeat=bet_model.LEG_COUNT)
+                for _ in amounts
+            ]
+            row_amounts = amounts * (len(outcome_rows) // len(amounts))
+            payouts_cents, statuses = calculate_payouts(
+                bet_type, encode_outcomes(outcome_rows), to_cents(row_amounts)
+            )
+            for row, amount, payout_cents, status in zip(
+                outcome_rows, row_amounts, payouts_cents, statuses
+            ):
+                bet = bet_model(bet_amount=amount)
+                try:
+                    expected = bet.payout_for_outcomes(row)
+                except ValueError:
+                    self.assertEqual(status, INVALID_BET, (bet_type, row))
+                    continue
+                if expected is None:
+                    self.assertEqual(status, PENDING_BET, (bet_type, row))
+                else:
+                    self.assertEqual(
+                        from_cents(payout_cents), expected, (bet_type, row, amount)
+                    )
+
+
+class SingleBetOutcomeRefreshTests(TestCase):
+    """
+    refresh_single_bet_outcomes() must store what SingleBet.determine_outcome()
+    returns, for every bet type and game state
+    """
+
+    def test_refresh_matches_determine_outcome(self):
+        games = [
+            # Not played yet
+            create_game("Denver Broncos", "Kansas City Chiefs", date.today()),
+            # Favorite covers, over
+            create_game(
+                "Cleveland Browns",
+                "Baltimore Ravens",
+                date(2025, 1, 4),
+                fav="Baltimore Ravens",
+                score_team_a=10,
+                score_team_b=35,
+                is_finished=True,
+            ),
+            # Underdog covers, under
+            create_game(
+                "Buffalo Bills",
+                "Miami Dolphins",
+                date(2025, 1, 4),
+                score_team_a=14,
+                score_team_b=13,
+                is_finished=True,
+            ),
+            # Pushes on the spread and the total
+            create_game(
+                "Cincinnati Bengals",
+                "Pittsburgh Steelers",
+                date(2025, 1, 4),
+                score_team_a=20,
+                score_team_b=17,
+                over_under_points=37,
+                is_finished=True,
+            ),
+            # The favorite is neither team, the winner can't be decided
+            create_game(
+                "Detroit Lions",
+                "Chicago Bears",
+                date(2025, 1, 4),
+                fav="Green Bay Packers",
+                score_team_a=30,
+                score_team_b=10,
+                is_finished=True,
+            ),
+        ]
+        for game in games:
+            for single_bet_type, team, is_over in [
+                ("WINNER", game.team_a, None),
+                ("WINNER", game.team_b.upper(), None),
+                ("OVER-UNDER", None, True),
+                ("OVER-UNDER", None, False),
+                ("FIRST-TD", None, None),
+            ]:
+                SingleBet.objects.create(
+                    game=game,
+                    single_bet_type=single_bet_type,
+                    selected_team=team,
+                    is_over=is_over,
+                )
+        # Stale outcomes, all of them must be rewritten
+        SingleBet.objects.update(outcome="Loss")
+
+        refresh_single_bet_outcomes()
+
+        single_bets = SingleBet.objects.select_related("game")
+        self.assertEqual(len(single_bets), 25)
+        for single_bet in single_bets:
+            self.assertEqual(
+                single_bet.outcome,
+                single_bet.determine_outcome(),
+                (single_bet.game, single_bet.single_bet_type, single_bet.selected_team),
+            )
+
+
+class BetSlipConsistencyTests(MixedBookMixin, TestCase):
+    """BetSlip rows and player totals must follow the bets through every write path"""
+
+    def assert_book_consistent(self):
+        """BetSlips mirror the bets, and the player totals sum the BetSlips"""
+        bets = {
+            (bet_type, bet.pk): (bet.player_id, bet.bet_amount, bet.payout)
+            for bet_type, bet_model in BET_MODELS.items()
+            for bet in bet_model.objects.all()
+        }
+        slips = {
+            (slip.bet_type, slip.bet_id): (slip.player_id, slip.bet_amount, slip.payout)
+            for slip in BetSlip.objects.all()
+        }
+        self.assertEqual(slips, bets)
+
+        totals = get_player_totals()
+        for player in Player.objects.all():
+            self.assertEqual(
+                (player.total_betting_money, player.total_payout),
+                totals.get(player.pk, (Decimal(0), Decimal(0))),
+                player,
+            )
+
+    def test_settle_bets_keeps_book_consistent(self):
+        self.create_mixed_book()
+        settle_bets()
+        self.assert_book_consistent()
+
+    def test_settle_bets_for_games_matches_full_settlement(self):
+        bets = self.create_mixed_book()
+        settle_bets()
+
+        # The Browns come back: the winner and over/under legs flip
+        self.won_game.score_team_a = 40
+        self.won_game.score_team_b = 3
+        self.won_game.save()
+        settle_bets_for_games([self.won_game.pk])
+        payouts = {bet.pk: bet.payout for bet in self.reload(bets)}
+
+        settle_bets()
+        self.assertEqual({bet.pk: bet.payout for bet in self.reload(bets)}, payouts)
+        self.assert_book_consistent()
+
+    def test_book_stays_consistent_after_create_delete_and_resettle(self):
+        bets = self.create_mixed_book()
+        self.assert_book_consistent()
+
+        settle_bets()
+        self.assert_book_consistent()
+
+        # Deleted bets, and bets deleted through their games, leave the totals
+        bets[0].delete()
+        self.open_game.delete()
+        self.assert_book_consistent()
+
+        # Settling the open game's remaining bets by hand goes through save()
+        for bet in Parlay3.objects.all():
+            bet.calculate_payout()
+        self.push_game.score_team_a = 30
+        self.push_game.save()
+        settle_bets_for_games([self.push_game.pk])
+        self.assert_book_consistent()
+
+        # The incremental totals agree with a full rebuild
+        totals = {
+            player.pk: (player.total_betting_money, player.total_payout)
+            for player in Player.objects.all()
+        }
+        rebuild_player_totals()
+        self.assertEqual(
+            {
+                player.pk: (player.total_betting_money, player.total_payout)
+                for player in Player.objects.all()
+            },
+            totals,
+        )
+
+    def test_migration_rebuilds_stale_player_totals(self):
+        self.create_mixed_book()
+        settle_bets()
+        # Totals stored before they were maintained incrementally
+        Player.objects.update(total_betting_money=0, total_payout=Decimal("999.99"))
+
+        migration = import_module("my_book.migrations.0007_rebuild_player_totals")
+        migration.rebuild_player_totals(apps, None)
+        self.assert_book_consistent()
+
+    def test_audit_bet_slips_repairs_drift(self):
+        bets = self.create_mixed_book()
+        settle_bets()
+        straight, action, parlay3 = bets[0], bets[5], bets[12]
+
+        # Writes that skip the signals: the mirror falls behind the bet tables
+        Straight.objects.filter(pk=straight.pk).update(bet_amount=Decimal("1.00"))
+        BetSlip.objects.filter(bet_type="Action", bet_id=action.pk).delete()
+        BetSlip.objects.create(
+            bet_type="Parlay4",
+            bet_id=parlay3.pk + 1000,
+            player=self.players[0],
+            bet_amount=Decimal("10.00"),
+            created_at=parlay3.created_at,
+        )
+
+        result = audit_bet_slips()
+        self.assertEqual(result.checked_count, len(bets))
+        self.assertEqual(result.missing, [("Action", action.pk)])
+        self.assertEqual(result.orphaned, [("Parlay4", parlay3.pk + 1000)])
+        self.assertEqual(result.mismatched, [("Straight", straight.pk)])
+
+        call_command("audit_bet_slips", "--fix", stdout=StringIO())
+        self.assertEqual(audit_bet_slips().drift_count, 0)
+        self.assert_book_consistent()
+
+
+class SimulationSweepLimitTests(TestCase):
+    """Sweeps of the what-if simulator are capped at MAX_SWEEP_SCENARIOS"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("bookie", password="x"))
+        self.game = create_game(
+            "Cincinnati Bengals", "Pittsburgh Steelers", date.today()
+        )
+
+    def post_sweep(self, score_team_a, score_team_b):
+        return self.client.post(
+            "/api/simulation/",
+            json.dumps(
+                {
+                    "sweep": {
+                        "game": self.game.pk,
+                        "score_team_a": score_team_a,
+                        "score_team_b": score_team_b,
+                    }
+                }
+            ),
+            content_type="application/json",
+        )
+
+    def test_large_sweep_is_rejected(self):
+        response = self.post_sweep([0, 200], [0, 200])
+        self.assertEqual(response.status_code, 400)
+        with self.assertRaises(ValueError):
+            BookSimulator().sweep(self.game.pk, range(100), range(100))
+
+    def test_sweep_within_limit_is_summarized(self):
+        response = self.post_sweep([0, 9], [0, 9])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data["sweep"]), 100)
+        self.assertEqual(data["sweep_summary"]["scenario_count"], 100)
+
+
+class BookSimulatorTests(MixedBookMixin, TestCase):
+    """The simulator counts bets as settle_bets() does, and survives a drifted mirror"""
+
+    def test_counts_match_settle_bets(self):
+        self.create_mixed_book()
+        result = BookSimulator().simulate({})
+        settlement = settle_bets()
+
+        self.assertEqual(
+            (result.settled_count, result.pending_count, result.invalid_count),
+            (
+                settlement.settled_count,
+                settlement.pending_count,
+                settlement.invalid_count,
+            ),
+        )
+
+    def test_slips_with_missing_legs_are_left_out(self):
+        bets = self.create_mixed_book()
+        slips = BetSlip.objects.filter(bet_type="Parlay4").order_by("id")
+        no_legs_slip, short_slip = slips[0], slips[1]
+        no_legs_slip.legs.all().delete()
+        short_slip.legs.filter(leg_no=4).delete()
+        self.client.force_login(User.objects.create_user("bookie", password="x"))
+
+        simulator = BookSimulator()
+        result = simulator.simulate({})
+        response = self.client.post(
+            "/api/simulation/", json.dumps({}), content_type="application/json"
+        )
+
+        self.assertEqual(
+            simulator.incomplete_slip_ids, [no_legs_slip.pk, short_slip.pk]
+        )
+        self.assertEqual(
+            result.settled_count + result.pending_count + result.invalid_count,
+            len(bets) - 2,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["incomplete_slip_ids"], [no_legs_slip.pk, short_slip.pk]
+        )
+
+
+class BetListPaginationTests(TestCase):
+    """The bet list is keyset-paginated on (created_at, id), newest first"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("bookie", password="x"))
+        self.players = [Player.objects.create(name=name) for name in ["Alice", "Bob"]]
+        game = create_game("Denver Broncos", "Kansas City Chiefs", date.today())
+        for i in range(7):
+            Straight.objects.create(
+                player=self.players[i % 2],
+                bet_amount=Decimal("10.00"),
+                single_bet1=SingleBet.objects.create(
+                    game=game, single_bet_type="OVER-UNDER", is_over=True
+                ),
+            )
+        # Bets placed in the same instant, as a bulk import does
+        BetSlip.objects.update(created_at=timezone.now())
+
+    def get_pages(self, get_page, cursor_name, cursor=None):
+        pages = []
+        while True:
+            page = get_page(**{cursor_name: cursor})
+            pages.append([slip.pk for slip in page.rows])
+            cursor = getattr(
+                page, "next_cursor" if cursor_name == "after" else "previous_cursor"
+            )
+            if cursor is None:
+                return pages
+
+    def test_tied_created_at_pages_by_id(self):
+        def get_page(**cursors):
+            return get_keyset_page(BetSlip.objects.all(), page_size=3, **cursors)
+
+        pages = self.get_pages(get_page, "after")
+        self.assertEqual(
+            [pk for page in pages for pk in page],
+            list(BetSlip.objects.order_by("-id").values_list("id", flat=True)),
+        )
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+
+        # Walking back from the last page gives the same pages
+        last_row = BetSlip.objects.get(pk=pages[-1][0])
+        newer_pages = self.get_pages(get_page, "before", encode_cursor(last_row))
+        self.assertEqual(newer_pages, pages[-2::-1])
+
+    def test_filters_carry_over_to_the_next_pages(self):
+        player = self.players[0]
+        url = f"/bets/?player={player.pk}&page_size=2"
+        listed_ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            rows = response.context["bets_flat"]
+            self.assertTrue(rows)
+            self.assertEqual({row["player_id"] for row in rows}, {player.pk})
+            listed_ids += [row["bet_pk"] for row in rows]
+            url = response.context["next_page_url"]
+            if url:
+                self.assertIn(f"player={player.pk}", url)
+                self.assertIn("page_size=2", url)
+
+        self.assertEqual(
+            listed_ids,
+            list(
+                Straight.objects.filter(player=player)
+                .order_by("-id")
+                .values_list("id", flat=True)
+            ),
+        )
+
+
+class BetRowsTests(TestCase):
+    """Bet rows show each leg's stored outcome as it is"""
+
+    def setUp(self):
+        game = create_game("Denver Broncos", "Kansas City Chiefs", date.today())
+        self.single_bet = SingleBet.objects.create(
+            game=game, single_bet_type="FIRST-TD"
+        )
+        Straight.objects.create(
+            player=Player.objects.create(name="Alice"),
+            bet_amount=Decimal("10.00"),
+            single_bet1=self.single_bet,
+        )
+
+    def get_leg(self):
+        return hydrate_bet_slips(BetSlip.objects.all())[0]["legs"][0]
+
+    def test_invalid_legs_are_shown_invalid(self):
+        leg = self.get_leg()
+        self.assertEqual(
+            (leg["outcome"], leg["outcome_class"]), ("Invalid", "text-grey")
+        )
+
+    def test_unknown_outcomes_are_not_shown_pending(self):
+        SingleBet.objects.filter(pk=self.single_bet.pk).update(outcome="Void")
+        leg = self.get_leg()
+        self.assertEqual((leg["outcome"], leg["outcome_class"]), ("Void", ""))
+
+
+class ImportBetsSettlementTests(TestCase):
+    """Bets imported on finished games are settled on creation"""
+
+    def setUp(self):
+        self.player = Player.objects.create(name="Alice")
+        self.finished_game = create_game(
+            "Cleveland Browns",
+            "Baltimore Ravens",
+            date(2025, 1, 4),
+            score_team_a=10,
+            score_team_b=35,
+            is_finished=True,
+        )
+        self.open_game = create_game(
+            "Cincinnati Bengals", "Pittsburgh Steelers", date(2025, 1, 5)
+        )
+
+    def test_bets_on_finished_games_get_their_payout(self):
+        result = import_bets(
+            [
+                (
+                    1,
+                    {
+                        "player": "Alice",
+                        "bet_type": "Straight",
+                        "bet_amount": "100.00",
+                        "legs": [
+                            {
+                                "game": self.finished_game.pk,
+                                "type": "WINNER",
+                                "team": "Baltimore Ravens",
+                            }
+                        ],
+                    },
+                ),
+                (
+                    2,
+                    {
+                        "player": "Alice",
+                        "bet_type": "Action",
+                        "bet_amount": "50.00",
+                        "legs": [
+                            {
+                                "game": self.finished_game.pk,
+                                "type": "OVER-UNDER",
+                                "over": True,
+                            },
+                            {
+                                "game": self.open_game.pk,
+                                "type": "OVER-UNDER",
+                                "over": True,
+                            },
+                        ],
+                    },
+                ),
+            ]
+        )
+        self.assertEqual(result.errors, [])
+
+        straight = Straight.objects.get()
+        self.assertEqual(straight.payout, straight.payout_for_outcomes(["Win"]))
+        self.assertIsNotNone(straight.payout)
+        self.assertIsNone(Action.objects.get().payout)
+
+        slip = BetSlip.objects.get(bet_type="Straight")
+        self.assertEqual(slip.payout, straight.payout)
+        self.player.refresh_from_db()
+        self.assertEqual(self.player.total_payout, straight.payout)
+        self.assertEqual(self.player.total_betting_money, Decimal("150.00"))
+
+
+class PlaceBetsApiTests(TestCase):
+    """Errors of the JSON bet placement API"""
+
+    def setUp(self):
+        self.user = User.objects.create_user("bookie", password="x")
+        self.client.force_login(self.user)
+
+    def post_bets(self, bets, **headers):
+        return self.client.post(
+            "/api/bets/", json.dumps(bets), content_type="application/json", **headers
+        )
+
+    def test_integrity_error_without_key_is_a_conflict(self):
+        with mock.patch(
+            "my_book.views.import_bets", side_effect=IntegrityError("constraint")
+        ):
+            response = self.post_bets([{"player": "Alice"}])
+        self.assertEqual(response.status_code, 409)
+
+    def test_integrity_error_with_unused_key_is_a_conflict(self):
+        with mock.patch(
+            "my_book.views.import_bets", side_effect=IntegrityError("constraint")
+        ):
+            response = self.post_bets([{"player": "Alice"}], HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertEqual(response.status_code, 409)
+
+    def test_integrity_error_with_stored_key_replays_response(self):
+        body = b'[{"player": "Alice"}]'
+        IdempotencyKey.objects.create(
+            user=self.user,
+            key="k1",
+            request_hash=hashlib.sha256(body).hexdigest(),
+            response_status=201,
+            response_body={"created_count": 1, "bets": []},
+        )
+        # The key row appears between the lookup and the insert of this request
+        with mock.patch(
+            "my_book.views.IdempotencyKey.objects.filter",
+            side_effect=[IdempotencyKey.objects.none(), IdempotencyKey.objects.all()],
+        ), mock.patch(
+            "my_book.views.import_bets", side_effect=IntegrityError("duplicate key")
+        ):
+            response = self.client.post(
+                "/api/bets/",
+                body,
+                content_type="application/json",
+                HTTP_IDEMPOTENCY_KEY="k1",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response["Idempotent-Replayed"], "true")
+
+    def test_locked_database_is_retryable(self):
+        with mock.patch(
+            "my_book.views.import_bets",
+            side_effect=OperationalError("database is locked"),
+        ):
+            response = self.post_bets([{"player": "Alice"}])
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+
+
+class WriteTransactionTests(TransactionTestCase):
+    """Only the bet placement paths open their SQLite transactions IMMEDIATE"""
+
+    def get_begins(self, atomic, player_name):
+        with CaptureQueriesContext(connection) as queries:
+            with atomic():
+                Player.objects.create(name=player_name)
+        return [query["sql"] for query in queries if query["sql"].startswith("BEGIN")]
+
+    def test_write_transaction_begins_immediate(self):
+        self.assertEqual(
+            self.get_begins(write_transaction, "Alice"), ["BEGIN IMMEDIATE"]
+        )
+        # The other transactions keep the configured default
+        self.assertEqual(self.get_begins(transaction.atomic, "Bob"), ["BEGIN"])
+
+    def test_placement_api_begins_immediate(self):
+        self.client.force_login(User.objects.create_user("bookie", password="x"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/bets/",
+                json.dumps({"player": "Alice"}),
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("BEGIN IMMEDIATE", [query["sql"] for query in queries])
+
+
+class PollScoresIntervalTests(TestCase):
+    """Intervals and error handling of the poll_scores command"""
+
+    options = {
+        "live_interval": 30.0,
+        "idle_interval": 300.0,
+        "max_interval": 3600.0,
+        "days_ahead": 1,
+        "concurrency": 1,
+        "cycles": 2,
+    }
+
+    def get_games_data(self, *games):
+        """Build an API response from (status, kickoff timestamp) pairs"""
+        return {
+            "response": [
+                {"game": {"status": {"long": status}, "date": {"timestamp": kickoff}}}
+                for status, kickoff in games
+            ]
+        }
+
+    def get_next_interval(self, games_data):
+        group = PollGroup("NFL", date(2025, 1, 4), self.options["live_interval"])
+        return PollScoresCommand()._get_next_interval(group, games_data, self.options)
+
+    def test_live_games_poll_at_live_rate(self):
+        games_data = self.get_games_data(("Finished", None), ("Quarter 2", None))
+        self.assertEqual(self.get_next_interval(games_data), 30.0)
+
+    def test_wakes_up_for_next_kickoff(self):
+        games_data = self.get_games_data(("Not Started", time.time() + 120))
+        self.assertAlmostEqual(self.get_next_interval(games_data), 120, delta=2)
+
+    def test_past_and_postponed_kickoffs_back_off(self):
+        games_data = self.get_games_data(
+            ("Not Started", time.time() - 3600),
+            ("Postponed", time.time() + 60),
+            ("Canceled", time.time() - 60),
+        )
+        self.assertEqual(self.get_next_interval(games_data), 300.0)
+
+    def test_failed_cycle_does_not_stop_the_command(self):
+        command = PollScoresCommand(stdout=StringIO(), stderr=StringIO())
+        with mock.patch.object(
+            command, "_run_cycle", side_effect=[OperationalError("locked"), None]
+        ) as run_cycle, mock.patch("time.sleep"):
+            command.handle(**self.options)
+
+        self.assertEqual(run_cycle.call_count, 2)
+        self.assertIn("polling failed", command.stderr.getvalue())
+
+
+class GameUpsertTests(TestCase):
+    """upsert_games() must tell the games it creates from the ones it updates"""
+
+    def get_game_data(self, team_a, team_b, **fields):
+        return {
+            "game_date": date(2025, 1, 4),
+            "team_a": team_a,
+            "team_b": team_b,
+            "league": "NFL",
+            "fav": team_a,
+            "fav_spread": 3,
+            "over_under_points": 40,
+            **fields,
+        }
+
+    def test_game_created_concurrently_is_updated_and_resettled(self):
+        games_data = [
+            self.get_game_data(
+                "Cleveland Browns",
+                "Baltimore Ravens",
+                score_team_a=10,
+                score_team_b=35,
+                is_finished=True,
+            ),
+            self.get_game_data("Buffalo Bills", "Miami Dolphins"),
+        ]
+        concurrent_games = []
+
+        @contextmanager
+        def write_transaction_after_concurrent_insert():
+            # The Browns game is created by someone else after the first lookup
+            concurrent_games.append(
+                create_game("Cleveland Browns", "Baltimore Ravens", date(2025, 1, 4))
+            )
+            with write_transaction():
+                yield
+
+        with mock.patch(
+            "my_book.game_upsert.write_transaction",
+            write_transaction_after_concurrent_insert,
+        ):
+            result = upsert_games(games_data)
+
+        concurrent_game = Game.objects.get(pk=concurrent_games[0].pk)
+        self.assertEqual(
+            [game.team_a for game in result.created_games], ["Buffalo Bills"]
+        )
+        self.assertEqual(result.updated_games, [concurrent_game])
+        self.assertEqual(result.settle_game_ids, [concurrent_game.pk])
+        self.assertTrue(concurrent_game.is_finished)
+        self.assertEqual(concurrent_game.score_team_b, 35)
+        self.assertEqual(Game.objects.count(), 2)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class GameSearchReplayTests(TestCase):
+    """game_search_view run offline, against fixtures built from the database"""
+
+    def setUp(self):
+        caches["sports_api"].clear()
+        self.fixture_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.fixture_dir)
+        self.game_date = date(2025, 1, 4)
+        create_game(
+            "Cleveland Browns",
+            "Baltimore Ravens",
+            self.game_date,
+            score_team_a=10,
+            score_team_b=35,
+            is_finished=True,
+        )
+        create_game("Cincinnati Bengals", "Pittsburgh Steelers", self.game_date)
+        self.client.force_login(User.objects.create_user("bookie", password="x"))
+
+    def test_search_replays_fixtures_from_db(self):
+        call_command(
+            "record_api_fixtures",
+            "--from-db",
+            "--fixture-dir",
+            self.fixture_dir,
+            stdout=StringIO(),
+        )
+        with self.settings(API_FIXTURE_MODE="replay", API_FIXTURE_DIR=self.fixture_dir):
+            response = self.client.post(
+                "/games/search/", {"league": "NFL", "date": "2025-01-04"}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        games = {game["team_a"]: game for game in response.context["games"]}
+        self.assertEqual(set(games), {"Cleveland Browns", "Cincinnati Bengals"})
+        self.assertEqual(games["Cleveland Browns"]["status"], "Finished")
+        self.assertEqual(games["Cleveland Browns"]["score_team_b"], 35)
+        self.assertIsNone(games["Cincinnati Bengals"]["stage"])
+        self.assertTrue(all(game["is_added"] for game in games.values()))
+
+    def test_search_without_fixture_shows_error(self):
+        with self.settings(API_FIXTURE_MODE="replay", API_FIXTURE_DIR=self.fixture_dir):
+            response = self.client.post(
+                "/games/search/", {"league": "NFL", "date": "2025-01-04"}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "sports API is unavailable")
@@ -18,6 +18,12 @@ from .views import (
     delete_bet,
     CalculatePayoutView,
     insights_page,
+    simulation_view,
+    simulation_api_view,
+    game_picker_api_view,
+    export_bets_view,
+    import_bets_view,
+    place_bets_api_view,
 )
 
 from django.contrib.auth import views as auth_views
@@ -48,14 +54,23 @@ urlpatterns = [
     path(
         "games/get-game-results/", get_game_results_view, name="get-game-results"
     ),  # get results for unfinished games in database
+    path(
+        "api/games/", game_picker_api_view, name="game-picker-api"
+    ),  # bettable games for the bet form
     path("games/<int:pk>/", GameDetailView.as_view(), name="game-detail"),
     path("games/<int:pk>/edit/", GameUpdateView.as_view(), name="game-edit"),
     path("games/<int:pk>/delete/", GameDeleteView.as_view(), name="game-delete"),
     # Bet URLs
     path("bets/", BetListView.as_view(), name="bet-list"),
+    path("bets/export/", export_bets_view, name="bet-export"),
+    path("bets/import/", import_bets_view, name="bet-import"),
+    path("api/bets/", place_bets_api_view, name="bet-place-api"),
     path("bet/<str:bet_type>/<int:bet_id>/delete/", delete_bet, name="bet-delete"),
     # Calculate Payout
     path("calculate-payout/", CalculatePayoutView.as_view(), name="calculate-payout"),
+    # What-if simulator
+    path("simulation/", simulation_view, name="simulation"),
+    path("api/simulation/", simulation_api_view, name="simulation-api"),
     # Insights page
     path("insights/", insights_page, name="insights"),
     # authentication URLs
@@ -1,23 +1,22 @@
 import plotly.graph_objs as go
 import plotly.offline as opy
-from django.db.models import Sum
-from .models import Straight, Action, Parlay3, Parlay4
+from django.db.models import Count, Sum
+from .models import BetSlip
+
+BET_TYPES = ["Straight", "Action", "Parlay3", "Parlay4"]
 
 
 def generate_bet_type_comparison_graph():
     """
     This pie chart compares the number of each bet type
     """
-    # Query the number of bets for each type
-    straight_count = Straight.objects.count()
-    action_count = Action.objects.count()
-    parlay3_count = Parlay3.objects.count()
-    parlay4_count = Parlay4.objects.count()
-    total_count = straight_count + action_count + parlay3_count + parlay4_count
+    # Query the number of bets for each type in one grouped query
+    counts = dict(BetSlip.objects.values_list("bet_type").annotate(count=Count("id")))
+    total_count = sum(counts.values())
 
     # Prepare data for the pie chart
-    labels = ["Straight", "Action", "Parlay3", "Parlay4"]
-    values = [straight_count, action_count, parlay3_count, parlay4_count]
+    labels = BET_TYPES
+    values = [counts.get(bet_type, 0) for bet_type in BET_TYPES]
 
     # Create the pie chart
     fig = go.Figure(
@@ -51,29 +50,24 @@ def generate_money_payout_comparison_graph():
     this produces a bar graph showing the comparison between
     bet_amount and payout for each bet type
     """
-    # Bet data grouped by type
-    bet_data = {
-        "Straight": Straight.objects.aggregate(
-            total_amount=Sum("bet_amount"), total_payout=Sum("payout")
-        ),
-        "Action": Action.objects.aggregate(
-            total_amount=Sum("bet_amount"), total_payout=Sum("payout")
-        ),
-        "Parlay3": Parlay3.objects.aggregate(
+    # Bet data grouped by type in one grouped query
+    totals = {
+        row["bet_type"]: row
+        for row in BetSlip.objects.values("bet_type").annotate(
             total_amount=Sum("bet_amount"), total_payout=Sum("payout")
-        ),
-        "Parlay4": Parlay4.objects.aggregate(
-            total_amount=Sum("bet_amount"), total_payout=Sum("payout")
-        ),
+        )
     }
+    bet_data = {bet_type: totals.get(bet_type, {}) for bet_type in BET_TYPES}
 
-    total_bet_amount = sum([data["total_amount"] or 0 for data in bet_data.values()])
-    total_payout = sum([data["total_payout"] or 0 for data in bet_data.values()])
+    total_bet_amount = sum(
+        [data.get("total_amount") or 0 for data in bet_data.values()]
+    )
+    total_payout = sum([data.get("total_payout") or 0 for data in bet_data.values()])
 
     # Prepare data for the bar chart
     bet_types = list(bet_data.keys())
-    bet_amounts = [data["total_amount"] or 0 for data in bet_data.values()]
-    payouts = [data["total_payout"] or 0 for data in bet_data.values()]
+    bet_amounts = [data.get("total_amount") or 0 for data in bet_data.values()]
+    payouts = [data.get("total_payout") or 0 for data in bet_data.values()]
 
     # Add "All Bet Types" data
     bet_types.append("All Bet Types")
@@ -10,8 +10,8 @@ from django.views.generic import (
     TemplateView,
 )
 from django.views import View
-from django.db.models import Q
-from .models import Player, Game, Bet, SingleBet
+from django.db.models import Count, Q
+from .models import Player, Game, Bet, BetSlip, IdempotencyKey
 from .models import Straight, Action, Parlay3, Parlay4
 from .forms import (
     BetTypeForm,
@@ -19,20 +19,53 @@ from .forms import (
     GameForm,
     GameSearchForm,
     PlayerForm,
-    BetTypeFilterForm,
+    BetFilterForm,
 )
 from django.core.serializers.json import DjangoJSONEncoder
-from django.utils.safestring import mark_safe
+import hashlib
 import json
-from itertools import chain
-from operator import attrgetter
+import logging
 from .utils import *
 from .fetch_data import *
-from datetime import datetime
+from .api_client import get_api_client
+from .fetch_data import single_flight
+from .game_upsert import (
+    get_live_game_changes,
+    get_live_game_values,
+    get_live_games_lookup,
+    update_games,
+    upsert_games,
+)
+from . import api_cache
+from .settlement import settle_bets, settle_bets_for_games, GAME_OUTCOME_FIELDS
+from .simulation import BookSimulator, MAX_SWEEP_SCENARIOS
+from .pagination import get_keyset_page, get_page_size
+from .bet_rows import hydrate_bet_slips
+from .bet_slips import filter_bet_slips
+from .exports import EXPORT_FORMATS, iter_export
+from .bet_import import (
+    IMPORT_FORMATS,
+    ImportFormatError,
+    import_bets,
+    parse_import,
+    write_transaction,
+)
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.paginator import Paginator
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
+from django.db import IntegrityError, OperationalError
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 
+logger = logging.getLogger(__name__)
+
 
 class HomeView(TemplateView):
     """
@@ -56,22 +89,27 @@ class PlayerListView(LoginRequiredMixin, ListView):
     def get_login_url(self) -> str:
         return reverse("login")
 
+    def get_queryset(self):
+        # Totals are maintained incrementally, the bet counts come from the same query
+        return Player.objects.annotate(
+            straight_bet_count=Count(
+                "bet_slips", filter=Q(bet_slips__bet_type="Straight")
+            ),
+            action_bet_count=Count("bet_slips", filter=Q(bet_slips__bet_type="Action")),
+            parlay3_bet_count=Count(
+                "bet_slips", filter=Q(bet_slips__bet_type="Parlay3")
+            ),
+            parlay4_bet_count=Count(
+                "bet_slips", filter=Q(bet_slips__bet_type="Parlay4")
+            ),
+        ).order_by("id")
+
     def get_context_data(self, **kwargs):
         # Add the form to the context
         context = super().get_context_data(**kwargs)
         if "player_form" not in context:
             context["player_form"] = PlayerForm()
 
-        # Fetch all players with their calculated fields
-        players = Player.objects.all()
-
-        # update all calculated money
-        for player in players:
-            player.calculate_total_betting_money()
-            player.calculate_total_payout()
-
-        context["players"] = players
-
         return context
 
     def post(self, request, *args, **kwargs):
@@ -118,48 +156,13 @@ class PlayerDetailView(LoginRequiredMixin, DetailView):
         return context
 
     def _get_player_bets_flat(self):
-        # Retrieve the current player instance
-        player = self.object
-
-        bet_querysets = {
-            "Straight": Straight.objects.filter(player=player),
-            "Action": Action.objects.filter(player=player),
-            "Parlay3": Parlay3.objects.filter(player=player),
-            "Parlay4": Parlay4.objects.filter(player=player),
-        }
-
-        # Flatten bets into a single list
-        bets_flat = []
-        index = 1
-        for bet_type, bet_list in bet_querysets.items():
-            for bet in bet_list:
-                # Extract single bets dynamically
-                single_bets = []
-                for i in range(1, 5):  # Up to 4 single bets
-                    single_bet_attr = f"single_bet{i}"
-                    if hasattr(bet, single_bet_attr):
-                        single_bet = getattr(bet, single_bet_attr, None)
-                        single_bets.append(single_bet)
-                    else:
-                        single_bets.append(None)  # Append None for missing single bets
-
-                # Add bet details
-                bets_flat.append(
-                    {
-                        "index": index,
-                        "bet_pk": bet.pk,
-                        "player_name": bet.player.name,
-                        "bet_type": bet_type,
-                        "amount": bet.bet_amount,
-                        "payout": bet.payout,
-                        "single_bet1": single_bets[0] if len(single_bets) > 0 else None,
-                        "single_bet2": single_bets[1] if len(single_bets) > 1 else None,
-                        "single_bet3": single_bets[2] if len(single_bets) > 2 else None,
-                        "single_bet4": single_bets[3] if len(single_bets) > 3 else None,
-                    }
-                )
-                index += 1
-        return bets_flat
+        # Retrieve the current player's bets of every type from the BetSlip mirror
+        bet_slips = (
+            BetSlip.objects.filter(player=self.object)
+            .select_related("player")
+            .order_by("-created_at", "-id")
+        )
+        return hydrate_bet_slips(bet_slips)
 
 
 class PlayerDeleteView(LoginRequiredMixin, DeleteView):
@@ -337,11 +340,19 @@ def game_search_view(request):
 
             # NOTE: in the API,game['status']['long'] for finished game is Finished or "Final/OT"
 
-            raw_games_response = raw_games_data.get("response", [])
+            # None when the call failed, or was refused by the scheduler
+            raw_games_response = (
+                raw_games_data.get("response") if raw_games_data is not None else None
+            )
 
             if raw_games_response is None:
                 print(f"views.game_search_view(): Failed to fetch games data.")
-                return None
+                messages.error(
+                    request,
+                    f"The sports API is unavailable, could not fetch {league} games "
+                    f"for {date}. Try again later.",
+                )
+                return render(request, "games/game_search.html", {"form": form})
 
             # Preprocess games into a clean format
             games = []
@@ -441,9 +452,7 @@ def __update_game_in_db(games_data, db_games_queryset):
         for game in games_data
     }
 
-    updated_count = 0
-
-    # Iterate through unfinished games and update them
+    game_changes = []
     for db_game in unfinished_games_qs:
         # Check if the game exists in the live data (accounting for team order)
         game_key = (db_game.team_a, db_game.team_b, db_game.game_date)
@@ -454,42 +463,24 @@ def __update_game_in_db(games_data, db_games_queryset):
         )
 
         if live_game_data:
-            fields_to_update = []
-            update_total = False
-
-            if live_game_data.get("score_team_a") not in ["None", None]:
-                db_game.score_team_a = float(live_game_data["score_team_a"])
-                fields_to_update.append("score_team_a")
-                update_total = True
-
-            if live_game_data.get("score_team_b") not in ["None", None]:
-                db_game.score_team_b = float(live_game_data["score_team_b"])
-                fields_to_update.append("score_team_b")
-                update_total = True
-
-            if update_total:
-                db_game.total_points = db_game.score_team_a + db_game.score_team_b
-                fields_to_update.append("total_points")
-
-            if live_game_data.get("team_a_logo_url") not in ["None", None]:
-                db_game.team_a_logo_url = live_game_data["team_a_logo_url"]
-                fields_to_update.append("team_a_logo_url")
-
-            if live_game_data.get("team_b_logo_url") not in ["None", None]:
-                db_game.team_b_logo_url = live_game_data["team_b_logo_url"]
-                fields_to_update.append("team_b_logo_url")
-
-            if live_game_data.get("status") in ["Finished", "Final/OT"]:
-                db_game.is_finished = True
-                fields_to_update.append("is_finished")
-
-            # Save the game only if there are fields to update
-            if fields_to_update:
-                db_game.save(update_fields=fields_to_update)
-                updated_count += 1
-
-    print(
-        f"views.__update_game_in_db():Updated {updated_count} unfinished games in the database."
+            game_changes.append((db_game, get_live_game_values(live_game_data)))
+
+    # Save the changed games only, in one batch
+    upsert_result = update_games(game_changes)
+    updated_count = len(upsert_result.updated_games)
+    logger.debug(
+        "__update_game_in_db(): updated %d unfinished games in the database "
+        "(%d unchanged)",
+        updated_count,
+        upsert_result.unchanged_count,
+    )
+
+    # Re-settle only the bets placed on the updated games
+    result = settle_bets_for_games(upsert_result.settle_game_ids)
+    logger.debug(
+        "__update_game_in_db(): re-settled %d bets in %.3fs",
+        result.total_count,
+        result.elapsed_seconds,
     )
     return updated_count
 
@@ -563,16 +554,16 @@ def add_reviewed_games_to_db_view(request):
 
             print("in ADD, games_data=", games_data)
 
-            # Validate and save each game entry
-            saved_games = []
+            # Validate each game entry, then save them all in one batch
             default_logo = "https://as2.ftcdn.net/v2/jpg/05/97/47/95/1000_F_597479556_7bbQ7t4Z8k3xbAloHFHVdZIizWK1PdOo.jpghttps://as2.ftcdn.net/v2/jpg/05/97/47/95/1000_F_597479556_7bbQ7t4Z8k3xbAloHFHVdZIizWK1PdOo.jpg"
+            reviewed_games = []
             for game_data in games_data:
-                game, created = Game.objects.update_or_create(
-                    game_date=game_data.get("game_date"),
-                    team_a=game_data.get("team_a"),
-                    team_b=game_data.get("team_b"),
-                    # if game is found, the fields in defaults are updated with the new values
-                    defaults={
+                reviewed_games.append(
+                    {
+                        "game_date": game_data.get("game_date"),
+                        "team_a": game_data.get("team_a"),
+                        "team_b": game_data.get("team_b"),
+                        # if game is found, these fields are updated with the new values
                         "league": game_data.get("league"),
                         "is_finished": (
                             True
@@ -602,24 +593,34 @@ def add_reviewed_games_to_db_view(request):
                             if game_data.get("score_team_b") not in ["None", None]
                             else 0.0
                         ),
-                    },
+                    }
                 )
-                if created:
-                    saved_games.append(
-                        {
-                            "game_date": game.game_date,
-                            "team_a": game.team_a,
-                            "team_b": game.team_b,
-                            "score_team_a": game.score_team_a,
-                            "score_team_b": game.score_team_b,
-                            "team_a_logo_url": game.team_a_logo_url,
-                            "team_b_logo_url": game.team_b_logo_url,
-                            "fav": game.fav,
-                            "fav_spread": game.fav_spread,
-                            "over_under_points": game.over_under_points,
-                            "created": created,
-                        }
-                    )
+
+            upsert_result = upsert_games(reviewed_games)
+            print(
+                f"views.add_reviewed_games_to_db_view(): {len(upsert_result.created_games)} created, "
+                f"{len(upsert_result.updated_games)} updated, "
+                f"{upsert_result.unchanged_count} unchanged in {upsert_result.elapsed_seconds:.3f}s"
+            )
+            # Re-settle the bets of the existing games whose result changed
+            settle_bets_for_games(upsert_result.settle_game_ids)
+
+            saved_games = [
+                {
+                    "game_date": game.game_date,
+                    "team_a": game.team_a,
+                    "team_b": game.team_b,
+                    "score_team_a": game.score_team_a,
+                    "score_team_b": game.score_team_b,
+                    "team_a_logo_url": game.team_a_logo_url,
+                    "team_b_logo_url": game.team_b_logo_url,
+                    "fav": game.fav,
+                    "fav_spread": game.fav_spread,
+                    "over_under_points": game.over_under_points,
+                    "created": True,
+                }
+                for game in upsert_result.created_games
+            ]
 
             return render(
                 request,
@@ -645,84 +646,46 @@ def get_game_results_view(request):
         messages.error(request, "Invalid league specified.")
         return redirect("game-list")
 
-    unfinished_games_qs = Game.objects.filter(is_finished=False)
+    unfinished_games = list(Game.objects.filter(is_finished=False))
+    unfinished_game_dates = sorted({game.game_date for game in unfinished_games})
 
-    unfinished_game_dates = unfinished_games_qs.values_list(
-        "game_date", flat=True
-    ).distinct()
+    # Fetch every date concurrently, the total wait is about the slowest fetch
+    games_data_by_date = fetch_games_by_dates(league, unfinished_game_dates)
 
-    # Fetch and update games
-    updated_count = 0
+    game_changes = []
+    failed_dates = []
     for game_date in unfinished_game_dates:
-        raw_games_data = fetch_games_by_date(league, game_date)
+        raw_games_data = games_data_by_date.get(game_date)
+        if raw_games_data is None:
+            failed_dates.append(str(game_date))
+            continue
         raw_games_response = raw_games_data.get("response", [])
 
         if not raw_games_response:
             continue
 
-        # Preprocess games into a clean format
-        games_lookup = {}
-        for raw_game in raw_games_response:
-            game_key = (
-                raw_game["teams"]["away"]["name"],
-                raw_game["teams"]["home"]["name"],
-                raw_game["game"]["date"]["date"],
-            )
-            games_lookup[game_key] = {
-                "team_a": raw_game["teams"]["away"]["name"],
-                "team_b": raw_game["teams"]["home"]["name"],
-                "score_team_a": raw_game["scores"]["away"]["total"],
-                "score_team_b": raw_game["scores"]["home"]["total"],
-                "team_a_logo_url": raw_game["teams"]["away"]["logo"],
-                "team_b_logo_url": raw_game["teams"]["home"]["logo"],
-                "status": raw_game["game"]["status"]["long"],
-            }
-
-        # Update unfinished games in the database
-        for db_game in unfinished_games_qs.filter(game_date=game_date):
-
-            game_key = (db_game.team_a, db_game.team_b, str(db_game.game_date))
-            reverse_game_key = (db_game.team_b, db_game.team_a, str(db_game.game_date))
-
-            live_game_data = games_lookup.get(game_key) or games_lookup.get(
-                reverse_game_key
-            )
-
-            if live_game_data:
-                fields_to_update = []
-                update_total = False
-
-                if live_game_data.get("status") in ["Finished", "Final/OT"]:
-                    db_game.is_finished = True
-                    fields_to_update.append("is_finished")
-                    update_total = True
-
-                if live_game_data.get("score_team_a") not in ["None", None]:
-                    db_game.score_team_a = float(live_game_data["score_team_a"])
-                    fields_to_update.append("score_team_a")
-                    update_total = True
-
-                if live_game_data.get("score_team_b") not in ["None", None]:
-                    db_game.score_team_b = float(live_game_data["score_team_b"])
-                    fields_to_update.append("score_team_b")
-                    update_total = True
-
-                if update_total:
-                    db_game.total_points = db_game.score_team_a + db_game.score_team_b
-                    fields_to_update.append("total_points")
-
-                if live_game_data.get("team_a_logo_url") not in ["None", None]:
-                    db_game.team_a_logo_url = live_game_data["team_a_logo_url"]
-                    fields_to_update.append("team_a_logo_url")
+        # Update unfinished games of that date
+        games_lookup = get_live_games_lookup(raw_games_response)
+        game_changes += get_live_game_changes(
+            [game for game in unfinished_games if game.game_date == game_date],
+            games_lookup,
+        )
 
-                if live_game_data.get("team_b_logo_url") not in ["None", None]:
-                    db_game.team_b_logo_url = live_game_data["team_b_logo_url"]
-                    fields_to_update.append("team_b_logo_url")
+    # Save the changed games only, in one batch
+    upsert_result = update_games(game_changes)
+    updated_count = len(upsert_result.updated_games)
+
+    logger.debug(
+        "get_game_results_view(): sports API %s, cache %s, coalescing %s, "
+        "scheduler %s",
+        get_api_client().metrics,
+        api_cache.metrics,
+        single_flight.metrics,
+        get_api_client().scheduler.metrics,
+    )
 
-                # Save the game only if there are fields to update
-                if fields_to_update:
-                    db_game.save(update_fields=fields_to_update)
-                    updated_count += 1
+    # Re-settle only the bets placed on the updated games
+    settle_bets_for_games(upsert_result.settle_game_ids)
 
     if updated_count:
         messages.success(
@@ -730,6 +693,12 @@ def get_game_results_view(request):
         )
     else:
         messages.info(request, f"No games to update for {league}.")
+    if failed_dates:
+        messages.warning(
+            request,
+            f"Could not fetch {league} games for {', '.join(failed_dates)}, "
+            "try again later.",
+        )
 
     return redirect("game-list")
 
@@ -777,6 +746,15 @@ class GameUpdateView(LoginRequiredMixin, UpdateView):
     def get_login_url(self) -> str:
         return reverse("login")
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+
+        # Re-settle the bets on this game if its result may have changed
+        if set(form.changed_data) & set(GAME_OUTCOME_FIELDS):
+            settle_bets_for_games([self.object.pk])
+
+        return response
+
 
 class GameDeleteView(LoginRequiredMixin, DeleteView):
     model = Game
@@ -801,31 +779,21 @@ class BetListView(LoginRequiredMixin, ListView):
         We define a get_queryset() for ListView
         However, in the template, we display bets from the bets_flat list made by _get_flat_bet_list
         """
-        # Fetch all bets from different models
-        straight_bets = Straight.objects.all()
-        action_bets = Action.objects.all()
-        parlay3_bets = Parlay3.objects.all()
-        parlay4_bets = Parlay4.objects.all()
-
-        # Combine all the querysets into one list
-        all_bets = list(chain(straight_bets, action_bets, parlay3_bets, parlay4_bets))
-
-        # Order the combined list by the 'created_at' field
-        all_bets.sort(key=attrgetter("created_at"), reverse=True)
-
-        return all_bets
+        # All bet types are listed from the BetSlip mirror, newest first
+        return BetSlip.objects.select_related("player").order_by("-created_at", "-id")
 
     def get_context_data(
         self,
         bet_type_form=None,
         single_bet_forms=None,
-        bet_type_filter_form=None,
+        bet_filter_form=None,
         **kwargs,
     ):
         """
         Pass in extra data to use in the templates:
         - bet_type_form = BetTypeForm() is used to create a new bet in that type
-        - bet_type_filter_form = BetTypeFilterForm() is used to filter the displaying results by bet type
+        - bet_filter_form = BetFilterForm() is used to filter the displaying results by
+        bet type, player, date range, status, league and game
         """
         context = super().get_context_data(**kwargs)
 
@@ -835,31 +803,20 @@ class BetListView(LoginRequiredMixin, ListView):
         if single_bet_forms is None:
             single_bet_forms = self.SingleBetFormSet()
 
-        # create the filter form instance
-        if bet_type_filter_form is None:
-            bet_type_filter_form = BetTypeFilterForm()
-
-        # Fetch all available games
-        games = Game.objects.all().values(
-            "id",
-            "team_a",
-            "team_b",
-            "name",
-            "game_date",
-            "fav_spread",
-            "over_under_points",
-        )
+        # create the filter form instance, bound to the current filters
+        if bet_filter_form is None:
+            bet_filter_form = BetFilterForm(self.request.GET or None)
 
         # Flatten the bet objects into a list with global index
-        bet_type_filter = self.request.GET.get("bet_type_filter")
-        bets_flat = self._get_flat_bet_list(bet_type_filter)
+        bets_flat, bet_page = self._get_flat_bet_list(bet_filter_form.get_filters())
 
         context["bet_type_form"] = bet_type_form
         context["single_bet_forms"] = single_bet_forms
-        context["bet_type_filter_form"] = bet_type_filter_form
+        context["bet_filter_form"] = bet_filter_form
         context["bets_flat"] = bets_flat
-        context["games_json"] = mark_safe(
-            json.dumps(list(games), cls=DjangoJSONEncoder)
+        context["next_page_url"] = self._get_page_url("after", bet_page.next_cursor)
+        context["previous_page_url"] = self._get_page_url(
+            "before", bet_page.previous_cursor
         )
 
         return context
@@ -899,124 +856,30 @@ class BetListView(LoginRequiredMixin, ListView):
         # Extract the necessary data from request.POST
         post_data = request.POST
 
-        # Extract bet type and create the appropriate form
-        player_id = post_data["player"]
-        bet_type = post_data["bet_type"]
-        bet_amount = post_data["bet_amount"]
-
-        # get the player instance
-        try:
-            player = Player.objects.get(id=player_id)
-        except Player.DoesNotExist:
-            print("User with the specified name does not exist.")
-
-        single_bets = []
-
-        # Iterate through the total forms to create SingleBet instances
-        for i in range(len(single_bet_forms)):
-            try:
-                # Dynamically construct field names
-                game_id = post_data.get(f"single_bet_{i}_game")
-                single_bet_type = post_data.get(f"single_bet_{i}_single_bet_type")
-                selected_team = post_data.get(f"single_bet_{i}_selected_team")
-                is_over = (
-                    post_data.get(f"single_bet_{i}_is_over") == "on"
-                )  # Convert checkbox to boolean
-
-                # Ensure the Game instance exists
-                game = Game.objects.get(id=game_id)
-
-                # Create the SingleBet instance
-                single_bet = SingleBet(
-                    game=game,
-                    single_bet_type=single_bet_type,
-                    selected_team=selected_team,
-                    is_over=(
-                        is_over if single_bet_type == "OVER-UNDER" else None
-                    ),  # Apply only if relevant
-                )
-
-                # save the single bet instance so that we can use to create the other bet type
-                single_bet.save()
-
-                single_bets.append(single_bet)
-
-            except Game.DoesNotExist:
-                print(
-                    f"Game with ID {game_id} does not exist. Skipping this SingleBet."
-                )
-            except Exception as e:
-                print(f"Error creating SingleBet for form {i}: {e}")
-
-        # Now that we have enough information, we can create the bet object
-        bet = self.create_bet(bet_type, player, bet_amount, single_bets)
+        # The bet and its single bets are validated together and created atomically,
+        # by the same service as the bulk import and the JSON API
+        row = {
+            "player_id": post_data["player"],
+            "bet_type": post_data["bet_type"],
+            "bet_amount": post_data["bet_amount"],
+            "legs": [
+                {
+                    "game": post_data.get(f"single_bet_{i}_game"),
+                    "type": post_data.get(f"single_bet_{i}_single_bet_type"),
+                    "team": post_data.get(f"single_bet_{i}_selected_team"),
+                    "over": post_data.get(f"single_bet_{i}_is_over") == "on",
+                }
+                for i in range(len(single_bet_forms))
+            ],
+        }
+        result = import_bets([(1, row)])
+        for _, error in result.errors:
+            print(f"BetListView.post(): Error creating {row['bet_type']} bet: {error}")
+            messages.error(request, f"The bet was not created: {error}")
 
         # Redirect to refresh the page
         return redirect(reverse("bet-list"))
 
-    def create_bet(self, bet_type, player, bet_amount, single_bets):
-        """
-        Create a bet instance based on the bet_type and a list of SingleBet instances.
-
-        input:
-            bet_type (str): The type of bet (e.g., "Straight", "Action", "Parlay3", "Parlay4").
-            player (Player): The player placing the bet.
-            bet_amount (Decimal): The amount of the bet.
-            single_bets (list): A list of SingleBet instances.
-
-        Returns:
-            Bet instance: The created bet instance.
-        """
-        try:
-            if bet_type == "Straight" and len(single_bets) == 1:
-                bet = Straight(
-                    player=player,
-                    bet_amount=bet_amount,
-                    single_bet1=single_bets[0],
-                )
-
-            elif bet_type == "Action" and len(single_bets) == 2:
-                bet = Action(
-                    player=player,
-                    bet_amount=bet_amount,
-                    single_bet1=single_bets[0],
-                    single_bet2=single_bets[1],
-                )
-
-            elif bet_type == "Parlay3" and len(single_bets) == 3:
-                bet = Parlay3(
-                    player=player,
-                    bet_amount=bet_amount,
-                    single_bet1=single_bets[0],
-                    single_bet2=single_bets[1],
-                    single_bet3=single_bets[2],
-                )
-
-            elif bet_type == "Parlay4" and len(single_bets) == 4:
-                bet = Parlay4(
-                    player=player,
-                    bet_amount=bet_amount,
-                    single_bet1=single_bets[0],
-                    single_bet2=single_bets[1],
-                    single_bet3=single_bets[2],
-                    single_bet4=single_bets[3],
-                )
-
-            else:
-                raise ValueError(
-                    f"Invalid bet type or mismatched SingleBet count for {bet_type}."
-                )
-
-            # Validate and save the bet instance
-            bet.full_clean()  # Run model validation
-            bet.save()
-            # print(f"BetListView.create_bet(): Created {bet_type} bet: {bet}")
-            return bet
-
-        except Exception as e:
-            print(f"BetListView.create_bet(): Error creating {bet_type} bet: {e}")
-            return None
-
     def _re_render_with_context(self, request, bet_type_form, single_bet_forms):
         """
         re-render the page with updated context
@@ -1026,62 +889,36 @@ class BetListView(LoginRequiredMixin, ListView):
         )
         return render(self.request, self.template_name, context)
 
-    def _get_flat_bet_list(self, bet_type_filter=None):
+    def _get_flat_bet_list(self, filters=None):
         """
-        Flatten the bet list for context.
+        Flatten one keyset page of the bet list for context.
+        The page is selected by the "after"/"before" cursors and the "page_size"
+        of the query string.
         Args:
-            bet_type_filter (str): Filter to display specific bet type or None for all types.
+            filters (dict): keyword arguments of filter_bet_slips(), or None for all bets.
         Returns:
-            List[dict]: Flattened list of bets with details.
+            (List[dict], KeysetPage): Flattened bets of the page with details, and the page.
         """
-        bet_querysets = {
-            "Straight": Straight.objects.all(),
-            "Action": Action.objects.all(),
-            "Parlay3": Parlay3.objects.all(),
-            "Parlay4": Parlay4.objects.all(),
-        }
-
-        # Filter querysets if bet_type_filter is provided
-        if bet_type_filter is not None and bet_type_filter != "":
-            bet_querysets = {
-                bet_type: queryset
-                for bet_type, queryset in bet_querysets.items()
-                if bet_type == bet_type_filter
-            }
+        # Every filter is applied in SQL
+        bet_slips = filter_bet_slips(self.get_queryset(), **(filters or {}))
+
+        page = get_keyset_page(
+            bet_slips,
+            after=self.request.GET.get("after"),
+            before=self.request.GET.get("before"),
+            page_size=get_page_size(self.request.GET.get("page_size")),
+        )
+        return hydrate_bet_slips(page.rows), page
 
-        # Flatten bets into a single list
-        bets_flat = []
-        index = 1
-        for bet_type, bet_list in bet_querysets.items():
-            for bet in bet_list:
-                # Extract single bets dynamically
-                single_bets = []
-                for i in range(1, 5):  # Up to 4 single bets
-                    single_bet_attr = f"single_bet{i}"
-                    if hasattr(bet, single_bet_attr):
-                        single_bet = getattr(bet, single_bet_attr, None)
-                        single_bets.append(single_bet)
-                    else:
-                        single_bets.append(None)  # Append None for missing single bets
-
-                # Add bet details
-                bets_flat.append(
-                    {
-                        "index": index,
-                        "bet_pk": bet.pk,
-                        "player_name": bet.player.name,
-                        "player_id": bet.player.id,
-                        "bet_type": bet_type,
-                        "amount": bet.bet_amount,
-                        "payout": bet.payout,
-                        "single_bet1": single_bets[0] if len(single_bets) > 0 else None,
-                        "single_bet2": single_bets[1] if len(single_bets) > 1 else None,
-                        "single_bet3": single_bets[2] if len(single_bets) > 2 else None,
-                        "single_bet4": single_bets[3] if len(single_bets) > 3 else None,
-                    }
-                )
-                index += 1
-        return bets_flat
+    def _get_page_url(self, cursor_name, cursor):
+        """Return the URL of the bet list page at a cursor, keeping the other filters"""
+        if cursor is None:
+            return None
+        query = self.request.GET.copy()
+        query.pop("after", None)
+        query.pop("before", None)
+        query[cursor_name] = cursor
+        return f"{reverse('bet-list')}?{query.urlencode()}"
 
     def get_bet_details(self, bet, bet_type):
         if bet_type == "Straight":
@@ -1145,19 +982,18 @@ class CalculatePayoutView(LoginRequiredMixin, View):
         """
         when received a post request to calculate all payout
         """
-        # Collect all bet types
-        all_bets = [
-            Straight.objects.all(),
-            Action.objects.all(),
-            Parlay3.objects.all(),
-            Parlay4.objects.all(),
-        ]
-
-        # Iterate through each bet and calculate payout
-        for bet_queryset in all_bets:
-            for bet in bet_queryset:  # Iterate through each individual bet
-                bet.calculate_payout()
-                bet.save(update_fields=["payout"])
+        # Settle every bet in memory and write the payouts back in bulk
+        result = settle_bets()
+
+        print(
+            f"CalculatePayoutView: settled {result.settled_count} of {result.total_count} bets "
+            f"({result.updated_count} updated) in {result.elapsed_seconds:.3f}s"
+        )
+        messages.success(
+            request,
+            f"Settled {result.settled_count} bets ({result.pending_count} pending) "
+            f"in {result.elapsed_seconds * 1000:.0f} ms.",
+        )
 
         # Redirect back to the bet list page
         return redirect("bet-list")
@@ -1179,3 +1015,485 @@ def insights_page(request):
 
     # Render the template with the context data
     return render(request, "insights/insights_page.html", context)
+
+
+# Sweep scenarios listed on the simulation page, the worst for the book first
+SWEEP_ROWS_SHOWN = 100
+
+
+def _parse_score_range(value):
+    """
+    Parse a score range of a sweep, either [first, last] (inclusive) or "first-last"
+    Returns:
+        range of integer scores
+    """
+    if isinstance(value, str):
+        value = value.split("-")
+    first, last = (int(score) for score in value)
+    if first < 0 or last < first or last - first > 200:
+        raise ValueError(f"Invalid score range {first}-{last}.")
+    return range(first, last + 1)
+
+
+def _parse_sweep(game, score_range_a, score_range_b):
+    """
+    Parse the game and score ranges of a sweep
+    Returns:
+        {"game": game id, "score_team_a": range, "score_team_b": range}
+    Raises:
+        ValueError if a value is invalid or the grid is larger than
+        MAX_SWEEP_SCENARIOS
+    """
+    sweep = {
+        "game": int(game),
+        "score_team_a": _parse_score_range(score_range_a),
+        "score_team_b": _parse_score_range(score_range_b),
+    }
+    scenario_count = len(sweep["score_team_a"]) * len(sweep["score_team_b"])
+    if scenario_count > MAX_SWEEP_SCENARIOS:
+        raise ValueError(
+            f"{scenario_count} score combinations, at most {MAX_SWEEP_SCENARIOS} "
+            "are allowed."
+        )
+    return sweep
+
+
+def _run_simulation(scores, sweep=None):
+    """
+    Simulate the book under the hypothetical scores, and optionally sweep a grid of
+    final scores of one game
+    input:
+        scores: {game id: (score_team_a, score_team_b)}
+        sweep: optional {"game": game id, "score_team_a": range, "score_team_b": range}
+    Returns:
+        dict of the results, ready to be rendered or serialized
+    """
+    simulator = BookSimulator()
+    result = simulator.simulate(scores)
+
+    players = Player.objects.in_bulk(list(result.player_payouts))
+    data = {
+        "total_payout": result.total_payout,
+        "book_profit": result.book_profit,
+        "settled_count": result.settled_count,
+        "pending_count": result.pending_count,
+        "invalid_count": result.invalid_count,
+        # BetSlips left out for missing BetLegs, see audit_bet_slips
+        "incomplete_slip_ids": simulator.incomplete_slip_ids,
+        "players": [
+            {
+                "player_id": player_id,
+                "player_name": players[player_id].name,
+                "payout": payout,
+            }
+            for player_id, payout in result.player_payouts.items()
+        ],
+        "sweep": [],
+    }
+
+    if sweep:
+        for score_team_a, score_team_b, sweep_result in simulator.sweep(
+            sweep["game"], sweep["score_team_a"], sweep["score_team_b"], scores
+        ):
+            data["sweep"].append(
+                {
+                    "score_team_a": score_team_a,
+                    "score_team_b": score_team_b,
+                    "total_payout": sweep_result.total_payout,
+                    "book_profit": sweep_result.book_profit,
+                    "pending_count": sweep_result.pending_count,
+                    "invalid_count": sweep_result.invalid_count,
+                }
+            )
+        book_profits = [row["book_profit"] for row in data["sweep"]]
+        data["sweep_summary"] = {
+            "scenario_count": len(book_profits),
+            "worst_book_profit": min(book_profits, default=None),
+            "best_book_profit": max(book_profits, default=None),
+            "losing_count": sum(1 for profit in book_profits if profit < 0),
+        }
+    return data
+
+
+@login_required(login_url="/login/")
+def simulation_view(request):
+    """
+    A function view to preview the book's payouts under hypothetical final scores
+    of the unfinished games, without saving anything
+    """
+    games = Game.objects.filter(is_finished=False).order_by("game_date", "id")
+    context = {"games": games}
+
+    if request.method == "POST":
+        scores = {}
+        for game in games:
+            score_team_a = request.POST.get(f"score_team_a_{game.pk}")
+            score_team_b = request.POST.get(f"score_team_b_{game.pk}")
+            if score_team_a and score_team_b:
+                try:
+                    scores[game.pk] = (Decimal(score_team_a), Decimal(score_team_b))
+                except InvalidOperation:
+                    messages.error(request, f"Invalid scores for {game}, ignored.")
+            # keep the entered scores in the form
+            game.simulated_score_team_a = score_team_a
+            game.simulated_score_team_b = score_team_b
+
+        sweep = None
+        if request.POST.get("sweep_game"):
+            try:
+                sweep = _parse_sweep(
+                    request.POST["sweep_game"],
+                    request.POST.get("sweep_score_team_a", ""),
+                    request.POST.get("sweep_score_team_b", ""),
+                )
+            except ValueError:
+                messages.error(
+                    request,
+                    "Score ranges must look like 0-40, with at most "
+                    f"{MAX_SWEEP_SCENARIOS} score combinations in a sweep.",
+                )
+
+        context["results"] = _run_simulation(scores, sweep)
+        # The page lists the worst scenarios for the book, the API returns them all
+        context["sweep_rows"] = sorted(
+            context["results"]["sweep"], key=lambda row: row["book_profit"]
+        )[:SWEEP_ROWS_SHOWN]
+        context["sweep_game"] = request.POST.get("sweep_game", "")
+        context["sweep_score_team_a"] = request.POST.get("sweep_score_team_a", "")
+        context["sweep_score_team_b"] = request.POST.get("sweep_score_team_b", "")
+
+    return render(request, "bets/simulation.html", context)
+
+
+@login_required(login_url="/login/")
+def simulation_api_view(request):
+    """
+    JSON API of the what-if simulator
+    Expected POST body:
+        {
+            "scores": {"<game id>": [score_team_a, score_team_b], ...},
+            "sweep": {"game": <game id>, "score_team_a": [0, 50], "score_team_b": [0, 50]}
+        }
+    "sweep" is optional, its score ranges are inclusive and make at most
+    MAX_SWEEP_SCENARIOS score combinations.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST required."}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        scores = {
+            int(game_id): (Decimal(str(score_a)), Decimal(str(score_b)))
+            for game_id, (score_a, score_b) in data.get("scores", {}).items()
+        }
+        sweep = data.get("sweep")
+        if sweep:
+            sweep = _parse_sweep(
+                sweep["game"], sweep["score_team_a"], sweep["score_team_b"]
+            )
+    except (ValueError, TypeError, KeyError, ArithmeticError) as e:
+        return JsonResponse({"error": f"Invalid simulation request: {e}"}, status=400)
+
+    return JsonResponse(_run_simulation(scores, sweep), encoder=DjangoJSONEncoder)
+
+
+# Game picker: default date window around today and page size
+GAME_PICKER_DAYS_BEFORE = 7
+GAME_PICKER_DAYS_AFTER = 14
+GAME_PICKER_PAGE_SIZE = 50
+
+
+def _get_game_picker_window(request):
+    """Return the (first, last) game dates of the game picker, from the query string"""
+    today = timezone.localdate()
+    date_from = parse_date(request.GET.get("date_from") or "") or (
+        today - timedelta(days=GAME_PICKER_DAYS_BEFORE)
+    )
+    date_to = parse_date(request.GET.get("date_to") or "") or (
+        today + timedelta(days=GAME_PICKER_DAYS_AFTER)
+    )
+    return date_from, date_to
+
+
+def _get_game_picker_version(request):
+    """
+    Return (ETag, Last-Modified) of the game picker's date window.
+    Finishing a game bumps its updated_at, so every game of the window counts, and
+    the number of games catches deleted ones. Computed once per request.
+    """
+    if not hasattr(request, "_game_picker_version"):
+        date_from, date_to = _get_game_picker_window(request)
+        version = Game.objects.filter(
+            game_date__gte=date_from, game_date__lte=date_to
+        ).aggregate(last_modified=Max("updated_at"), count=Count("id"))
+        etag = f"{version['count']}-{version['last_modified']}"
+        request._game_picker_version = (
+            hashlib.md5(etag.encode()).hexdigest(),
+            version["last_modified"],
+        )
+    return request._game_picker_version
+
+
+@login_required(login_url="/login/")
+@require_GET
+@cache_control(private=True, no_cache=True)
+@condition(
+    etag_func=lambda request: _get_game_picker_version(request)[0],
+    last_modified_func=lambda request: _get_game_picker_version(request)[1],
+)
+def game_picker_api_view(request):
+    """
+    JSON list of the bettable games used by the bet form: unfinished games within a
+    date window, ordered by date
+    Query string:
+        q: prefix of a team name
+        date_from/date_to: date window (default: 7 days ago to 14 days ahead)
+        page/page_size: pagination (page_size at most 100)
+    Browsers revalidate with If-None-Match/If-Modified-Since and get a 304 while
+    the games of the window are unchanged.
+    """
+    date_from, date_to = _get_game_picker_window(request)
+    games = Game.objects.filter(
+        is_finished=False, game_date__gte=date_from, game_date__lte=date_to
+    )
+
+    query = request.GET.get("q", "").strip()
+    if query:
+        games = games.filter(
+            Q(team_a__istartswith=query) | Q(team_b__istartswith=query)
+        )
+
+    try:
+        page_size = max(1, min(int(request.GET.get("page_size")), 100))
+    except (TypeError, ValueError):
+        page_size = GAME_PICKER_PAGE_SIZE
+    paginator = Paginator(
+        games.order_by("game_date", "id").values(
+            "id",
+            "name",
+            "team_a",
+            "team_b",
+            "league",
+            "game_date",
+            "fav",
+            "fav_spread",
+            "over_under_points",
+        ),
+        page_size,
+    )
+    page = paginator.get_page(request.GET.get("page"))
+
+    return JsonResponse(
+        {
+            "games": list(page),
+            "count": paginator.count,
+            "page": page.number,
+            "next_page": page.next_page_number() if page.has_next() else None,
+        },
+        encoder=DjangoJSONEncoder,
+    )
+
+
+@login_required(login_url="/login/")
+@require_GET
+def export_bets_view(request):
+    """
+    Stream every bet matching the bet list filters, with its legs, outcomes and payout
+    Query string:
+        format: "csv" (default) or "ndjson"
+        the fields of BetFilterForm (bet_type_filter, player, date_from, ...)
+    """
+    export_format = request.GET.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse(
+            {"error": f"format must be one of {', '.join(EXPORT_FORMATS)}."},
+            status=400,
+        )
+
+    bet_filter_form = BetFilterForm(request.GET)
+    if not bet_filter_form.is_valid():
+        return JsonResponse({"error": bet_filter_form.errors}, status=400)
+    bet_slips = filter_bet_slips(BetSlip.objects.all(), **bet_filter_form.get_filters())
+
+    content_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    response = StreamingHttpResponse(
+        iter_export(bet_slips, export_format), content_type=content_type
+    )
+    filename = f"bets-{timezone.localdate():%Y%m%d}.{export_format}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required(login_url="/login/")
+def import_bets_view(request):
+    """
+    A function view to import a batch of bets from an uploaded CSV or JSON file.
+    The whole batch is validated first and a per-row error report is displayed.
+    """
+    context = {"import_formats": IMPORT_FORMATS}
+
+    if request.method == "POST":
+        upload = request.FILES.get("bets_file")
+        skip_invalid = request.POST.get("skip_invalid") == "on"
+        if upload is None:
+            messages.error(request, "Please choose a CSV or JSON file.")
+            return render(request, "bets/bet_import.html", context)
+
+        # The format follows the file extension unless picked explicitly
+        import_format = request.POST.get("format") or upload.name.rsplit(".", 1)[-1]
+        try:
+            rows = parse_import(
+                upload.read().decode("utf-8-sig"), import_format.lower()
+            )
+        except (ImportFormatError, UnicodeDecodeError) as e:
+            messages.error(request, f"Could not read {upload.name}: {e}")
+            return render(request, "bets/bet_import.html", context)
+
+        result = import_bets(rows, skip_invalid=skip_invalid)
+        print(
+            f"import_bets_view: created {result.created_count} bets, "
+            f"{len(result.errors)} invalid rows in {result.elapsed_seconds:.3f}s"
+        )
+        if result.created_count:
+            messages.success(
+                request,
+                f"Imported {result.created_count} bets in "
+                f"{result.elapsed_seconds * 1000:.0f} ms.",
+            )
+        if result.errors:
+            messages.error(
+                request,
+                f"{len(result.errors)} invalid rows"
+                + ("" if skip_invalid else ", nothing was imported."),
+            )
+        context["result"] = result
+
+    return render(request, "bets/bet_import.html", context)
+
+
+def _get_bet_placement_response(result):
+    """Return (status, body) of a bet placement for an ImportResult"""
+    if result.errors:
+        return 400, {
+            "errors": [
+                {"index": row_number, "error": error}
+                for row_number, error in result.errors
+            ]
+        }
+    return 201, {
+        "created_count": result.created_count,
+        "bets": [
+            {"index": row_number, "bet_type": bet_type, "bet_id": bet_id}
+            for row_number, bet_type, bet_id in result.created_bets
+        ],
+    }
+
+
+@login_required(login_url="/login/")
+@require_POST
+def place_bets_api_view(request):
+    """
+    JSON API to place one or many bets atomically: either every bet is created or
+    none is.
+    Expected POST body: one bet, a list of bets or {"bets": [...]}, each bet as in
+    bet_import.py, e.g.
+        {"player": "Alice", "bet_type": "Straight", "bet_amount": "25.00",
+         "legs": [{"game": 12, "type": "WINNER", "team": "Ravens"}]}
+    With an Idempotency-Key header, the response of a successful placement is stored
+    and replayed when the same request is retried with the same key.
+    Returns:
+        201 {"created_count": n, "bets": [{"index", "bet_type", "bet_id"}, ...]}
+        400 {"errors": [{"index", "error"}, ...]}
+        409 {"errors": [{"error"}]} if a database constraint failed, nothing placed
+        503 {"errors": [{"error"}]} if the database stayed locked, nothing placed
+    """
+    idempotency_key = request.headers.get("Idempotency-Key", "").strip()[:255]
+    request_hash = hashlib.sha256(request.body).hexdigest()
+
+    if idempotency_key:
+        stored = IdempotencyKey.objects.filter(
+            user=request.user, key=idempotency_key
+        ).first()
+        if stored is not None:
+            return _replay_idempotent_response(stored, request_hash)
+
+    try:
+        data = json.loads(request.body)
+    except ValueError as e:
+        return JsonResponse({"errors": [{"error": f"Invalid JSON: {e}"}]}, status=400)
+    if isinstance(data, dict) and "bets" in data:
+        data = data["bets"]
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list) or not data:
+        return JsonResponse(
+            {"errors": [{"error": "Expected a bet or a list of bets."}]}, status=400
+        )
+
+    try:
+        with write_transaction():
+            result = import_bets(list(enumerate(data)))
+            status, body = _get_bet_placement_response(result)
+            # The key is saved with the bets, so a placement is never half recorded
+            if idempotency_key and status == 201:
+                IdempotencyKey.objects.create(
+                    user=request.user,
+                    key=idempotency_key,
+                    request_hash=request_hash,
+                    response_status=status,
+                    response_body=body,
+                )
+    except IntegrityError as e:
+        # If a concurrent request with the same key won, its bets are the ones kept
+        stored = (
+            IdempotencyKey.objects.filter(
+                user=request.user, key=idempotency_key
+            ).first()
+            if idempotency_key
+            else None
+        )
+        if stored is not None:
+            return _replay_idempotent_response(stored, request_hash)
+        print(f"views.place_bets_api_view(): bets not placed: {e}")
+        return JsonResponse(
+            {
+                "errors": [
+                    {
+                        "error": "The bets conflict with a concurrent change, "
+                        "nothing was placed. Try again."
+                    }
+                ]
+            },
+            status=409,
+        )
+    except OperationalError as e:
+        # The write lock was not free within the busy timeout, a retry is safe
+        print(f"views.place_bets_api_view(): bets not placed: {e}")
+        response = JsonResponse(
+            {
+                "errors": [
+                    {"error": "The database is busy, nothing was placed. Try again."}
+                ]
+            },
+            status=503,
+        )
+        response["Retry-After"] = "1"
+        return response
+
+    return JsonResponse(body, status=status)
+
+
+def _replay_idempotent_response(stored, request_hash):
+    """Return the stored response of an idempotency key, if the request is the same"""
+    if stored.request_hash != request_hash:
+        return JsonResponse(
+            {
+                "errors": [
+                    {"error": "Idempotency-Key was already used for another request."}
+                ]
+            },
+            status=422,
+        )
+    response = JsonResponse(stored.response_body, status=stored.response_status)
+    response["Idempotent-Replayed"] = "true"
+    return response